@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import shutil
+import uuid
+from datetime import datetime, timedelta
+
+# === PATHS ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+DATA_DIR = os.path.join(PROJECT_ROOT, "data")
+
+# kind → (root folder, file extension)
+KINDS = {
+    "anomalies": (os.path.join(DATA_DIR, "anomalies"), ".json"),
+    "correlations": (os.path.join(DATA_DIR, "correlations"), ".json"),
+    "explanations": (os.path.join(DATA_DIR, "explanations"), ".json"),
+    "models": (os.path.join(PROJECT_ROOT, "retrained_model"), ".joblib"),
+    "events": (os.path.join(DATA_DIR, "events"), ".arrow"),
+}
+
+# === RETENTION / COMPACTION POLICY ===
+# retention_days: day partitions older than this are deleted (the latest artifact is always kept)
+# compact_after_days: JSON-list artifacts of older days are merged into one file per day
+POLICY = {
+    "anomalies": {"retention_days": 30, "compact_after_days": 2},
+    "correlations": {"retention_days": 90, "compact_after_days": 7},
+    "explanations": {"retention_days": 90, "compact_after_days": None},
+    "models": {"retention_days": 30, "compact_after_days": None},
+    # anomalies and correlations reference rows in these files, so keep them as long as either
+    "events": {"retention_days": 90, "compact_after_days": None},
+}
+
+MANIFEST = "manifest.jsonl"
+LATEST = "LATEST"
+
+# Layout: <root>/YYYY/MM/DD/<file> with one append-only manifest per day partition and a
+# LATEST pointer at the root. "latest" is one small file read; "range" only opens the day
+# manifests inside the range, so neither grows with total history.
+
+
+def root_of(kind):
+    if kind not in KINDS:
+        raise ValueError(f"Unknown artifact kind: {kind!r}")
+    root = KINDS[kind][0]
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def _day_dir(root, day):
+    return os.path.join(root, day.strftime("%Y"), day.strftime("%m"), day.strftime("%d"))
+
+
+def _read_jsonl(path):
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # torn trailing line from an interrupted append
+    return entries
+
+
+def _write_atomic(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+# === WRITE ===
+def partition_path(kind, filename, when=None):
+    """Where a new artifact written now (or at `when`) should go; creates the day folder."""
+    day_dir = _day_dir(root_of(kind), when or datetime.now())
+    os.makedirs(day_dir, exist_ok=True)
+    return os.path.join(day_dir, filename)
+
+
+def register(kind, path, records=None, run_id=None):
+    """Record a finished artifact in its day manifest and move the LATEST pointer to it."""
+    root = root_of(kind)
+    day_dir = os.path.dirname(os.path.abspath(path))
+    new_day = not os.path.exists(os.path.join(day_dir, MANIFEST))
+    entry = {
+        "run_id": run_id or uuid.uuid4().hex[:12],
+        "kind": kind,
+        "path": os.path.relpath(os.path.abspath(path), root),
+        "size": os.path.getsize(path),
+        "records": records,
+        "created_at": time.time(),
+    }
+    with open(os.path.join(day_dir, MANIFEST), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    _write_atomic(os.path.join(root, LATEST), json.dumps(entry))
+
+    # policies run once per new day partition, so their cost is amortized away
+    if new_day:
+        try:
+            maintain(kind)
+        except Exception as e:
+            print(f"[WARN] Artifact maintenance failed for {kind}: {e}")
+    return entry
+
+
+def save_json(kind, filename, data, records=None, run_id=None):
+    """Write a JSON artifact into today's partition and register it. Returns its path."""
+    path = partition_path(kind, filename)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, default=str)
+    if records is None and isinstance(data, list):
+        records = len(data)
+    register(kind, path, records=records, run_id=run_id)
+    return path
+
+
+# === READ ===
+def abspath(kind, entry):
+    return os.path.join(root_of(kind), entry["path"])
+
+
+def _legacy_files(kind):
+    """Files written flat into the root before partitioning existed."""
+    root, ext = root_of(kind), KINDS[kind][1]
+    return [os.path.join(root, f) for f in os.listdir(root) if f.endswith(ext)]
+
+
+def latest(kind):
+    """Manifest entry of the newest artifact, or None."""
+    root = root_of(kind)
+    pointer = os.path.join(root, LATEST)
+    if os.path.exists(pointer):
+        try:
+            with open(pointer, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if os.path.exists(abspath(kind, entry)):
+                return entry
+        except (json.JSONDecodeError, KeyError):
+            pass
+    # no pointer yet: fall back to the old flat-folder scan
+    legacy = _legacy_files(kind)
+    if not legacy:
+        return None
+    newest = max(legacy, key=os.path.getmtime)
+    return {"kind": kind, "path": os.path.relpath(newest, root), "size": os.path.getsize(newest),
+            "records": None, "created_at": os.path.getmtime(newest), "run_id": None}
+
+
+def latest_path(kind):
+    entry = latest(kind)
+    return abspath(kind, entry) if entry else None
+
+
+def query_range(kind, since=None, until=None):
+    """Manifest entries created in [since, until] (datetimes), oldest first."""
+    root = root_of(kind)
+    until = until or datetime.now()
+    since = since or until - timedelta(days=1)
+    lo, hi = since.timestamp(), until.timestamp()
+    entries = []
+    day = since.date()
+    while day <= until.date():
+        for e in _read_jsonl(os.path.join(_day_dir(root, day), MANIFEST)):
+            if lo <= e.get("created_at", 0) <= hi and os.path.exists(abspath(kind, e)):
+                entries.append(e)
+        day += timedelta(days=1)
+    return entries
+
+
+def _day_dirs(root):
+    """All YYYY/MM/DD partition folders, oldest first."""
+    days = []
+    for y in sorted(d for d in os.listdir(root) if d.isdigit()):
+        for m in sorted(d for d in os.listdir(os.path.join(root, y)) if d.isdigit()):
+            for d in sorted(x for x in os.listdir(os.path.join(root, y, m)) if x.isdigit()):
+                days.append((datetime(int(y), int(m), int(d)), os.path.join(root, y, m, d)))
+    return days
+
+
+def iter_paths(kind):
+    """Every artifact path of a kind (legacy flat files first, then partitions), oldest first."""
+    root = root_of(kind)
+    for path in sorted(_legacy_files(kind), key=os.path.getmtime):
+        yield path
+    for _, day_dir in _day_dirs(root):
+        for e in _read_jsonl(os.path.join(day_dir, MANIFEST)):
+            path = os.path.join(root, e["path"])
+            if os.path.exists(path):
+                yield path
+
+
+# === RETENTION & COMPACTION ===
+def apply_retention(kind, retention_days, now=None):
+    """Delete whole day partitions older than the retention window (never the latest artifact)."""
+    root = root_of(kind)
+    cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+    keep = latest_path(kind)
+    removed = 0
+    for day, day_dir in _day_dirs(root):
+        if day >= cutoff.replace(hour=0, minute=0, second=0, microsecond=0):
+            break
+        if keep and os.path.abspath(keep).startswith(os.path.abspath(day_dir) + os.sep):
+            continue
+        shutil.rmtree(day_dir, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def compact(kind, older_than_days, now=None):
+    """Merge the JSON-list artifacts of each old day partition into a single file."""
+    root = root_of(kind)
+    cutoff = (now or datetime.now()).date() - timedelta(days=older_than_days)
+    keep = latest_path(kind)
+    compacted = 0
+    for day, day_dir in _day_dirs(root):
+        if day.date() >= cutoff:
+            break
+        manifest_path = os.path.join(day_dir, MANIFEST)
+        entries = [e for e in _read_jsonl(manifest_path) if os.path.exists(os.path.join(root, e["path"]))]
+        if len(entries) < 2 or (keep and any(os.path.join(root, e["path"]) == keep for e in entries)):
+            continue
+        merged = []
+        for e in entries:
+            with open(os.path.join(root, e["path"]), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if not isinstance(data, list):
+                break
+            merged.extend(data)
+        else:
+            name = f"{kind}_{day.strftime('%Y%m%d')}_compacted.json"
+            path = os.path.join(day_dir, name)
+            _write_atomic(path, json.dumps(merged, indent=4, default=str))
+            if not _relink(kind, [os.path.basename(e["path"]) for e in entries], name):
+                # manifest and originals stay as they were; the merged file is kept because a
+                # store may already name it, and the next compaction rewrites it
+                continue
+            entry = {"run_id": "compacted-" + day.strftime("%Y%m%d"), "kind": kind,
+                     "path": os.path.relpath(path, root), "size": os.path.getsize(path),
+                     "records": len(merged), "created_at": entries[-1]["created_at"],
+                     "compacted_from": [e["run_id"] for e in entries]}
+            _write_atomic(manifest_path, json.dumps(entry) + "\n")
+            for e in entries:
+                old = os.path.join(root, e["path"])
+                if old != path:
+                    os.remove(old)
+            compacted += 1
+    return compacted
+
+
+def _relink(kind, old_files, new_file):
+    """Move stores that name artifacts by file (incident index, triage queue) to the compacted file."""
+    if kind != "correlations":
+        return True
+    import incident_index
+    import triage
+    try:
+        incident_index.relink_correlation_files(old_files, new_file)
+        triage.relink_correlation_files(old_files, new_file)
+    except Exception as e:
+        print(f"[WARN] Could not relink {kind} compacted into {new_file}: {e}")
+        return False
+    return True
+
+
+def maintain(kind=None):
+    """Apply the configured retention and compaction policies."""
+    for k in [kind] if kind else list(KINDS):
+        policy = POLICY.get(k, {})
+        removed = apply_retention(k, policy["retention_days"]) if policy.get("retention_days") else 0
+        compacted = compact(k, policy["compact_after_days"]) if policy.get("compact_after_days") else 0
+        if removed or compacted:
+            print(f"[INFO] Artifacts [{k}]: removed {removed} old partitions, compacted {compacted}")
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "latest"
+    if cmd == "latest":
+        for k in KINDS:
+            print(f"- {k}: {latest_path(k)}")
+    elif cmd == "range" and len(sys.argv) > 2:
+        days = float(sys.argv[3]) if len(sys.argv) > 3 else 1
+        for e in query_range(sys.argv[2], since=datetime.now() - timedelta(days=days)):
+            print(f"- {datetime.fromtimestamp(e['created_at']).isoformat()} {e['path']} "
+                  f"({e['records']} records, {e['size']} bytes)")
+    elif cmd == "maintain":
+        maintain()
+    else:
+        print("Usage: python src/artifacts.py [latest | range <kind> [days] | maintain]")
@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import glob
+import shutil
+import pickle
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ingest import ingest_all, naive_utc
+from detect import DATA_DIR, load_models, calibrate_contamination, score_batch, flag_scored, apply_rerank, save_anomalies
+from correlator import correlate, save_correlations
+import artifacts
+import eventstore
+
+# === CONFIG ===
+BACKFILL_DIR = os.path.join(DATA_DIR, "backfill")
+GRANULARITY = {"day": (timedelta(days=1), "%Y-%m-%d"), "hour": (timedelta(hours=1), "%Y-%m-%dT%H")}
+CSV_CHUNK_ROWS = 200_000
+
+# Layout of one backfill run (the run id is derived from range + granularity, so re-running
+# the same command resumes it):
+#   data/backfill/<run_id>/parts/<partition>/<source>.csv   staged input slices
+#   data/backfill/<run_id>/staged.json                       staging finished
+#   data/backfill/<run_id>/done/<partition>.pkl              checkpoint per finished partition
+#   data/backfill/<run_id>/report.json                       per-partition progress/throughput
+#   data/backfill/<run_id>/thresholds.db                     the run's own alert thresholds
+
+
+def run_id_of(start, end, by):
+    return f"{start:%Y%m%d%H}_{end:%Y%m%d%H}_{by}"
+
+
+def partition_labels(start, end, by):
+    """Partition labels covering [start, end)."""
+    step, fmt = GRANULARITY[by]
+    t = start.replace(minute=0, second=0, microsecond=0)
+    if by == "day":
+        t = t.replace(hour=0)
+    labels = []
+    while t < end:
+        labels.append(t.strftime(fmt))
+        t += step
+    return labels
+
+
+def _write_atomic(path, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+# === STAGING ===
+def stage(mapping, start, end, by, run_dir):
+    """
+    Split the source CSVs into per-partition slices with one chunked pass per file, so
+    workers only read their own partition instead of the whole history.
+    """
+    import pandas as pd
+
+    marker = os.path.join(run_dir, "staged.json")
+    if os.path.exists(marker):
+        with open(marker, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    parts_dir = os.path.join(run_dir, "parts")
+    shutil.rmtree(parts_dir, ignore_errors=True)  # a half-staged run is redone from scratch
+    fmt = GRANULARITY[by][1]
+    counts = {}
+    for source, path in mapping.items():
+        for chunk in pd.read_csv(path, chunksize=CSV_CHUNK_ROWS):
+            col = "timestamp" if "timestamp" in chunk.columns else "time"
+            ts = naive_utc(pd.to_datetime(chunk[col], errors="coerce"))
+            in_range = (ts >= start) & (ts < end)
+            chunk, ts = chunk[in_range], ts[in_range]
+            for label, rows in chunk.groupby(ts.dt.strftime(fmt)):
+                out = os.path.join(parts_dir, label, f"{source}.csv")
+                os.makedirs(os.path.dirname(out), exist_ok=True)
+                rows.to_csv(out, mode="a", header=not os.path.exists(out), index=False)
+                counts.setdefault(label, {}).setdefault(source, 0)
+                counts[label][source] += len(rows)
+
+    _write_atomic(marker, lambda f: f.write(json.dumps(counts, indent=2).encode("utf-8")))
+    print(f"[INFO] Staged {sum(sum(c.values()) for c in counts.values())} rows into {len(counts)} partitions")
+    return counts
+
+
+# === PARTITION WORKER ===
+def process_partition(label, run_dir, contamination_level=0.1):
+    """
+    ingest → score for one partition, then checkpoint. Workers never apply alert thresholds:
+    the parent flags all partitions' scores at once (see stitch), so the threshold store is
+    not touched here. Events go to the event store and the checkpoint keeps only the scored
+    entities' representative events plus their rows in it. The event file is registered,
+    and anomalies re-ranked, by the parent once workers are done: manifests and LATEST
+    pointers have a single writer, and only one process loads the embedding model.
+    """
+    start = time.perf_counter()
+    part_dir = os.path.join(run_dir, "parts", label)
+    mapping = {os.path.splitext(f)[0]: os.path.join(part_dir, f) for f in sorted(os.listdir(part_dir))}
+
+    events = ingest_all(mapping)
+    scored = score_batch(events, contamination_level)
+
+    event_file, rows = None, {}
+    try:
+        event_file, all_rows = eventstore.write_events(
+            events, name=f"backfill_{os.path.basename(run_dir)}_{label}.arrow", register=False)
+        wanted = {ev.get("event_id") for s in scored for ev in s["events"]}
+        rows = {event_id: row for event_id, row in all_rows.items() if event_id in wanted}
+    except Exception as e:
+        print(f"[WARN] {label}: event store unavailable, checkpointing embedded events ({e})")
+
+    stats = {"partition": label, "events": len(events), "entities": sum(len(s["entities"]) for s in scored),
+             "seconds": time.perf_counter() - start, "event_file": event_file}
+    result = {"stats": stats, "scored": scored, "rows": rows}
+    _write_atomic(os.path.join(run_dir, "done", f"{label}.pkl"),
+                  lambda f: pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL))
+    return stats
+
+
+def load_checkpoints(run_dir):
+    """Finished partitions in time order: {label: result}."""
+    done = {}
+    for path in sorted(glob.glob(os.path.join(run_dir, "done", "*.pkl"))):
+        with open(path, "rb") as f:
+            done[os.path.splitext(os.path.basename(path))[0]] = pickle.load(f)
+    return done
+
+
+# === STITCHING ===
+def stitch(done, run_dir, by="day", window_minutes=30):
+    """
+    Threshold all partitions' scores once per detector, then correlate the flagged anomalies
+    over the whole range, so incidents crossing a partition boundary come out as one.
+    Thresholds come from a fresh store in run_dir: a backfill neither reads nor moves the
+    live thresholds.db, and re-running it flags the same anomalies.
+    """
+    labels = sorted(done)
+    state = os.path.join(run_dir, "thresholds.db")
+    for path in (state, f"{state}-wal", f"{state}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    anomalies = flag_scored([s for label in labels for s in done[label]["scored"]], thresholds_db=state)
+    incidents = correlate(anomalies, window_minutes=window_minutes)
+
+    fmt = GRANULARITY[by][1]
+    stitched = sum(1 for inc in incidents
+                   if len({a["timestamp"].strftime(fmt) for a in inc["events"]
+                           if hasattr(a.get("timestamp"), "strftime")}) > 1)
+    for label in labels:  # embedded events → rows of the partition's event file (shared with incidents)
+        if done[label]["stats"].get("event_file"):
+            eventstore.to_refs(anomalies, done[label]["stats"]["event_file"], done[label]["rows"])
+    return anomalies, incidents, stitched
+
+
+# === DRIVER ===
+def backfill(mapping, start, end, by="day", workers=None, window_minutes=30, fresh=False):
+    workers = workers or os.cpu_count() or 1
+    run_dir = os.path.join(BACKFILL_DIR, run_id_of(start, end, by))
+    if fresh:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(os.path.join(run_dir, "done"), exist_ok=True)
+    print(f"[INFO] Backfill {start} → {end} by {by} on {workers} workers ({run_dir})")
+
+    counts = stage(mapping, start, end, by, run_dir)
+    labels = [l for l in partition_labels(start, end, by) if l in counts]
+    finished = {os.path.splitext(os.path.basename(p))[0] for p in glob.glob(os.path.join(run_dir, "done", "*.pkl"))}
+    todo = [l for l in labels if l not in finished]
+    if finished:
+        print(f"[INFO] Resuming: {len(finished)} partitions already checkpointed, {len(todo)} to go")
+
+    contamination_level = calibrate_contamination(load_models())
+    report_path = os.path.join(run_dir, "report.json")
+    report = {}
+    if os.path.exists(report_path):
+        with open(report_path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+
+    failed = []
+    run_start = time.perf_counter()
+    total_events = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_partition, l, run_dir, contamination_level): l for l in todo}
+        for n, fut in enumerate(as_completed(futures), start=1):
+            label = futures[fut]
+            try:
+                stats = fut.result()
+            except Exception as e:
+                failed.append(label)
+                print(f"[ERROR] [{n}/{len(todo)}] {label} failed: {e}")
+                continue
+            total_events += stats["events"]
+            elapsed = time.perf_counter() - run_start
+            stats["events_per_sec"] = stats["events"] / max(stats["seconds"], 1e-9)
+            report[label] = stats
+            _write_atomic(report_path, lambda f: f.write(json.dumps(report, indent=2).encode("utf-8")))
+            eta = elapsed / n * (len(todo) - n)
+            print(f"[{n}/{len(todo)}] {label}: {stats['events']} events → {stats['entities']} entity scores "
+                  f"in {stats['seconds']:.1f}s "
+                  f"({stats['events_per_sec']:,.0f} events/s) | overall {total_events / elapsed:,.0f} events/s, "
+                  f"ETA {eta:.0f}s")
+
+    done = load_checkpoints(run_dir)
+    for label, result in done.items():  # checkpointed just before an earlier run was killed
+        report.setdefault(label, result["stats"])
+    register_event_files(report, report_path)
+    if failed:
+        print(f"[WARN] {len(failed)} partitions failed ({', '.join(failed)}). Re-run the same command to resume.")
+        return None
+
+    anomalies, incidents, stitched = stitch(done, run_dir, by, window_minutes)
+    eventstore.resolve(anomalies)  # the re-ranker reads the events themselves
+    anomalies = apply_rerank(anomalies, sum(s["seconds"] for s in report.values()))
+    save_anomalies(eventstore.without_events(anomalies))
+    save_correlations(incidents)
+    print(f"✅ Backfill complete: {len(labels)} partitions, {len(anomalies)} anomalies, {len(incidents)} incidents "
+          f"({stitched} stitched across partition boundaries)")
+    return anomalies, incidents
+
+
+def register_event_files(report, report_path):
+    """
+    Register the partitions' event files in the artifact manifest, from the parent only.
+    Files of an earlier, interrupted run that never got registered are picked up on resume.
+    """
+    pending = [label for label in sorted(report)
+               if report[label].get("event_file") and not report[label].get("registered")]
+    events_root = artifacts.root_of("events")
+    for label in pending:
+        stats = report[label]
+        artifacts.register("events", os.path.join(events_root, stats["event_file"]), records=stats["events"])
+        stats["registered"] = True
+    if pending:
+        _write_atomic(report_path, lambda f: f.write(json.dumps(report, indent=2).encode("utf-8")))
+        print(f"[INFO] Registered {len(pending)} partition event files")
+    return len(pending)
+
+
+def _parse_when(value):
+    return datetime.fromisoformat(value)
+
+
+# === Main Run ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reprocess historical logs over a date range, resumably.")
+    parser.add_argument("start", type=_parse_when, help="inclusive, e.g. 2025-10-01")
+    parser.add_argument("end", type=_parse_when, help="exclusive, e.g. 2025-11-01")
+    parser.add_argument("--by", choices=sorted(GRANULARITY), default="day")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--window", type=int, default=30, help="correlation window in minutes")
+    parser.add_argument("--fresh", action="store_true", help="discard checkpoints of an earlier run")
+    for source in ("auth", "process", "firewall"):
+        parser.add_argument(f"--{source}", default=os.path.join(DATA_DIR, f"train_{source}.csv"))
+    args = parser.parse_args()
+
+    mapping = {"auth": args.auth, "process": args.process, "firewall": args.firewall}
+    result = backfill(mapping, args.start, args.end, by=args.by, workers=args.workers,
+                      window_minutes=args.window, fresh=args.fresh)
+    sys.exit(0 if result is not None else 1)
@@ -0,0 +1,368 @@
+import os
+import sys
+import time
+import random
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from utils import new_id
+
+# === SYNTHETIC DATA ===
+def synthetic_events(n_events, n_entities=2000, seed=42, start=datetime(2025, 10, 1)):
+    """Canonical events (as produced by normalize_row) spread over three sources."""
+    rng = random.Random(seed)
+    procs = ["svchost.exe", "Teams.exe", "chrome.exe", "powershell.exe", "cmd.exe", "psexec.exe"]
+    events = []
+    for _ in range(n_events):
+        ts = start + timedelta(seconds=rng.randint(0, 30 * 86400))
+        ent = rng.randrange(n_entities)
+        src = rng.choice(("auth", "process", "firewall"))
+        if src == "auth":
+            attrs = {"username": f"user{ent}", "src_ip": f"10.{ent % 256}.{rng.randrange(4)}.{rng.randrange(256)}",
+                     "auth_method": rng.choice(("Kerberos", "NTLM")),
+                     "outcome": "FAIL" if rng.random() < 0.05 else "SUCCESS"}
+            entity, event_type = f"user:{attrs['username']}", "login"
+        elif src == "process":
+            attrs = {"host": f"host{ent}", "username": f"user{ent}", "process_name": rng.choice(procs),
+                     "parent_process": "services.exe", "cmdline": "--normal-operation", "event_type": "process_create"}
+            entity, event_type = f"host:{attrs['host']}", "process_create"
+        else:
+            attrs = {"src_ip": f"10.0.{ent // 256}.{ent % 256}", "dst_ip": f"192.168.{rng.randrange(256)}.{rng.randrange(256)}",
+                     "dst_port": rng.choice((53, 80, 443, 8080)), "protocol": rng.choice(("TCP", "UDP")),
+                     "action": "ALLOW", "bytes": float(rng.randint(100, 200000))}
+            entity, event_type = f"ip:{attrs['src_ip']}", "net_flow"
+        events.append({"event_id": new_id("evt"), "timestamp": ts, "source": src, "entity": entity,
+                       "event_type": event_type, "attributes": attrs, "raw": {}})
+    events.sort(key=lambda e: e["timestamp"])
+    return events
+
+
+# === ISOLATION ===
+@contextmanager
+def isolated_state():
+    """
+    Online thresholds in a temp store and the score cache off, so a benchmark neither
+    reads nor writes data/ (cached scores would also make later worker counts look faster).
+    """
+    import score_cache
+    import thresholds
+
+    saved = (thresholds.THRESHOLDS_DB, score_cache.ENABLED, os.environ.get("SCORE_CACHE"))
+    with tempfile.TemporaryDirectory() as tmp:
+        thresholds.THRESHOLDS_DB = os.path.join(tmp, "thresholds.db")
+        score_cache.ENABLED = False
+        os.environ["SCORE_CACHE"] = "0"  # pool workers that re-import the module
+        try:
+            yield tmp
+        finally:
+            thresholds.THRESHOLDS_DB, score_cache.ENABLED = saved[:2]
+            if saved[2] is None:
+                os.environ.pop("SCORE_CACHE", None)
+            else:
+                os.environ["SCORE_CACHE"] = saved[2]
+
+
+# === BENCHMARKS ===
+def bench_partition_scaling(n_events=200000, worker_counts=(1, 2, 4, 8)):
+    """Wall time of partitioned features + scoring + correlation for several worker counts."""
+    from partition import run_partitioned
+
+    events = synthetic_events(n_events)
+    print(f"\n=== Partition scaling: {n_events} events, {os.cpu_count()} CPUs ===")
+    baseline = None
+    rows = []
+    for workers in worker_counts:
+        with isolated_state():  # every worker count starts from the same empty state
+            start = time.perf_counter()
+            anomalies, incidents = run_partitioned(events, workers=workers)
+            secs = time.perf_counter() - start
+        baseline = baseline or secs
+        rows.append((workers, secs, n_events / secs, baseline / secs, len(anomalies), len(incidents)))
+
+    print(f"{'workers':>8} {'seconds':>9} {'events/s':>11} {'speedup':>8} {'anomalies':>10} {'incidents':>10}")
+    for workers, secs, rate, speedup, n_anom, n_inc in rows:
+        print(f"{workers:>8} {secs:>9.2f} {rate:>11,.0f} {speedup:>7.2f}x {n_anom:>10} {n_inc:>10}")
+    return rows
+
+
+def synthetic_process_chunk(n_rows, n_hosts=5000, seed=0):
+    """Column arrays for a raw process log chunk (vectorized generation)."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    procs = np.array(["svchost.exe", "Teams.exe", "chrome.exe", "powershell.exe", "cmd.exe", "rundll32.exe"])
+    parents = np.array(["services.exe", "explorer.exe", "svchost.exe", "winword.exe"])
+    args = np.array(["--normal-operation", "-enc SQBFAFgA", "/c whoami", "-run -dump lsass -out c:\\windows\\temp\\d.dmp",
+                     "--type=renderer --lang=en-US", "-k netsvcs -p"])
+    hosts = np.char.add("host", rng.integers(0, n_hosts, n_rows).astype(str))
+    proc = procs[rng.integers(0, len(procs), n_rows)]
+    parent = parents[rng.integers(0, len(parents), n_rows)]
+    cmd = np.char.add(np.char.add(proc, " "), args[rng.integers(0, len(args), n_rows)])
+    return hosts, parent, proc, cmd
+
+
+def bench_cmdline_features(n_rows=10_000_000, chunk=500_000):
+    """Throughput and peak memory: current dense process_features vs hashed sparse cmdline features."""
+    import tracemalloc
+    from features import process_features, cmdline_documents, hash_documents, aggregate_rows
+
+    print(f"\n=== Process featurization: {n_rows:,} rows in chunks of {chunk:,} ===")
+    results = {}
+    for name in ("dense", "hashed"):
+        elapsed, peak = 0.0, 0
+        for i, start in enumerate(range(0, n_rows, chunk)):
+            hosts, parent, proc, cmd = synthetic_process_chunk(min(chunk, n_rows - start), seed=i)
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            if name == "dense":
+                # the current path needs canonical event dicts
+                events = [{"attributes": {"host": h, "process_name": p}} for h, p in zip(hosts.tolist(), proc.tolist())]
+                process_features(events)
+            else:
+                docs = cmdline_documents(cmd.tolist(), parent.tolist(), proc.tolist())
+                aggregate_rows(hosts, hash_documents(docs))
+            elapsed += time.perf_counter() - t0
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        results[name] = (elapsed, peak)
+        print(f"{name:>7}: {n_rows / elapsed:>12,.0f} rows/s  peak {peak / 2**20:>8.1f} MiB per chunk  ({elapsed:.1f}s)")
+    return results
+
+
+def bench_window_engine(n_events=1_000_000, n_entities=5000):
+    """
+    Single-core throughput of the per-event sliding-window feature engine, as the library
+    runs it and with the cyclic GC paused around the call (a caller-side option; the output
+    rows are acyclic, so full-heap GC scans are pure overhead there).
+    """
+    import gc
+    from window_engine import SlidingWindowEngine
+
+    events = synthetic_events(n_events, n_entities=n_entities)
+    print(f"\n=== Sliding-window engine: {n_events:,} events, {n_entities:,} entities per source ===")
+    best = {}
+    for label, pause_gc in (("gc on", False), ("gc paused", True)):
+        for run in range(3):
+            engine = SlidingWindowEngine()
+            gc_was_enabled = gc.isenabled()
+            if pause_gc:
+                gc.disable()
+            try:
+                start = time.perf_counter()
+                engine.process_events(events)
+                rate = n_events / (time.perf_counter() - start)
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+            best[label] = max(best.get(label, 0.0), rate)
+            print(f"  {label:>9} run {run + 1}: {rate:>12,.0f} events/s")
+    for label, rate in best.items():
+        print(f"  {label:>9} best: {rate:>12,.0f} events/s")
+    return best["gc on"]
+
+
+def bench_forest_inference(batch_sizes=(1, 10, 100, 1_000, 10_000, 100_000, 1_000_000), n_features=4):
+    """sklearn IsolationForest vs the compiled array forest: load time and decision_function latency."""
+    import joblib
+    import numpy as np
+    from sklearn.ensemble import IsolationForest
+    from compiled_forest import compile_forest, CompiledForest
+
+    rng = np.random.default_rng(0)
+    model = IsolationForest(random_state=42).fit(rng.normal(size=(20_000, n_features)))
+    print(f"\n=== IsolationForest inference: {len(model.estimators_)} trees, {n_features} features ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        pkl, compiled_dir = os.path.join(tmp, "model.pkl"), os.path.join(tmp, "model.forest")
+        joblib.dump(model, pkl)
+        compile_forest(model).save(compiled_dir)
+        t0 = time.perf_counter()
+        joblib.load(pkl)
+        t1 = time.perf_counter()
+        forest = CompiledForest.load(compiled_dir)
+        t2 = time.perf_counter()
+        print(f"load: joblib {(t1 - t0) * 1000:.1f} ms, memory-mapped {(t2 - t1) * 1000:.2f} ms")
+
+        print(f"{'batch':>10} {'sklearn ms':>11} {'compiled ms':>12} {'speedup':>8} {'max |diff|':>11}")
+        rows = []
+        for n in batch_sizes:
+            X = rng.normal(size=(n, n_features))
+            repeats = max(1, min(200, 20_000 // n))
+            timings = {}
+            for name, fn in (("sklearn", model.decision_function), ("compiled", forest.decision_function)):
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    out = fn(X)
+                timings[name] = ((time.perf_counter() - start) / repeats, out)
+            diff = float(np.abs(timings["sklearn"][1] - timings["compiled"][1]).max())
+            sk, cf = timings["sklearn"][0], timings["compiled"][0]
+            rows.append((n, sk, cf, diff))
+            print(f"{n:>10,} {sk * 1000:>11.3f} {cf * 1000:>12.3f} {sk / cf:>7.1f}x {diff:>11.2e}")
+    return rows
+
+
+def bench_ip_enrichment(n_events=2_000_000, n_ips=50_000, n_intel=20_000):
+    """CIDR tag enrichment throughput: per-event LRU path and the vectorized IPv4 path."""
+    import numpy as np
+    from ip_enrich import CidrTable, DEFAULT_TABLES, enrich_events
+
+    rng = np.random.default_rng(0)
+    intel = [f"{a}.{b}.{c}.0/24" for a, b, c in rng.integers(1, 224, size=(n_intel, 3))]
+    table = CidrTable({**DEFAULT_TABLES, "threat_intel": intel})
+    ips = [f"{a}.{b}.{c}.{d}" for a, b, c, d in rng.integers(0, 256, size=(n_ips, 4))]
+    picks = rng.integers(0, n_ips, size=n_events)
+    events = [{"attributes": {"src_ip": ips[i], "dst_ip": ips[j]}} for i, j in zip(picks, picks[::-1])]
+    print(f"\n=== IP enrichment: {n_events:,} events, {n_ips:,} distinct IPs, {n_intel:,} intel CIDRs ===")
+
+    start = time.perf_counter()
+    enrich_events(events, table)
+    secs = time.perf_counter() - start
+    info = table.tags_of.cache_info()
+    print(f"  per-event (LRU): {n_events / secs:>12,.0f} events/s  (hit rate {info.hits / max(1, info.hits + info.misses):.1%})")
+
+    batch = [ips[i] for i in picks]
+    start = time.perf_counter()
+    table.masks_v4(batch)
+    secs = time.perf_counter() - start
+    print(f"  vectorized v4:   {n_events / secs:>12,.0f} IPs/s")
+    return secs
+
+
+def bench_ingest_rollup(bucket_secs=60, bursts=(1, 5, 20), seed=0):
+    """
+    Rollup on the bundled firewall data, end to end from CSV: reduction ratio and speedup of
+    ingest → features → scoring → correlation, with the bundled flows as-is and with each flow
+    repeated as a burst. Scoring uses the model offset directly so the run leaves the score
+    cache and thresholds alone.
+    """
+    import pandas as pd
+    from ingest import ingest_all
+    from features import firewall_features, INTEL_PREFIX
+    from detect import MODEL_DIR, DATA_DIR, load_model, latest_event_by_entity
+    from correlator import correlate
+
+    rng = random.Random(seed)
+    model = load_model(os.path.join(MODEL_DIR, "iforest_fw.pkl"))
+    base = pd.read_csv(os.path.join(DATA_DIR, "train_firewall.csv"))
+
+    def pipeline(path, rollup_secs):
+        events = ingest_all({"firewall": path}, rollup_secs=rollup_secs)
+        df = firewall_features(events)
+        X = df.drop(columns=["src_ip"] + [c for c in df.columns if c.startswith(INTEL_PREFIX)]).values
+        scores = model.decision_function(X)
+        latest = latest_event_by_entity(events, "src_ip")
+        anomalies = [{"source": "firewall", "entity": ip, "score": float(-s), "event": latest[ip],
+                      "timestamp": latest[ip].get("last_timestamp") or latest[ip]["timestamp"]}
+                     for ip, s in zip(df["src_ip"], scores) if s < 0]
+        return len(events), df, anomalies, correlate(anomalies)
+
+    print(f"\n=== Ingest rollup on train_firewall.csv ({len(base):,} flows, {bucket_secs}s buckets) ===")
+    print(f"{'burst':>6} {'events':>10} {'records':>10} {'reduction':>10} {'raw s':>8} {'rollup s':>9} {'speedup':>8} {'same':>5}")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for burst in bursts:
+            stamps = pd.to_datetime(base["timestamp"])
+            copies = [base]
+            for j in range(1, burst):  # identical repeats a few seconds apart
+                offsets = pd.to_timedelta([rng.randint(0, 5) * j % 30 for _ in range(len(base))], unit="s")
+                copies.append(base.assign(timestamp=(stamps + offsets).dt.strftime("%Y-%m-%dT%H:%M:%S.%f")))
+            path = os.path.join(tmp, f"firewall_x{burst}.csv")
+            pd.concat(copies).to_csv(path, index=False)
+
+            start = time.perf_counter()
+            n_events, raw_df, raw_anoms, raw_incs = pipeline(path, None)
+            raw_secs = time.perf_counter() - start
+
+            start = time.perf_counter()
+            n_records, roll_df, roll_anoms, roll_incs = pipeline(path, bucket_secs)
+            roll_secs = time.perf_counter() - start
+
+            same = raw_df.round(6).equals(roll_df.round(6)) and \
+                [a["entity"] for a in raw_anoms] == [a["entity"] for a in roll_anoms] and \
+                [i["key"] for i in raw_incs] == [i["key"] for i in roll_incs]
+            ratio = n_events / max(1, n_records)
+            rows.append((burst, n_events, n_records, ratio, raw_secs, roll_secs, same))
+            print(f"{burst:>6} {n_events:>10,} {n_records:>10,} {ratio:>9.2f}x {raw_secs:>8.2f} {roll_secs:>9.2f} "
+                  f"{raw_secs / roll_secs:>7.2f}x {str(same):>5}")
+    return rows
+
+
+def bench_triage_queue(n_incidents=100_000, n_updates=1000, k=10, seed=0):
+    """
+    Triage queue on synthetic incidents: first load (heapify), incremental sync after
+    feedback weight updates, top-k and claim, against re-reading and sorting every incident.
+    Uses throwaway databases.
+    """
+    import store
+    import triage
+
+    rng = random.Random(seed)
+    start_ts = datetime(2025, 1, 1)
+    incidents = [{
+        "incident_id": new_id("inc"), "key": f"user{i}||10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+        "score": rng.random(), "events": [None] * rng.randint(1, 20),
+        "start_time": start_ts, "end_time": start_ts + timedelta(minutes=rng.randint(0, 600)),
+    } for i in range(n_incidents)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tdb, sdb = os.path.join(tmp, "triage.db"), os.path.join(tmp, "feedback_store.db")
+        t = time.perf_counter()
+        triage.enqueue(incidents, conn=triage.connect(tdb))
+        enqueue_secs = time.perf_counter() - t
+
+        queue = triage.TriageQueue(path=tdb, store_path=sdb)
+        t = time.perf_counter()
+        queue.sync()
+        load_secs = time.perf_counter() - t
+
+        picks = [rng.choice(incidents)["incident_id"] for _ in range(n_updates)]
+        store.adjust_weights(((i, rng.choice((0.1, -0.1))) for i in picks), conn=store.connect(sdb))
+        t = time.perf_counter()
+        queue.sync()
+        sync_secs = time.perf_counter() - t
+
+        t = time.perf_counter()
+        top = queue.top(k)
+        top_secs = time.perf_counter() - t
+        t = time.perf_counter()
+        queue.claim(k, assignee="bench")
+        claim_secs = time.perf_counter() - t
+
+        # baseline: what the dashboard would do without the queue
+        t = time.perf_counter()
+        conn = triage.connect(tdb)
+        rows = conn.execute("SELECT key, incident_id, score FROM entries").fetchall()
+        weights = store.get_weights([r["incident_id"] for r in rows], conn=store.connect(sdb))
+        expected = sorted(((r["score"] + weights.get(r["incident_id"], 0.0), r["key"]) for r in rows),
+                          key=lambda x: (-x[0], x[1]))[:k]
+        resort_secs = time.perf_counter() - t
+
+    same = [it["key"] for it in top] == [key for _, key in expected]
+    print(f"\n=== Triage queue ({n_incidents:,} incidents, {n_updates:,} weight updates, top {k}) ===")
+    print(f"  enqueue:                  {enqueue_secs:8.3f}s")
+    print(f"  first load (heapify):     {load_secs:8.3f}s")
+    print(f"  sync after updates:       {sync_secs * 1000:8.1f} ms")
+    print(f"  top-{k} (synced):          {top_secs * 1000:8.2f} ms")
+    print(f"  claim {k}:                 {claim_secs * 1000:8.2f} ms")
+    print(f"  re-read + sort baseline:  {resort_secs * 1000:8.1f} ms   (same top-{k}: {same})")
+    return {"enqueue": enqueue_secs, "load": load_secs, "sync": sync_secs, "top": top_secs,
+            "claim": claim_secs, "resort": resort_secs, "same": same}
+
+
+BENCHMARKS = {
+    "scaling": bench_partition_scaling,
+    "cmdline": bench_cmdline_features,
+    "window": bench_window_engine,
+    "forest": bench_forest_inference,
+    "ipenrich": bench_ip_enrichment,
+    "rollup": bench_ingest_rollup,
+    "triage": bench_triage_queue,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark {name!r}. Available: {', '.join(BENCHMARKS)}")
+            continue
+        BENCHMARKS[name]()
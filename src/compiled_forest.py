@@ -0,0 +1,200 @@
+import os
+import json
+import numpy as np
+
+from score_cache import model_version
+
+# === COMPILED ISOLATION FOREST ===
+# A fitted sklearn IsolationForest flattened into three NumPy arrays. Every tree is laid out
+# as a complete binary tree of the forest's max depth D (IsolationForest caps depth at
+# log2(max_samples), so D is small), which makes the children implicit: node i of a tree
+# continues at 2i+1 (left) or 2i+2 (right).
+#   feature[t*W + i]   split feature (already mapped through the tree's feature subset)
+#   threshold[t*W + i] go left when x[feature] <= threshold; +inf below a real leaf
+#   value[t*L + j]     path length credited at bottom slot j: depth + c(n_node_samples)
+#                      of the real leaf above it (sklearn's formula)
+# with W = 2^(D+1) - 1 slots and L = 2^D bottom slots per tree. Scoring walks all trees for
+# a block of rows at once, D vectorized steps, with no per-row or per-tree Python work.
+
+ARRAYS = ("feature", "threshold", "value")
+BLOCK_ROWS = 256              # rows per traversal block; keeps the (rows x trees) state in cache
+PARALLEL_MIN_ROWS = 16384     # split larger batches over threads (NumPy releases the GIL)
+MAX_SLOTS = 2 ** 26           # refuse to compile forests whose complete layout would be huge
+
+
+def average_path_length(n):
+    """c(n): average path length of an unsuccessful BST search, as in sklearn."""
+    n = np.asarray(n, dtype=np.float64)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return out
+
+
+class CompiledForest:
+    """Drop-in for IsolationForest.score_samples / decision_function / predict on dense input."""
+
+    def __init__(self, arrays, meta):
+        for name in ARRAYS:
+            setattr(self, name, np.asarray(arrays[name]).view(np.ndarray))
+        self.meta = meta
+        self.n_features_in_ = meta["n_features_in"]
+        self.offset_ = meta["offset"]
+        self.depth = meta["depth"]
+        self.n_trees = meta["n_trees"]
+        self.denominator = meta["denominator"]
+
+        width = 2 ** (self.depth + 1) - 1
+        tree = np.arange(self.n_trees, dtype=np.intp)
+        self._roots = (tree * width)[None, :]
+        # global slot g of tree t steps to 2g + 1 - t*W (+1 when going right)
+        self._step = (1 - tree * width)[None, :]
+        # global bottom slot of tree t → index into value
+        self._leaf_base = tree * 2 ** self.depth - (2 ** self.depth - 1) - tree * width
+
+    def _path_lengths(self, X):
+        """Sum over trees of the path length of each row (X: float64, one block)."""
+        n, n_trees = len(X), self.n_trees
+        Xf = X.ravel()
+        row_base = (np.arange(n, dtype=np.intp) * X.shape[1])[:, None]
+        slot = np.broadcast_to(self._roots, (n, n_trees)).copy()
+        feat = np.empty((n, n_trees), dtype=np.intp)
+        x = np.empty((n, n_trees), dtype=np.float64)
+        thr = np.empty((n, n_trees), dtype=np.float64)
+        right = np.empty((n, n_trees), dtype=bool)
+        for _ in range(self.depth):
+            self.feature.take(slot, out=feat)
+            feat += row_base
+            Xf.take(feat, out=x)
+            self.threshold.take(slot, out=thr)
+            np.greater(x, thr, out=right)
+            slot *= 2
+            slot += self._step
+            slot += right
+        return self.value.take(slot + self._leaf_base).sum(axis=1)
+
+    def _depths(self, X):
+        return np.concatenate([self._path_lengths(X[lo:lo + BLOCK_ROWS])
+                               for lo in range(0, len(X), BLOCK_ROWS)]) if len(X) else np.zeros(0)
+
+    def score_samples(self, X):
+        # sklearn's trees compare float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32), dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got shape {X.shape}")
+        workers = os.cpu_count() or 1
+        if workers > 1 and len(X) >= PARALLEL_MIN_ROWS:
+            from concurrent.futures import ThreadPoolExecutor
+            step = -(-len(X) // workers)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                depths = np.concatenate(list(pool.map(self._depths, [X[lo:lo + step] for lo in range(0, len(X), step)])))
+        else:
+            depths = self._depths(X)
+        return -(2.0 ** (-depths / self.denominator))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+    def save(self, path):
+        """Write the arrays as .npy files (plus meta.json) into directory `path`, atomically."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(tmp, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(self.meta, f, indent=2)
+        if os.path.isdir(path):
+            import shutil
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Memory-mapped load: the arrays are paged in on first use, not read up front."""
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in ARRAYS}
+        return cls(arrays, meta)
+
+
+def compile_forest(model, source_version=None):
+    """Flatten a fitted (dense-input) IsolationForest into a CompiledForest."""
+    trees = list(zip(model.estimators_, model.estimators_features_))
+    depth = max(est.tree_.max_depth for est, _ in trees)
+    width, n_leaves = 2 ** (depth + 1) - 1, 2 ** depth
+    if len(trees) * width > MAX_SLOTS:
+        raise ValueError(f"Forest too deep to compile (depth {depth}, {len(trees)} trees)")
+
+    feature = np.zeros((len(trees), width), dtype=np.intp)
+    threshold = np.full((len(trees), width), np.inf)
+    value = np.zeros((len(trees), n_leaves))
+    for t, (est, feat_subset) in enumerate(trees):
+        tree = est.tree_
+        leaf_len = average_path_length(tree.n_node_samples)
+        stack = [(0, 0, 0)]  # (sklearn node, complete-tree slot, depth)
+        while stack:
+            node, slot, d = stack.pop()
+            left, right = tree.children_left[node], tree.children_right[node]
+            if left == -1:
+                # sklearn: (nodes on the path) + c(samples in leaf) - 1; every bottom slot
+                # under this leaf gets it, and +inf thresholds route rows straight down
+                lo = hi = slot
+                for _ in range(depth - d):
+                    lo, hi = 2 * lo + 1, 2 * hi + 2
+                value[t, lo - (n_leaves - 1):hi - (n_leaves - 1) + 1] = (d + 1) + leaf_len[node] - 1.0
+            else:
+                feature[t, slot] = feat_subset[tree.feature[node]]
+                threshold[t, slot] = tree.threshold[node]
+                stack.append((left, 2 * slot + 1, d + 1))
+                stack.append((right, 2 * slot + 2, d + 1))
+
+    arrays = {"feature": feature.ravel(), "threshold": threshold.ravel(), "value": value.ravel()}
+    meta = {
+        "n_features_in": int(model.n_features_in_),
+        "offset": float(model.offset_),
+        "depth": int(depth),
+        "n_trees": len(trees),
+        "denominator": float(len(trees) * average_path_length([model.max_samples_])[0]),
+        "source_version": source_version,
+    }
+    return CompiledForest(arrays, meta)
+
+
+# === MODEL FILE INTEGRATION ===
+def compiled_path(model_path):
+    return os.path.splitext(model_path)[0] + ".forest"
+
+
+def load_for(model_path, model=None):
+    """
+    Compiled forest for a pickled IsolationForest, using (or refreshing) the memory-mapped
+    copy next to it. Returns None when the model can't be compiled (e.g. sparse input) so
+    callers keep using the sklearn model.
+    """
+    version = model_version(model_path)
+    if version is None:
+        return None
+    path = compiled_path(model_path)
+    try:
+        forest = CompiledForest.load(path)
+        if forest.meta.get("source_version") == version:
+            return forest
+    except (OSError, ValueError, KeyError):
+        pass
+
+    try:
+        if model is None:
+            import joblib
+            model = joblib.load(model_path)
+        if not hasattr(model, "estimators_features_"):
+            return None
+        compile_forest(model, source_version=version).save(path)
+        return CompiledForest.load(path)
+    except Exception as e:
+        print(f"[WARN] Could not compile {os.path.basename(model_path)}: {e}")
+        return None
@@ -3,15 +3,15 @@ import json
 from datetime import datetime, timedelta
 from collections import defaultdict
 import uuid
+from incident_index import index_incidents
+import triage
+import artifacts
+import eventstore
+from ip_enrich import key_tags
 
 # === CONFIG ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
-ANOMALY_DIR = os.path.join(DATA_DIR, "anomalies")
-CORR_DIR = os.path.join(DATA_DIR, "correlations")
-
-# Ensure correlation folder exists
-os.makedirs(CORR_DIR, exist_ok=True)
 
 
 # === HELPER: Extract correlation keys ===
@@ -43,6 +43,15 @@ def extract_key_fields(anomaly):
     return username, host, src_ip
 
 
+def intel_tags(anomaly):
+    """Flagging CIDR tags (threat intel, scanners, …) of the anomaly's IPs, e.g. 'scanners'."""
+    attrs = anomaly.get("event", {}).get("attributes", {})
+    tags = set()
+    for attr in ("src_ip_tags", "dst_ip_tags"):
+        tags.update((key_tags(attrs.get(attr)) or "").split(","))
+    return ",".join(sorted(t for t in tags if t)) or None
+
+
 # === MAIN CORRELATION LOGIC ===
 def correlate(anomalies, window_minutes=30):
     """
@@ -59,52 +68,81 @@ def correlate(anomalies, window_minutes=30):
     for a in anomalies:
         user, host, ip = extract_key_fields(a)
         key = f"{user or ''}|{host or ''}|{ip or ''}"
+        intel = intel_tags(a)
+        if intel:
+            key += f"|{intel}"
         grouped[key].append(a)
 
     # Build correlated incidents
     for key, events in grouped.items():
         if not events:
             continue
+        correlated.append(build_incident(key, events))
 
-        start = events[0].get("timestamp")
-        end = events[-1].get("timestamp")
-        duration = (end - start).total_seconds() / 60 if start and end else 0
+    return correlated
 
-        score = min(1.0, 0.2 * len(events) + (duration / 60) * 0.05)
 
-        correlated.append({
-            "incident_id": str(uuid.uuid4()),
-            "key": key,
-            "events": events,
-            "score": score,
-            "start_time": start.isoformat() if start else None,
-            "end_time": end.isoformat() if end else None,
-            "duration_mins": duration,
-        })
+def build_incident(key, events, incident_id=None):
+    """Summarize a time-sorted list of anomalies sharing one correlation key."""
+    start = events[0].get("timestamp")
+    end = events[-1].get("timestamp")
+    duration = (end - start).total_seconds() / 60 if start and end else 0
 
-    return correlated
+    score = min(1.0, 0.2 * len(events) + (duration / 60) * 0.05)
+
+    return {
+        "incident_id": incident_id or str(uuid.uuid4()),
+        "key": key,
+        "events": events,
+        # raw events behind the anomalies (rolled-up records count for all they fold)
+        "event_count": sum(a.get("event", {}).get("count") or 1 for a in events),
+        "score": score,
+        "start_time": start.isoformat() if start else None,
+        "end_time": end.isoformat() if end else None,
+        "duration_mins": duration,
+    }
+
+
+# === MERGE PARTIAL RESULTS ===
+def merge_incidents(incident_lists):
+    """
+    Reconcile incidents produced independently (per shard or per partition):
+    incidents sharing a correlation key are folded into one, keeping the first ID seen.
+    """
+    merged = {}
+    for incidents in incident_lists:
+        for inc in incidents:
+            key = inc["key"]
+            if key in merged:
+                merged[key]["events"].extend(inc["events"])
+            else:
+                merged[key] = {"incident_id": inc["incident_id"], "events": list(inc["events"])}
+
+    result = []
+    for key, m in merged.items():
+        events = sorted(m["events"], key=lambda x: x.get("timestamp") or datetime.min)
+        result.append(build_incident(key, events, incident_id=m["incident_id"]))
+    return result
 
 
 # === LOAD ALL ANOMALIES ===
 def load_all_anomalies():
     """Load and combine all anomalies from JSON files."""
     all_anomalies = []
-    for file in os.listdir(ANOMALY_DIR):
-        if file.endswith(".json"):
-            path = os.path.join(ANOMALY_DIR, file)
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    for a in data:
-                        ts = a.get("timestamp") or a.get("event", {}).get("timestamp")
-                        if isinstance(ts, str):
-                            try:
-                                a["timestamp"] = datetime.fromisoformat(ts.replace(" ", "T"))
-                            except Exception:
-                                a["timestamp"] = None
-                        all_anomalies.append(a)
-            except Exception as e:
-                print(f"[WARN] Failed to load {file}: {e}")
+    for path in artifacts.iter_paths("anomalies"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = eventstore.resolve(json.load(f))
+                for a in data:
+                    ts = a.get("timestamp") or a.get("event", {}).get("timestamp")
+                    if isinstance(ts, str):
+                        try:
+                            a["timestamp"] = datetime.fromisoformat(ts.replace(" ", "T"))
+                        except Exception:
+                            a["timestamp"] = None
+                    all_anomalies.append(a)
+        except Exception as e:
+            print(f"[WARN] Failed to load {os.path.basename(path)}: {e}")
     print(f"[INFO] Loaded total anomalies: {len(all_anomalies)}")
     return all_anomalies
 
@@ -114,14 +152,25 @@ def save_correlations(correlated_data):
     """Save correlated incidents to a JSON file under data/correlations/."""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"correlation_{timestamp}.json"
-    path = os.path.join(CORR_DIR, filename)
-
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(correlated_data, f, indent=4, default=str)
+        payload = [{**inc, "events": eventstore.without_events(inc["events"])} for inc in correlated_data]
+        path = artifacts.save_json("correlations", filename, payload)
         print(f"[INFO] Correlation results saved → {path}")
     except Exception as e:
         print(f"[ERROR] Failed to save correlation file: {e}")
+        return
+
+    try:
+        indexed = index_incidents(correlated_data, correlation_file=filename)
+        print(f"[INFO] Indexed {indexed} incidents for entity lookup")
+    except Exception as e:
+        print(f"[WARN] Failed to update incident index: {e}")
+
+    try:
+        queued = triage.enqueue(correlated_data, correlation_file=filename)
+        print(f"[INFO] Queued {queued} incidents for triage")
+    except Exception as e:
+        print(f"[WARN] Failed to update triage queue: {e}")
 
 
 # === MAIN RUNNER ===
@@ -1,10 +1,20 @@
 import os
+import sys
 import joblib
 import json
+import time
 from datetime import datetime
 from ingest import ingest_all
-from features import auth_features, process_features, firewall_features
-from sklearn.ensemble import IsolationForest
+from features import (
+    auth_features, process_features, firewall_features,
+    process_cmdline_features, process_cmdline_frame, token_rarity, clean_field, INTEL_PREFIX
+)
+from rerank import rerank_anomalies
+from score_cache import score_with_cache, model_version
+import artifacts
+import eventstore
+import compiled_forest
+import thresholds
 import numpy as np
 
 # === Base Directories ===
@@ -12,14 +22,30 @@ BASE = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR = os.path.abspath(os.path.join(BASE, ".."))
 DATA_DIR = os.path.join(ROOT_DIR, "data")
 MODEL_DIR = os.path.join(ROOT_DIR, "models")
-RETRAINED_DIR = os.path.join(ROOT_DIR, "retrained_model")  # match retrain.py folder
-ANOMALY_DIR = os.path.join(DATA_DIR, "anomalies")
-
-os.makedirs(ANOMALY_DIR, exist_ok=True)
+CMDLINE_MODEL_PATH = os.path.join(MODEL_DIR, "iforest_proc_cmd.pkl")
+MODEL_PATHS = {
+    "auth": os.path.join(MODEL_DIR, "iforest_auth.pkl"),
+    "process": os.path.join(MODEL_DIR, "iforest_proc.pkl"),
+    "firewall": os.path.join(MODEL_DIR, "iforest_fw.pkl"),
+}
+# (source, feature function, entity column) per baseline detector
+DETECTORS = [
+    ("auth", auth_features, "username"),
+    ("process", process_features, "host"),
+    ("firewall", firewall_features, "src_ip"),
+]
 
 
 # === Helper: Load Model ===
-def load_model(path):
+def load_model(path, compiled=True):
+    """
+    compiled=True returns the memory-mapped array form of a dense IsolationForest
+    (see compiled_forest.py), falling back to the pickled sklearn model.
+    """
+    if compiled:
+        forest = compiled_forest.load_for(path)
+        if forest is not None:
+            return forest
     try:
         return joblib.load(path)
     except Exception:
@@ -29,16 +55,7 @@ def load_model(path):
 # === Helper: Get Latest Adaptive Model ===
 def get_latest_retrained_model():
     """Return the latest adaptive model path if exists."""
-    if not os.path.exists(RETRAINED_DIR):
-        return None
-    retrained_files = [f for f in os.listdir(RETRAINED_DIR) if f.endswith(".joblib")]
-    if not retrained_files:
-        return None
-    latest = max(
-        [os.path.join(RETRAINED_DIR, f) for f in retrained_files],
-        key=os.path.getmtime
-    )
-    return latest
+    return artifacts.latest_path("models")
 
 
 # === Load Models ===
@@ -48,27 +65,32 @@ def load_models():
     if latest_adaptive:
         print(f"🧠 Using Adaptive Correlation-Aware Model Influence: {latest_adaptive}")
         try:
-            adaptive_model = joblib.load(latest_adaptive)
+            adaptive_model = compiled_forest.load_for(latest_adaptive) or joblib.load(latest_adaptive)
             return {"adaptive": adaptive_model}
         except Exception as e:
             print(f"⚠️ Failed to load adaptive model ({e}). Falling back to baseline models.")
 
     print("⚙️ Using baseline models (no adaptive model found).")
-    return {
-        "auth": load_model(os.path.join(MODEL_DIR, "iforest_auth.pkl")),
-        "process": load_model(os.path.join(MODEL_DIR, "iforest_proc.pkl")),
-        "firewall": load_model(os.path.join(MODEL_DIR, "iforest_fw.pkl")),
-    }
+    return {source: load_model(path) for source, path in MODEL_PATHS.items()}
 
 
 # === Save Detected Anomalies ===
-def save_anomalies(anomalies):
+def save_anomalies(anomalies, events=None):
+    """
+    Save anomalies. When the run's events are given they are written once to the columnar
+    event store and anomalies keep only a row reference instead of an embedded copy.
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"anomalies_{timestamp}.json"
-    path = os.path.join(ANOMALY_DIR, filename)
+    payload = [dict(a) for a in anomalies]
+    if events:
+        try:
+            ref, rows = eventstore.write_events(events)
+            eventstore.to_refs(payload, ref, rows)
+        except Exception as e:
+            print(f"[WARN] Event store unavailable, embedding events ({e})")
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(anomalies, f, indent=4, default=str)
+        path = artifacts.save_json("anomalies", filename, payload)
         print(f"[INFO] Saved anomalies → {path}")
         return path
     except Exception as e:
@@ -76,13 +98,8 @@ def save_anomalies(anomalies):
         return None
 
 
-# === Detection Logic ===
-def detect(mapping):
-    events = ingest_all(mapping)
-    models = load_models()
-    anomalies = []
-
-    # === Adaptive Sensitivity Influence ===
+# === Adaptive Sensitivity Influence ===
+def calibrate_contamination(models):
     adaptive_model = models.get("adaptive")
     if adaptive_model:
         try:
@@ -91,18 +108,87 @@ def detect(mapping):
             adaptive_score = abs(adaptive_model.decision_function(dummy_features)[0])
             contamination_level = float(min(0.5, max(0.05, adaptive_score)))
             print(f"🧩 Adaptive sensitivity calibrated → contamination={contamination_level:.3f}")
+            return contamination_level
         except Exception as e:
             print(f"⚠️ Adaptive sensitivity fallback ({e})")
-            contamination_level = 0.1
-    else:
-        contamination_level = 0.1
+    return 0.1
+
+
+# === Helper: Representative Event per Entity ===
+def latest_event_by_entity(evs, key):
+    """
+    Map each entity value to its most recent event (events arrive time-sorted). A rolled-up
+    record counts as recent as its last folded event, so a later-starting event only replaces
+    it when it is not older than that.
+    """
+    latest = {}
+    for e in evs:
+        entity = e["attributes"].get(key) or "unknown"
+        prev = latest.get(entity)
+        if prev is None:
+            latest[entity] = e
+            continue
+        seen, ts = _last_seen(prev), _last_seen(e)
+        if seen is None or (ts is not None and ts >= seen):
+            latest[entity] = e
+    return latest
+
+
+def _last_seen(event):
+    return event.get("last_timestamp") or event.get("timestamp")
+
+
+# === Scoring ===
+def score_events(events, contamination_level=0.1):
+    """Feature extraction + IsolationForest scoring for a batch of canonical events."""
+    return flag_scored(score_batch(events, contamination_level))
+
+
+def _feature_matrix(df, key):
+    intel_cols = [c for c in df.columns if c.startswith(INTEL_PREFIX)]
+    return df.drop(columns=[key] + intel_cols, errors="ignore").select_dtypes(include=[float, int]).values
+
+
+def _fit_fallback(X, contamination_level):
+    from sklearn.ensemble import IsolationForest
+    return IsolationForest(contamination=contamination_level, random_state=42).fit(X)
+
+
+def resolve_models(events, contamination_level=0.1):
+    """
+    The model each detector scores a batch with: its model path, or, when the baseline model
+    is missing, a quick IsolationForest fitted on the whole batch. Partitioned runs resolve
+    once and hand the result to every shard, so a fallback isn't fitted per shard.
+    """
+    models = {}
+    for ev_type, feature_fn, key in DETECTORS:
+        path = MODEL_PATHS[ev_type]
+        if load_model(path) is not None:
+            models[ev_type] = path
+            continue
+        evs = [e for e in events if e.get("source") == ev_type]
+        df = feature_fn(evs) if evs else None
+        if df is None or df.empty:
+            continue
+        print(f"⚠️ No baseline model for {ev_type}, training quick adaptive baseline...")
+        models[ev_type] = _fit_fallback(_feature_matrix(df, key), contamination_level)
+    if any(e.get("source") == "process" for e in events):
+        load_or_train_cmdline_model(contamination_level)  # fit once here, not in each shard
+    return models
+
+
+def score_batch(events, contamination_level=0.1, models=None):
+    """
+    Per-detector entity scores for a batch, before any alert threshold is applied. Returns a
+    list of {source, detector, entities, scores, preds, events} with scores higher = more
+    anomalous, preds the model's own decisions and events each entity's representative event.
+    Partitioned runs score shards with this and pass the merged lists to flag_scored().
+    models: resolve_models() output; without it each detector's model is resolved on this batch.
+    """
+    scored = []
 
     # === Use baseline models with adaptive sensitivity ===
-    for ev_type, feature_fn, key in [
-        ("auth", auth_features, "username"),
-        ("process", process_features, "host"),
-        ("firewall", firewall_features, "src_ip")
-    ]:
+    for ev_type, feature_fn, key in DETECTORS:
         evs = [e for e in events if e.get("source") == ev_type]
         if not evs:
             continue
@@ -111,32 +197,160 @@ def detect(mapping):
         if df.empty:
             continue
 
-        X = df.drop(columns=[key], errors="ignore").select_dtypes(include=[float, int]).values
-        baseline_model = load_model(os.path.join(MODEL_DIR, f"iforest_{ev_type[:4]}.pkl"))
+        X = _feature_matrix(df, key)
+        model = (models or {}).get(ev_type, MODEL_PATHS[ev_type])
+        if isinstance(model, str):
+            baseline_model = load_model(model)
+            version = model_version(model) if baseline_model is not None else None
+        else:
+            baseline_model, version = model, None  # fitted in the parent, never cached
 
         # If baseline model missing, train a temporary one dynamically
         if baseline_model is None:
             print(f"⚠️ No baseline model for {ev_type}, training quick adaptive baseline...")
-            baseline_model = IsolationForest(
-                contamination=contamination_level,
-                random_state=42
-            ).fit(X)
-
-        preds = baseline_model.predict(X)
-        scores = baseline_model.decision_function(X)
-
-        for i, p in enumerate(preds):
-            if p == -1:
-                anomalies.append({
-                    "source": ev_type,
-                    "entity": df.iloc[i].get(key),
-                    "score": float(-scores[i]),
-                    "event": evs[i],
-                    "timestamp": evs[i].get("timestamp", "N/A")
-                })
+            baseline_model = _fit_fallback(X, contamination_level)
+
+        entities = df[key].tolist()
+        preds, scores, cache_stats = score_with_cache(baseline_model, version, ev_type, entities, X)
+        if version is not None:
+            print(f"💾 Score cache [{ev_type}]: {cache_stats['hits']}/{cache_stats['entities']} entities reused, "
+                  f"{cache_stats['evicted']} evicted")
+
+        # attach the entity's own latest event, not an unrelated positional one
+        latest = latest_event_by_entity(evs, key)
+        scored.append({"source": ev_type, "detector": ev_type, "entities": entities,
+                       "scores": list(-np.asarray(scores)), "preds": list(preds),
+                       "events": [latest.get(entity, {}) for entity in entities]})
+
+    # === Hashed command-line / parent-child features (sparse) ===
+    proc_evs = [e for e in events if e.get("source") == "process"]
+    if proc_evs:
+        cmdline = score_cmdline(proc_evs, contamination_level)
+        if cmdline:
+            scored.append(cmdline)
+    return scored
+
+
+def flag_scored(scored, thresholds_db=None):
+    """
+    Anomalies from score_batch() output of one batch (or of all its shards): each detector's
+    scores are merged and go through its online threshold once, so the decisions don't
+    depend on how the batch was split. thresholds_db: threshold store other than the live one.
+    """
+    merged = {}
+    for s in scored:
+        m = merged.setdefault(s["detector"], {"source": s["source"], "entities": [], "scores": [],
+                                              "preds": [], "events": []})
+        for field in ("entities", "scores", "preds", "events"):
+            m[field].extend(s[field])
+
+    anomalies = []
+    for detector, m in merged.items():
+        scores = np.asarray(m["scores"], dtype=np.float64)
+        # the decision comes from the detector's online threshold, not the model's fixed offset
+        preds = thresholds.flag(detector, scores, np.asarray(m["preds"]), thresholds_db)
+        for entity, p, score, ev in zip(m["entities"], preds, scores, m["events"]):
+            if p != -1:
+                continue
+            anomaly = {
+                "source": m["source"],
+                "entity": entity,
+                "score": float(score),
+                "event": ev,
+                "timestamp": ev.get("last_timestamp") or ev.get("timestamp", "N/A")
+            }
+            if detector != m["source"]:
+                anomaly["detector"] = detector
+            anomalies.append(anomaly)
 
     anomalies.sort(key=lambda x: x["score"], reverse=True)
-    saved_path = save_anomalies(anomalies)
+    return anomalies
+
+
+# === Command-line Model ===
+def load_or_train_cmdline_model(contamination_level=0.1):
+    """Load the sparse command-line model, fitting it once on train_process.csv if missing."""
+    model = load_model(CMDLINE_MODEL_PATH, compiled=False)  # sparse input stays on sklearn
+    if model is not None:
+        return model
+
+    train_path = os.path.join(DATA_DIR, "train_process.csv")
+    if not os.path.exists(train_path):
+        return None
+    print("⚠️ No command-line model found, training one on train_process.csv...")
+    import pandas as pd
+    from sklearn.ensemble import IsolationForest
+    _, X = process_cmdline_frame(pd.read_csv(train_path))
+    model = IsolationForest(contamination=contamination_level, random_state=42).fit(X)
+    tmp = f"{CMDLINE_MODEL_PATH}.{os.getpid()}.tmp"
+    joblib.dump(model, tmp)
+    os.replace(tmp, CMDLINE_MODEL_PATH)
+    return model
+
+
+def score_cmdline(proc_evs, contamination_level=0.1):
+    """
+    Score hosts on hashed command-line tokens and parent/child pairs (IsolationForest on CSR
+    input). Returns a score_batch() entry, or None without a command-line model.
+    """
+    model = load_or_train_cmdline_model(contamination_level)
+    if model is None:
+        return None
+    hosts, X, X_events = process_cmdline_features(proc_evs, return_event_matrix=True)
+    scores = model.decision_function(X)
+    preds = np.where(scores < 0, -1, 1)  # IsolationForest.predict, without a second pass
+
+    # represent each flagged host by its rarest command line (e.g. the lsass dump), not its latest
+    rarity = token_rarity(X_events)
+    rarest = {}
+    for ev, r in zip(proc_evs, rarity):
+        host = clean_field(ev["attributes"].get("host"), "unknown")
+        if host not in rarest or r > rarest[host][0]:
+            rarest[host] = (r, ev)
+
+    return {"source": "process", "detector": "cmdline", "entities": list(hosts),
+            "scores": list(-scores), "preds": list(preds),
+            "events": [rarest.get(host, (0, {}))[1] for host in hosts]}
+
+
+# === Feedback-aware re-ranking ===
+def apply_rerank(anomalies, scoring_secs):
+    try:
+        anomalies, rerank_stats = rerank_anomalies(anomalies)
+        if rerank_stats["unique_summaries"]:
+            share = rerank_stats["seconds"] / max(scoring_secs, 1e-9)
+            print(
+                f"🔀 Feedback re-rank: {rerank_stats['unique_summaries']} unique summaries "
+                f"({rerank_stats['cache_hits']} cached) in {rerank_stats['seconds'] * 1000:.1f} ms "
+                f"= {share:.1%} of scoring time"
+            )
+    except Exception as e:
+        print(f"⚠️ Feedback re-rank skipped ({e})")
+    return anomalies
+
+
+# === Detection Logic ===
+def detect(mapping, per_event=False, rollup_secs=None):
+    """
+    per_event=False: score per-entity aggregates (default).
+    per_event=True: score every event on its entity's sliding-window statistics.
+    rollup_secs: fold identical flows/logins per time bucket at ingest (aggregate mode only;
+    per-event windows need every event).
+    """
+    events = ingest_all(mapping, rollup_secs=None if per_event else rollup_secs)
+    models = load_models()
+    contamination_level = calibrate_contamination(models)
+
+    scoring_start = time.perf_counter()
+    if per_event:
+        from window_engine import score_events_windowed
+        anomalies = score_events_windowed(events)
+    else:
+        anomalies = score_events(events, contamination_level)
+    scoring_secs = time.perf_counter() - scoring_start
+
+    anomalies = apply_rerank(anomalies, scoring_secs)
+    saved_path = save_anomalies(anomalies, events)
     return anomalies, saved_path
 
 
@@ -148,7 +362,8 @@ if __name__ == "__main__":
         "firewall": os.path.join(DATA_DIR, "train_firewall.csv"),
     }
 
-    anomalies, saved_path = detect(mapping)
+    rollup = next((int(a.split("=", 1)[1]) for a in sys.argv if a.startswith("--rollup=")), None)
+    anomalies, saved_path = detect(mapping, per_event="--per-event" in sys.argv, rollup_secs=rollup)
 
     print("\n=== Detection Summary ===")
     print(f"✅ Total anomalies detected: {len(anomalies)}")
@@ -0,0 +1,174 @@
+import os
+from collections import OrderedDict
+from datetime import datetime
+
+import artifacts
+
+# === COLUMNAR EVENT STORE ===
+# Each detection run writes its canonical events once, as an Arrow IPC file under
+# data/events/. Later stages (correlate, explain, parsers) carry {"store", "row"} references
+# instead of embedded event dicts, memory-map the file and materialize only the rows they
+# need. Timestamps stay a native int64 (timestamp[us]) column the whole way.
+
+# attribute columns per source, in the order normalize_row produces them
+SOURCE_ATTRS = {
+    "auth": ["username", "src_ip", "auth_method", "outcome", "src_ip_tags"],
+    "process": ["host", "username", "process_name", "parent_process", "cmdline", "event_type"],
+    "firewall": ["src_ip", "dst_ip", "dst_port", "protocol", "action", "bytes", "src_ip_tags", "dst_ip_tags"],
+}
+ATTR_COLUMNS = list(dict.fromkeys(c for cols in SOURCE_ATTRS.values() for c in cols))
+NUMERIC_ATTRS = {"bytes": "float64", "dst_port": "int64"}
+
+MAX_OPEN_STORES = 16
+_open = OrderedDict()
+
+
+def _schema():
+    import pyarrow as pa
+    fields = [
+        pa.field("event_id", pa.string()),
+        pa.field("timestamp", pa.timestamp("us")),
+        pa.field("source", pa.dictionary(pa.int8(), pa.string())),
+        pa.field("entity", pa.string()),
+        pa.field("event_type", pa.string()),
+        # set on rolled-up records only (ingest.rollup_frame)
+        pa.field("count", pa.int64()),
+        pa.field("last_timestamp", pa.timestamp("us")),
+    ]
+    for col in ATTR_COLUMNS:
+        typ = NUMERIC_ATTRS.get(col)
+        fields.append(pa.field(f"attr_{col}", pa.float64() if typ == "float64" else pa.int64() if typ else pa.string()))
+    return pa.schema(fields)
+
+
+def _clean(value, typ):
+    if value is None or (isinstance(value, float) and value != value):  # None / NaN
+        return None
+    if typ == "float64":
+        return float(value)
+    if typ == "int64":
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
+
+# === WRITE ===
+def write_events(events, name=None, register=True):
+    """
+    Write canonical events as one Arrow IPC file. Returns (store ref, {event_id: row}).
+    register=False leaves the artifact manifest to the caller (e.g. the parent of worker processes).
+    """
+    import pyarrow as pa
+
+    schema = _schema()
+    columns = {
+        "event_id": [e.get("event_id") for e in events],
+        "timestamp": [e.get("timestamp") for e in events],
+        "source": [e.get("source") for e in events],
+        "entity": [e.get("entity") for e in events],
+        "event_type": [e.get("event_type") for e in events],
+        "count": [e.get("count") for e in events],
+        "last_timestamp": [e.get("last_timestamp") for e in events],
+    }
+    for col in ATTR_COLUMNS:
+        typ = NUMERIC_ATTRS.get(col)
+        columns[f"attr_{col}"] = [_clean(e.get("attributes", {}).get(col), typ) for e in events]
+
+    table = pa.Table.from_pydict(
+        {f.name: pa.array(columns[f.name], type=f.type) for f in schema}, schema=schema
+    )
+    name = name or f"events_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.arrow"
+    path = artifacts.partition_path("events", name)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            writer.write_table(table)
+    if register:
+        ref = artifacts.register("events", path, records=len(events))["path"]
+    else:
+        ref = os.path.relpath(path, artifacts.root_of("events"))
+    rows = {e.get("event_id"): i for i, e in enumerate(events)}
+    return ref, rows
+
+
+# === READ ===
+def open_store(ref):
+    """Memory-mapped, zero-copy Arrow table for a store ref (cached per process)."""
+    import pyarrow as pa
+    table = _open.get(ref)
+    if table is None:
+        source = pa.memory_map(os.path.join(artifacts.root_of("events"), ref), "r")
+        table = pa.ipc.open_file(source).read_all()
+        _open[ref] = table
+        if len(_open) > MAX_OPEN_STORES:
+            _open.popitem(last=False)
+    else:
+        _open.move_to_end(ref)
+    return table
+
+
+def timestamps_us(ref):
+    """The timestamp column as int64 microseconds since epoch (no per-row parsing)."""
+    import pyarrow as pa
+    col = open_store(ref).column("timestamp")
+    return col.cast(pa.int64()).to_numpy(zero_copy_only=False)
+
+
+def take(ref, rows):
+    """Materialize only the requested rows as canonical event dicts."""
+    table = open_store(ref).take(list(rows))
+    events = []
+    for rec in table.to_pylist():
+        source = rec["source"]
+        # stores written before a column existed simply lack it
+        attrs = {col: rec.get(f"attr_{col}") for col in SOURCE_ATTRS.get(source, ATTR_COLUMNS)}
+        ev = {
+            "event_id": rec["event_id"],
+            "timestamp": rec["timestamp"],
+            "source": source,
+            "entity": rec["entity"],
+            "event_type": rec["event_type"],
+            "attributes": attrs,
+        }
+        if rec.get("count"):
+            ev["count"], ev["last_timestamp"] = rec["count"], rec.get("last_timestamp")
+        events.append(ev)
+    return events
+
+
+# === REFERENCES ===
+def to_refs(items, ref, rows):
+    """Replace embedded events with {"store", "row"} references where the event is in the store."""
+    for item in items:
+        ev = item.get("event") or {}
+        row = rows.get(ev.get("event_id"))
+        if row is not None:
+            item["event_ref"] = {"store": ref, "row": row}
+            item.pop("event", None)
+    return items
+
+
+def resolve(items):
+    """Fill item["event"] (and a datetime timestamp) for every referenced item, one take per store."""
+    pending = {}
+    for item in items:
+        ref = item.get("event_ref")
+        if ref and "event" not in item:
+            pending.setdefault(ref["store"], []).append(item)
+
+    for store, group in pending.items():
+        try:
+            events = take(store, [it["event_ref"]["row"] for it in group])
+        except Exception as e:
+            print(f"[WARN] Event store {store} unavailable: {e}")
+            continue
+        for item, ev in zip(group, events):
+            item["event"] = ev
+            item["timestamp"] = ev["timestamp"]
+    return items
+
+
+def without_events(items):
+    """Shallow copies with referenced events dropped again, ready to be written out."""
+    return [{k: v for k, v in item.items() if not (k == "event" and item.get("event_ref"))} for item in items]
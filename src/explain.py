@@ -1,21 +1,26 @@
 import os
 import json
-import requests
+import time
+import hashlib
 from dotenv import load_dotenv
 from datetime import datetime
+import artifacts
+import eventstore
+import explain_cache
 
 # === CONFIG ===
 load_dotenv()
 
-CORR_DIR = "data/correlations"
-OUTPUT_DIR = "data/explanations"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
+OUTPUT_DIR = artifacts.root_of("explanations")
+LATENCY_LOG = os.path.join(OUTPUT_DIR, "latency_log.jsonl")
 
-LLM_API_ENDPOINT = "https://openrouter.ai/api/v1/chat/completions"
+# override with the mock server (src/mock_llm.py) for local testing
+LLM_API_ENDPOINT = os.getenv("LLM_API_ENDPOINT", "https://openrouter.ai/api/v1/chat/completions")
 LLM_API_KEY = os.getenv("OPENROUTER_API_KEY")
 MODEL_NAME = "nvidia/nemotron-nano-12b-v2-vl:free"
 
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
 
 def summarize_incident(incident):
     """Convert incident JSON into a readable summary with timestamps."""
@@ -27,7 +32,7 @@ def summarize_incident(incident):
         "Events (chronological):"
     ]
 
-    events_sorted = sorted(incident.get("events", []), key=lambda e: e.get("timestamp", ""))
+    events_sorted = sorted(incident.get("events", []), key=lambda e: str(e.get("timestamp", "")))
 
     for e in events_sorted:
         ts = e.get("timestamp", "Unknown time")
@@ -55,8 +60,8 @@ def summarize_incident(incident):
     return "\n".join(summary_lines)
 
 
-def call_llm(prompt):
-    """Send the incident summary to OpenRouter and get an explanation."""
+def build_request(prompt):
+    """Headers and payload for an OpenRouter chat completion."""
     headers = {
         "Authorization": f"Bearer {LLM_API_KEY}",
         "HTTP-Referer": "https://your-app-or-demo-url.com/",
@@ -89,69 +94,191 @@ Please explain:
         ],
         "max_tokens": 800
     }
+    return headers, data
 
-    try:
-        print("📡 Calling LLM API for explanation...")
-        resp = requests.post(LLM_API_ENDPOINT, headers=headers, json=data, timeout=60)
+
+def prompt_version():
+    """Fingerprint of the model and prompt wording; cached explanations from another version are evicted."""
+    _, data = build_request("{prompt}")
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def stream_llm(prompt):
+    """
+    Stream the explanation from OpenRouter, yielding text chunks as they arrive.
+    Consumes the server-sent-event stream (`data: {...}` lines, ending with `data: [DONE]`).
+    """
+    import requests  # only needed when actually calling the LLM
+    headers, data = build_request(prompt)
+    data["stream"] = True
+
+    with requests.post(LLM_API_ENDPOINT, headers=headers, json=data, timeout=60, stream=True) as resp:
         resp.raise_for_status()
-        result = resp.json()
-        if "choices" in result:
-            return result["choices"][0]["message"]["content"].strip()
-        return "No explanation returned."
+        for raw in resp.iter_lines():
+            # SSE is always UTF-8; requests would guess ISO-8859-1 for a charset-less text/event-stream
+            line = raw.decode("utf-8")
+            # blank keep-alives and ": comment" lines carry no payload
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                break
+            try:
+                chunk = json.loads(payload)
+            except json.JSONDecodeError:
+                continue
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+            text = (choices[0].get("delta") or {}).get("content")
+            if text:
+                yield text
+
+
+def call_llm(prompt, incidents=None):
+    """
+    Send the incident summary to OpenRouter and get an explanation. Given the incidents the
+    prompt was built from, near-duplicates of past incidents are answered from explain_cache.
+    """
+    def fetch(p):
+        print("📡 Calling LLM API for explanation...")
+        return "".join(stream_llm(p)).strip()
+
+    try:
+        if incidents is not None:
+            text, _ = explain_cache.cached_explanation(prompt, incidents, prompt_version(), fetch)
+        else:
+            text = fetch(prompt)
+        return text or "No explanation returned."
     except Exception as e:
         print("❌ LLM call failed:", e)
         return "Explanation not available (LLM error)."
 
 
 def get_latest_correlation_file():
-    """Return the path of the latest JSON file in the correlations folder."""
-    files = [
-        os.path.join(CORR_DIR, f)
-        for f in os.listdir(CORR_DIR)
-        if f.endswith(".json")
-    ]
-    if not files:
-        return None
-    latest_file = max(files, key=os.path.getmtime)
-    return latest_file
+    """Return the path of the latest correlation artifact."""
+    return artifacts.latest_path("correlations")
 
 
-def explain_latest_correlation():
-    """Generate explanation only for the latest correlation JSON file."""
+def load_latest_correlation(incident_id=None):
+    """(path, incidents) for the latest correlation file, optionally narrowed to one incident."""
     latest_file = get_latest_correlation_file()
-
     if not latest_file:
-        print("⚠️ No correlation files found in folder.")
-        return
+        return None, []
 
-    print(f"🕵️ Processing latest correlation file → {latest_file}")
     with open(latest_file, "r", encoding="utf-8") as f:
         data = json.load(f)
 
     if not isinstance(data, list):
         print("[WARN] Unexpected JSON format — skipping.")
-        return
+        return latest_file, []
+    if incident_id:
+        data = [i for i in data if str(i.get("incident_id")) == str(incident_id)]
+    eventstore.resolve([e for inc in data for e in inc.get("events", [])])
+    return latest_file, data
 
-    combined_text = "\n\n".join([summarize_incident(i) for i in data])
-    explanation = call_llm(combined_text)
 
+def explanation_path(correlation_file, incident_id=None):
+    suffix = f"_{incident_id}_explanation.json" if incident_id else "_explanation.json"
+    return artifacts.partition_path("explanations", os.path.basename(correlation_file).replace(".json", suffix))
+
+
+def write_explanation(out_path, correlation_file, incidents, combined_text, explanation, status="complete", metrics=None):
     output = {
-        "correlation_file": os.path.basename(latest_file),
-        "num_incidents": len(data),
+        "correlation_file": os.path.basename(correlation_file),
+        "num_incidents": len(incidents),
         "explanation": explanation,
         "combined_summary": combined_text,
+        "status": status,
         "generated_at": datetime.now().isoformat()
     }
+    if metrics:
+        output["latency"] = metrics
+    tmp = out_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as out_f:
+        json.dump(output, out_f, indent=4)
+    os.replace(tmp, out_path)
 
-    out_filename = os.path.basename(latest_file).replace(".json", "_explanation.json")
-    out_path = os.path.join(OUTPUT_DIR, out_filename)
 
-    with open(out_path, "w", encoding="utf-8") as out_f:
-        json.dump(output, out_f, indent=4)
+def log_latency(metrics):
+    with open(LATENCY_LOG, "a", encoding="utf-8") as f:
+        f.write(json.dumps(metrics) + "\n")
+
+
+def explain_streaming(incident_id=None, flush_secs=0.5):
+    """
+    Stream an explanation for the latest correlation file (or one incident in it).
+    Yields ("token", text) as chunks arrive and finally ("done", metrics).
+    Partial text is persisted under data/explanations/ while streaming.
+    """
+    latest_file, data = load_latest_correlation(incident_id)
+    if not latest_file or not data:
+        yield "error", "No matching correlation data found."
+        return
+
+    combined_text = "\n\n".join([summarize_incident(i) for i in data])
+    out_path = explanation_path(latest_file, incident_id)
+
+    start = time.perf_counter()
+    version = prompt_version()
+    cached, cache_info = explain_cache.try_lookup(combined_text, data, version)
+    first_token = None
+    last_flush = start
+    parts = []
+    status = "complete"
+    try:
+        for text in [cached] if cached is not None else stream_llm(combined_text):
+            now = time.perf_counter()
+            if first_token is None:
+                first_token = now - start
+            parts.append(text)
+            yield "token", text
+            if now - last_flush >= flush_secs:
+                write_explanation(out_path, latest_file, data, combined_text, "".join(parts), status="streaming")
+                last_flush = now
+    except Exception as e:
+        print("❌ LLM stream failed:", e)
+        status = "error"
+        parts.append("\n[Explanation interrupted (LLM error).]")
+        yield "token", parts[-1]
+
+    metrics = {
+        "incident_id": incident_id or "all",
+        "correlation_file": os.path.basename(latest_file),
+        "output_file": out_path,
+        "ttft_secs": round(first_token, 3) if first_token is not None else None,
+        "total_secs": round(time.perf_counter() - start, 3),
+        "chars": sum(len(p) for p in parts),
+        "status": status,
+        "cache": explain_cache.public_info(cache_info),
+        "at": datetime.now().isoformat()
+    }
+    explanation = "".join(parts).strip() or "No explanation returned."
+    if status == "complete":
+        explain_cache.remember(cache_info, "".join(parts).strip(), metrics["total_secs"], version)
+    write_explanation(out_path, latest_file, data, combined_text, explanation, status=status, metrics=metrics)
+    artifacts.register("explanations", out_path, records=len(data))
+    log_latency(metrics)
+    yield "done", metrics
+
+
+def explain_latest_correlation(incident_id=None):
+    """Generate explanation only for the latest correlation JSON file."""
+    print(f"🕵️ Processing latest correlation file → {get_latest_correlation_file()}")
+    print("📡 Calling LLM API for explanation...")
+    for kind, value in explain_streaming(incident_id):
+        if kind == "token":
+            print(value, end="", flush=True)
+        elif kind == "error":
+            print(f"⚠️ {value}")
+            return
+        elif kind == "done":
+            print(f"\n✅ Explanation saved → {value['output_file']}")
+            print(f"⏱️ First token {value['ttft_secs']}s, total {value['total_secs']}s")
 
-    print(f"✅ Explanation saved → {out_path}")
     print("🏁 Completed successfully.")
 
 
 if __name__ == "__main__":
-    explain_latest_correlation()
+    import sys
+    explain_latest_correlation(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,376 @@
+import os
+import re
+import sys
+import time
+import hashlib
+import sqlite3
+from datetime import datetime
+
+from utils import parse_ts
+
+# faiss and the embedding model (via feedback.py) are imported only when a lookup misses the
+# exact-match path, so the common repeat-pattern hit never loads them.
+
+# === PATHS ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
+CACHE_DB = os.path.join(DATA_DIR, "explain_cache.db")
+CACHE_INDEX_PATH = os.path.join(DATA_DIR, "explain_cache.faiss")
+
+# === POLICY ===
+ENABLED = os.getenv("EXPLAIN_CACHE", "1") != "0"
+SIMILARITY = float(os.getenv("EXPLAIN_CACHE_SIMILARITY", "0.95"))  # cosine, masked summaries
+MAX_AGE_DAYS = 30        # entries not used for this long are evicted
+MAX_ENTRIES = 5000       # beyond this the least recently used entries are evicted
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL,
+    version TEXT NOT NULL,
+    masked_summary TEXT NOT NULL,
+    template TEXT NOT NULL,
+    vector BLOB,
+    llm_secs REAL NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_entries_digest ON entries(digest, version);
+CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used);
+
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+) WITHOUT ROWID;
+"""
+COUNTERS = ("lookups", "hits", "exact_hits", "misses", "stores", "evictions", "saved_secs")
+
+
+# === MASKING ===
+# Entities and times are replaced by numbered placeholders in order of first appearance, so
+# the same attack pattern on other hosts/users/IPs/times yields the same masked summary.
+# The cached explanation keeps the placeholders and is re-filled from the new incident.
+# Scores and durations stay in the summary (and so in the digest): small numbers also occur
+# in ordinary prose ("Step 1", "3 attempts"), so they can't be templated back safely.
+ENTITY_ATTRS = {"username": "USER", "host": "HOST", "src_ip": "IP", "dst_ip": "IP"}
+IP_RE = re.compile(r"(?<![\w.:])(?:\d{1,3}\.){3}\d{1,3}(?![\w.])")
+TIME_RE = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?")
+PLACEHOLDER_RE = re.compile(r"<([A-Z]+_\d+)(?:\|([^>]+))?>")
+# shorter renderings of a time the LLM tends to quote; filled back with strftime
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%H:%M:%S", "%H:%M", "%Y-%m-%d")
+
+
+def _values(incidents):
+    """(value, kind) pairs worth masking, from the incidents' structured fields."""
+    for inc in incidents:
+        if inc.get("incident_id"):
+            yield str(inc["incident_id"]), "INCIDENT"
+        for part in str(inc.get("key") or "").split("|"):
+            if part and part != "None":
+                yield part, "IP" if IP_RE.fullmatch(part) else "ENTITY"
+        for e in inc.get("events", []):
+            attrs = (e.get("event") or {}).get("attributes", {})
+            for attr, kind in ENTITY_ATTRS.items():
+                if attrs.get(attr):
+                    yield str(attrs[attr]), kind
+
+
+def mask(text, incidents):
+    """(masked text, {placeholder: value}) for a summary built by explain.summarize_incident."""
+    kinds = dict(_values(incidents))
+    kinds.update((m.group(0), "IP") for m in IP_RE.finditer(text))
+    kinds.update((m.group(0), "TIME") for m in TIME_RE.finditer(text))
+    kinds = {v: k for v, k in kinds.items() if v and v in text}
+    if not kinds:
+        return text, {}
+
+    pattern = re.compile(r"(?<![\w.])(?:" + "|".join(re.escape(v) for v in sorted(kinds, key=len, reverse=True)) + r")(?![\w]|\.\d)")
+    bindings, names, counters = {}, {}, {}
+    for m in pattern.finditer(text):
+        value = m.group(0)
+        if value not in names:
+            kind = kinds[value]
+            counters[kind] = counters.get(kind, 0) + 1
+            names[value] = f"{kind}_{counters[kind]}"
+            bindings[names[value]] = value
+    return pattern.sub(lambda m: f"<{names[m.group(0)]}>", text), bindings
+
+
+def to_template(explanation, bindings):
+    """The explanation with this incident's values (and shorter time renderings) as placeholders."""
+    forms = {}
+    for name, value in bindings.items():
+        forms.setdefault(value, f"<{name}>")
+        if name.startswith("TIME_"):
+            ts = parse_ts(value)
+            for fmt in TIME_FORMATS if ts else ():
+                forms.setdefault(ts.strftime(fmt), f"<{name}|{fmt}>")
+    if not forms:
+        return explanation
+    pattern = re.compile(r"(?<![\w.:])(?:" + "|".join(re.escape(v) for v in sorted(forms, key=len, reverse=True)) + r")(?![\w:]|\.\d)")
+    return pattern.sub(lambda m: forms[m.group(0)], explanation)
+
+
+def fill(template, bindings):
+    """Re-template a cached explanation for new bindings; None if a placeholder has no value."""
+    missing = False
+
+    def sub(m):
+        nonlocal missing
+        name, fmt = m.group(1), m.group(2)
+        value = bindings.get(name)
+        if value is None:
+            missing = True
+            return m.group(0)
+        if fmt:
+            ts = parse_ts(value)
+            return ts.strftime(fmt) if ts else value
+        return value
+
+    text = PLACEHOLDER_RE.sub(sub, template)
+    return None if missing else text
+
+
+def digest_of(masked):
+    return hashlib.sha1(masked.encode("utf-8")).hexdigest()
+
+
+# === STORE ===
+def connect(path=None):
+    conn = sqlite3.connect(path or CACHE_DB, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def bump(conn, **deltas):
+    conn.executemany(
+        "INSERT INTO stats VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+        [(name, float(delta)) for name, delta in deltas.items()]
+    )
+
+
+def _load_index(conn):
+    """FAISS index over entry vectors (ids = entry ids), rebuilt from SQLite if out of sync."""
+    import numpy as np
+    import faiss
+    rows = conn.execute("SELECT id, vector FROM entries WHERE vector IS NOT NULL").fetchall()
+    if os.path.exists(CACHE_INDEX_PATH):
+        index = faiss.read_index(CACHE_INDEX_PATH)
+        if index.ntotal == len(rows):
+            return index
+    if not rows:
+        return None
+    vectors = np.vstack([np.frombuffer(blob, dtype="float32") for _, blob in rows])
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))  # IP = cosine on normalized vectors
+    index.add_with_ids(vectors, np.array([i for i, _ in rows], dtype="int64"))
+    _save_index(index)
+    return index
+
+
+def _save_index(index):
+    import faiss
+    tmp = f"{CACHE_INDEX_PATH}.{os.getpid()}.tmp"
+    faiss.write_index(index, tmp)
+    os.replace(tmp, CACHE_INDEX_PATH)
+
+
+# === CACHE API ===
+def lookup(summary, incidents, version):
+    """
+    Cached explanation for an incident summary, re-templated with this incident's entities:
+    (text, info) on a hit, (None, info) on a miss. `info` carries the masked summary, the
+    bindings and the query vector so store() doesn't recompute them.
+    """
+    start = time.perf_counter()
+    masked, bindings = mask(summary, incidents)
+    info = {"masked": masked, "bindings": bindings, "digest": digest_of(masked), "vector": None}
+    conn = connect()
+    try:
+        candidates = [(row, 1.0, True) for row in conn.execute(
+            "SELECT id, template, llm_secs FROM entries WHERE digest = ? AND version = ? ORDER BY last_used DESC",
+            (info["digest"], version))]
+        if not candidates:
+            candidates = _similar(conn, masked, version, info)
+
+        for (entry_id, template, llm_secs), similarity, exact in candidates:
+            text = fill(template, bindings)
+            if text is None:
+                continue
+            lookup_secs = time.perf_counter() - start
+            conn.execute("UPDATE entries SET last_used = ?, hits = hits + 1 WHERE id = ?", (time.time(), entry_id))
+            bump(conn, lookups=1, hits=1, exact_hits=int(exact),
+                 saved_secs=max(0.0, llm_secs - lookup_secs))
+            info.update(entry_id=entry_id, similarity=round(similarity, 4), lookup_secs=round(lookup_secs, 4),
+                        saved_secs=round(max(0.0, llm_secs - lookup_secs), 3))
+            return text, info
+        bump(conn, lookups=1, misses=1)
+        return None, info
+    finally:
+        conn.close()
+
+
+def _embed(masked):
+    """Embedding of a masked summary, or None without faiss / sentence-transformers (exact matches only)."""
+    try:
+        import faiss  # noqa: F401
+        from feedback import encode_text
+        return encode_text(masked)  # imports sentence-transformers on first use
+    except ImportError:
+        return None
+
+
+def _similar(conn, masked, version, info, k=5):
+    """Entries whose masked summary embeds within SIMILARITY of this one, best first."""
+    import numpy as np
+    info["vector"] = _embed(masked)
+    if info["vector"] is None:
+        return []
+    index = _load_index(conn)
+    if index is None or not index.ntotal:
+        return []
+    D, I = index.search(np.expand_dims(info["vector"], axis=0), min(k, index.ntotal))
+    found = []
+    for entry_id, similarity in zip(I[0], D[0]):
+        if entry_id < 0 or similarity < SIMILARITY:
+            continue
+        row = conn.execute("SELECT id, template, llm_secs FROM entries WHERE id = ? AND version = ?",
+                           (int(entry_id), version)).fetchone()
+        if row:
+            found.append((row, float(similarity), False))
+    return found
+
+
+def store(info, explanation, llm_secs, version):
+    """Cache a fresh LLM explanation under the masked summary from lookup(), then evict."""
+    import numpy as np
+    template = to_template(explanation, info["bindings"])
+    vector = info.get("vector")
+    if vector is None:
+        vector = _embed(info["masked"])
+    if vector is not None:
+        vector = np.asarray(vector, dtype="float32")
+    now = time.time()
+    conn = connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # also serializes index rewrites between writers
+        try:
+            index = _load_index(conn) if vector is not None else None  # in sync with the rows before this insert
+            cur = conn.execute(
+                "INSERT INTO entries (digest, version, masked_summary, template, vector, llm_secs, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (info["digest"], version, info["masked"], template,
+                 vector.tobytes() if vector is not None else None, llm_secs, now, now))
+            evicted = _evict(conn, version, now)
+            bump(conn, stores=1, evictions=len(evicted))
+            if vector is not None:
+                if index is None:
+                    import faiss
+                    index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[0]))
+                index.add_with_ids(np.expand_dims(vector, axis=0), np.array([cur.lastrowid], dtype="int64"))
+                if evicted:
+                    index.remove_ids(np.array(evicted, dtype="int64"))
+                _save_index(index)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return len(evicted)
+
+
+def _evict(conn, version, now):
+    """Delete stale entries (other prompt/model version, unused for MAX_AGE_DAYS, over MAX_ENTRIES)."""
+    stale = [i for (i,) in conn.execute(
+        "SELECT id FROM entries WHERE version != ? OR last_used < ?", (version, now - MAX_AGE_DAYS * 86400))]
+    stale += [i for (i,) in conn.execute(
+        "SELECT id FROM entries WHERE version = ? AND last_used >= ? ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+        (version, now - MAX_AGE_DAYS * 86400, MAX_ENTRIES))]
+    conn.executemany("DELETE FROM entries WHERE id = ?", [(i,) for i in stale])
+    return stale
+
+
+def try_lookup(summary, incidents, version):
+    """lookup() with info["cache"] set to "hit", "miss" or "off"; failures never block the LLM path."""
+    if not ENABLED:
+        return None, {"cache": "off"}
+    try:
+        text, info = lookup(summary, incidents, version)
+    except Exception as e:
+        print(f"[WARN] Explanation cache unavailable ({e}); calling the LLM")
+        return None, {"cache": "off"}
+    if text is not None:
+        print(f"♻️ Reused cached explanation (similarity {info['similarity']}, saved ~{info['saved_secs']}s)")
+    return text, dict(info, cache="hit" if text is not None else "miss")
+
+
+def remember(info, explanation, llm_secs, version):
+    """Cache a fresh explanation after a lookup miss; only logs on failure."""
+    if info.get("cache") != "miss" or not explanation:
+        return
+    try:
+        store(info, explanation, llm_secs, version)
+    except Exception as e:
+        print(f"[WARN] Could not cache explanation: {e}")
+
+
+def cached_explanation(summary, incidents, version, llm):
+    """
+    Explanation through the cache: a hit is re-templated from a past explanation, a miss
+    calls llm(summary) (which should raise on failure) and caches its answer.
+    Returns (text, info).
+    """
+    text, info = try_lookup(summary, incidents, version)
+    if text is None:
+        start = time.perf_counter()
+        text = llm(summary)
+        remember(info, text, time.perf_counter() - start, version)
+    return text, info
+
+
+def public_info(info):
+    """The JSON-safe part of a lookup's info (no vector/bindings)."""
+    return {k: v for k, v in info.items() if k in ("cache", "similarity", "lookup_secs", "saved_secs")}
+
+
+# === STATS ===
+def get_stats(conn=None):
+    own = conn is None
+    conn = conn or connect()
+    try:
+        stats = {name: 0.0 for name in COUNTERS}
+        stats.update(conn.execute("SELECT name, value FROM stats").fetchall())
+        entries, oldest = conn.execute("SELECT COUNT(*), MIN(created_at) FROM entries").fetchone()
+    finally:
+        if own:
+            conn.close()
+    stats = {k: (round(v, 3) if k == "saved_secs" else int(v)) for k, v in stats.items()}
+    stats.update(entries=entries, hit_rate=round(stats["hits"] / max(1, stats["lookups"]), 4),
+                 oldest_entry=datetime.fromtimestamp(oldest).isoformat(timespec="seconds") if oldest else None)
+    return stats
+
+
+def clear():
+    conn = connect()
+    try:
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM stats")
+    finally:
+        conn.close()
+    if os.path.exists(CACHE_INDEX_PATH):
+        os.remove(CACHE_INDEX_PATH)
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if cmd == "stats":
+        for name, value in get_stats().items():
+            print(f"{name:>14}: {value}")
+    elif cmd == "clear":
+        clear()
+        print("🧹 Explanation cache cleared")
+    else:
+        print("Usage: python src/explain_cache.py [stats|clear]")
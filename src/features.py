@@ -2,6 +2,17 @@
 from collections import defaultdict
 import pandas as pd
 import numpy as np
+from ip_enrich import has_tag, key_tags
+
+# Columns prefixed "intel_" come from the CIDR enrichment stage (ip_enrich.py). The baseline
+# models were fitted without them, so detect drops them before scoring those models.
+INTEL_PREFIX = "intel_"
+
+# Rolled-up records (ingest.rollup_frame) stand for e["count"] identical events seen between
+# e["timestamp"] and e["last_timestamp"]; every aggregate below weights by that count so the
+# features match the un-rolled data.
+def _count(e):
+    return e.get("count") or 1
 
 def auth_features(events):
     # aggregated per user
@@ -12,19 +23,28 @@ def auth_features(events):
     rows = []
     for user, evs in per_user.items():
         ts = [e["timestamp"] for e in evs if e["timestamp"]]
-        hours = [t.hour for t in ts] if ts else []
+        last_ts = [e.get("last_timestamp") or e["timestamp"] for e in evs if e["timestamp"]]
+        hour_counts = defaultdict(int)
+        for e in evs:
+            if e["timestamp"]:
+                hour_counts[e["timestamp"].hour] += _count(e)
+        hours = list(hour_counts)
         src_ips = [e["attributes"].get("src_ip") for e in evs if e["attributes"].get("src_ip")]
-        failed = sum(1 for e in evs if str(e["attributes"].get("outcome") or "").lower().startswith("fail"))
-        total = len(evs)
+        failed = sum(_count(e) for e in evs if str(e["attributes"].get("outcome") or "").lower().startswith("fail"))
+        src_tags = [(e["attributes"].get("src_ip_tags"), _count(e)) for e in evs if e["attributes"].get("src_ip")]
+        with_ip = sum(n for _, n in src_tags)
+        total = sum(_count(e) for e in evs)
         days_span = 1
         if ts:
-            days_span = (max(ts).date() - min(ts).date()).days + 1
+            days_span = (max(last_ts).date() - min(ts).date()).days + 1
         rows.append({
             "username": user,
             "avg_logins_per_day": total / max(1, days_span),
             "unique_ips": len(set(src_ips)),
-            "hour_mode": max(set(hours), key=hours.count) if hours else 0,
-            "failed_ratio": failed / total if total > 0 else 0.0
+            "hour_mode": max(set(hours), key=hour_counts.get) if hours else 0,
+            "failed_ratio": failed / total if total > 0 else 0.0,
+            "intel_external_ratio": sum(n for t, n in src_tags if not has_tag(t, "internal")) / max(1, with_ip),
+            "intel_flagged_logins": sum(n for t, n in src_tags if key_tags(t)),
         })
     return pd.DataFrame(rows).fillna(0)
 
@@ -40,7 +60,7 @@ def process_features(events):
         rows.append({
             "host": host,
             "unique_procs": unique_procs,
-            "proc_count": len(procs)
+            "proc_count": sum(_count(ev) for ev in evs if ev["attributes"].get("process_name"))
         })
     return pd.DataFrame(rows).fillna(0)
 
@@ -53,9 +73,102 @@ def firewall_features(events):
     for ip, evs in per_ip.items():
         dsts = set(e["attributes"].get("dst_ip") for e in evs if e["attributes"].get("dst_ip"))
         bytes_count = sum(float(e["attributes"].get("bytes") or 0) for e in evs)
+        dst_tags = {e["attributes"].get("dst_ip"): e["attributes"].get("dst_ip_tags") for e in evs}
         rows.append({
             "src_ip": ip,
             "unique_dsts": len(dsts),
-            "bytes": bytes_count
+            "bytes": bytes_count,
+            "intel_external_dsts": sum(1 for d in dsts if not has_tag(dst_tags.get(d), "internal")),
+            "intel_flagged_flows": sum(_count(e) for e in evs if key_tags(e["attributes"].get("src_ip_tags"))
+                                       or key_tags(e["attributes"].get("dst_ip_tags"))),
         })
     return pd.DataFrame(rows).fillna(0)
+
+
+# === HASHED COMMAND-LINE FEATURES (sparse) ===
+CMDLINE_HASH_FEATURES = 2 ** 18
+CMDLINE_TOKEN_PATTERN = r"(?u)[\w\.\-\$]+"
+
+
+def clean_field(value, default=""):
+    """A raw field as text; None, NaN (pandas' missing value) and "" all become `default`."""
+    if value is None or value == "" or (not isinstance(value, str) and pd.isna(value)):
+        return default
+    return str(value)
+
+
+def cmdline_documents(cmdlines, parents, procs):
+    """
+    One text document per process event: command-line tokens plus a single
+    PAIR_<parent>__<child> token, so unusual parent/child combinations hash to their own column.
+    Missing values read the same whether they come from a DataFrame (NaN) or an event (None).
+    """
+    return [
+        f"{clean_field(c)} PAIR_{clean_field(p, 'none')}__{clean_field(n, 'none')}"
+        for c, p, n in zip(cmdlines, parents, procs)
+    ]
+
+
+def hash_documents(docs, n_features=CMDLINE_HASH_FEATURES):
+    """Hashing-trick bag of tokens → CSR matrix. No vocabulary is kept in memory."""
+    from sklearn.feature_extraction.text import HashingVectorizer
+    vectorizer = HashingVectorizer(
+        n_features=n_features,
+        token_pattern=CMDLINE_TOKEN_PATTERN,
+        alternate_sign=False,
+        norm=None,
+        dtype=np.float32,
+    )
+    return vectorizer.transform(docs)
+
+
+def aggregate_rows(keys, X):
+    """
+    Sum the sparse rows of X per key with one sparse matmul. Returns (unique keys, matrix).
+    Missing keys (None/NaN/"") are grouped under "unknown".
+    """
+    import scipy.sparse as sp
+    keys = pd.Series(np.asarray(keys, dtype=object))
+    keys = keys.where(keys.notna() & (keys != ""), "unknown").astype(str)
+    uniq, inverse = np.unique(keys.values, return_inverse=True)
+    indicator = sp.csr_matrix(
+        (np.ones(len(inverse), dtype=np.float32), (inverse, np.arange(len(inverse)))),
+        shape=(len(uniq), len(inverse)),
+    )
+    agg = (indicator @ X).tocsr()
+    agg.data = np.log1p(agg.data)  # dampen raw counts so a noisy host doesn't dominate
+    return list(uniq), agg
+
+
+def process_cmdline_frame(df, n_features=CMDLINE_HASH_FEATURES):
+    """Vectorized path for a raw process-log DataFrame (host, parent_process, process_name, cmdline)."""
+    docs = cmdline_documents(df["cmdline"].values, df["parent_process"].values, df["process_name"].values)
+    return aggregate_rows(df["host"].values, hash_documents(docs, n_features))
+
+
+def token_rarity(X):
+    """Per-row sum of inverse document frequency of its hashed tokens (higher = rarer command line)."""
+    present = X.copy()
+    present.data[:] = 1
+    doc_freq = np.asarray(present.sum(axis=0)).ravel()
+    inv = np.zeros_like(doc_freq, dtype=np.float32)
+    nz = doc_freq > 0
+    inv[nz] = 1.0 / doc_freq[nz]
+    return np.asarray(present @ inv).ravel()
+
+
+def process_cmdline_features(events, n_features=CMDLINE_HASH_FEATURES, return_event_matrix=False):
+    """
+    Per-host hashed sparse command-line / parent-child features for canonical process events.
+    With return_event_matrix=True also returns the per-event matrix (rows aligned with events).
+    """
+    attrs = [e["attributes"] for e in events]
+    docs = cmdline_documents([a.get("cmdline") for a in attrs],
+                             [a.get("parent_process") for a in attrs],
+                             [a.get("process_name") for a in attrs])
+    hosts = [a.get("host") for a in attrs]
+    X_events = hash_documents(docs, n_features)
+    uniq, X = aggregate_rows(hosts, X_events)
+    if return_event_matrix:
+        return uniq, X, X_events
+    return uniq, X
@@ -1,32 +1,67 @@
 import os
 import json
-from datetime import datetime
-import numpy as np
-import faiss
-from joblib import dump, load
-from sentence_transformers import SentenceTransformer
+import store
+
+# numpy, faiss and sentence-transformers are imported inside the functions that need
+# them, so importing this module (e.g. from the dashboard) stays cheap.
 
 # === PATH SETUP ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "..", "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
-FEEDBACK_PATH = os.path.join(DATA_DIR, "feedback_store.json")
 FAISS_INDEX_PATH = os.path.join(DATA_DIR, "feedback_index.faiss")
 META_PATH = os.path.join(DATA_DIR, "feedback_meta.json")
-ADAPTIVE_WEIGHTS_PATH = os.path.join(DATA_DIR, "adaptive_weights.json")
 MODEL_PATH = os.path.join(DATA_DIR, "sentence_model.joblib")  # optional if caching
 
 # === EMBEDDING MODEL (Semantic) ===
 # Use a lightweight, CPU-friendly model
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-MODEL = SentenceTransformer(MODEL_NAME)
+_MODEL = None
+
+def get_model():
+    """Load the embedding model on first use."""
+    global _MODEL
+    if _MODEL is None:
+        from sentence_transformers import SentenceTransformer
+        _MODEL = SentenceTransformer(MODEL_NAME)
+    return _MODEL
 
 def encode_text(text):
     """Generate semantic embeddings for the given text."""
-    emb = MODEL.encode([text], convert_to_numpy=True, normalize_embeddings=True)[0]
+    emb = get_model().encode([text], convert_to_numpy=True, normalize_embeddings=True)[0]
     return emb.astype("float32")
 
+def encode_texts(texts, batch_size=64):
+    """Embed many texts in one batched forward pass."""
+    import numpy as np
+    embs = get_model().encode(list(texts), batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+    return np.asarray(embs, dtype="float32")
+
+def encode_texts_parallel(texts, batch_size=256, workers=None, chunk_size=8192):
+    """
+    Embed a large list of texts: chunks are encoded concurrently on a thread pool (the
+    model's forward pass releases the GIL), each chunk in batches of `batch_size`.
+    """
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, get_model().get_sentence_embedding_dimension()), dtype="float32")
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    get_model()  # load once before the threads share it
+    import torch
+    torch_threads = torch.get_num_threads()
+    # each forward pass is itself multi-threaded; keep workers × intra-op threads ≈ CPUs
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // workers))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(lambda c: encode_texts(c, batch_size=batch_size), chunks))
+    finally:
+        torch.set_num_threads(torch_threads)
+    return np.vstack(parts)
+
 # === HELPER FUNCTIONS ===
 def load_json(path):
     if os.path.exists(path):
@@ -35,35 +70,61 @@ def load_json(path):
     return {}
 
 def save_json(data, path):
-    with open(path, "w") as f:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
         json.dump(data, f, indent=2)
+    os.replace(tmp, path)
 
 # === FEEDBACK STORAGE ===
 def store_feedback(incident_id, label, comment):
     """Store analyst feedback (TP/FP) and create/update embeddings."""
-    feedback_data = load_json(FEEDBACK_PATH)
-    entry = {
-        "incident_id": incident_id,
-        "label": label,
-        "comment": comment,
-        "timestamp": datetime.utcnow().isoformat()
-    }
-    feedback_data[str(incident_id)] = entry
-    save_json(feedback_data, FEEDBACK_PATH)
+    store.add_feedback(incident_id, label, comment)
     upsert_embedding(comment, incident_id, label)
 
 # === VECTOR EMBEDDINGS (FAISS) ===
+def load_index():
+    """Current FAISS index and its metadata list, or (None, []) if nothing is indexed yet."""
+    if not os.path.exists(FAISS_INDEX_PATH):
+        return None, []
+    import faiss
+    index, meta = faiss.read_index(FAISS_INDEX_PATH), load_json(META_PATH).get("data", [])
+    if index.ntotal > len(meta):
+        # a crash between the two renames of publish_index(): drop the vectors whose
+        # metadata never landed, so both describe the same earlier state
+        index.remove_ids(faiss.IDSelectorRange(len(meta), index.ntotal))
+    return index, meta
+
+def stage_index(index, meta):
+    """Write index and metadata to temp files; publish_index() swaps them in."""
+    import faiss
+    staged = (f"{FAISS_INDEX_PATH}.{os.getpid()}.tmp", f"{META_PATH}.{os.getpid()}.tmp")
+    faiss.write_index(index, staged[0])
+    with open(staged[1], "w") as f:
+        json.dump({"data": meta}, f, indent=2)
+    return staged
+
+def publish_index(staged):
+    os.replace(staged[0], FAISS_INDEX_PATH)
+    os.replace(staged[1], META_PATH)  # metadata last: load_index() trims vectors it doesn't describe
+
+def discard_index(staged):
+    for path in staged:
+        if os.path.exists(path):
+            os.remove(path)
+
+def save_index(index, meta):
+    publish_index(stage_index(index, meta))
+
 def upsert_embedding(text, incident_id, label):
     """Create or update FAISS index and metadata for semantic similarity search."""
+    import numpy as np
+    import faiss
     vec = encode_text(text)
     dim = vec.shape[0]
 
-    if os.path.exists(FAISS_INDEX_PATH):
-        index = faiss.read_index(FAISS_INDEX_PATH)
-        meta = load_json(META_PATH).get("data", [])
-    else:
+    index, meta = load_index()
+    if index is None:
         index = faiss.IndexFlatIP(dim)  # IP = cosine similarity for normalized vectors
-        meta = []
 
     index.add(np.expand_dims(vec, axis=0))
     meta.append({
@@ -72,13 +133,14 @@ def upsert_embedding(text, incident_id, label):
         "comment": text
     })
 
-    faiss.write_index(index, FAISS_INDEX_PATH)
-    save_json({"data": meta}, META_PATH)
+    save_index(index, meta)
 
 def search_similar(text, k=3):
     """Find semantically similar feedback comments."""
     if not os.path.exists(FAISS_INDEX_PATH):
         return []
+    import numpy as np
+    import faiss
 
     vec = encode_text(text)
     index = faiss.read_index(FAISS_INDEX_PATH)
@@ -91,22 +153,43 @@ def search_similar(text, k=3):
             results.append({**meta[idx], "similarity": float(score)})
     return results
 
+def search_similar_batch(vectors, k=3):
+    """
+    One FAISS search for a whole batch of query vectors.
+    Returns a list (one per query) of matching feedback metadata with similarity.
+    """
+    if not os.path.exists(FAISS_INDEX_PATH) or len(vectors) == 0:
+        return [[] for _ in range(len(vectors))]
+    import numpy as np
+    import faiss
+
+    index = faiss.read_index(FAISS_INDEX_PATH)
+    D, I = index.search(np.ascontiguousarray(vectors, dtype="float32"), k)
+    meta = load_json(META_PATH).get("data", [])
+
+    results = []
+    for row_ids, row_scores in zip(I, D):
+        results.append([
+            {**meta[idx], "similarity": float(score)}
+            for idx, score in zip(row_ids, row_scores)
+            if 0 <= idx < len(meta)
+        ])
+    return results
+
 # === ADAPTIVE LEARNING ===
 def adapt_weights(explanation_text, label):
     """Adjust adaptive weights based on semantically similar feedback."""
-    weights = load_json(ADAPTIVE_WEIGHTS_PATH)
     similar = search_similar(explanation_text, k=5)
     adjust = 1 if label.upper() == "TP" else -1
-
-    for item in similar:
-        key = item["incident_id"]
-        weights[key] = weights.get(key, 0.0) + adjust * 0.1
-
-    save_json(weights, ADAPTIVE_WEIGHTS_PATH)
+    store.adjust_weights((item["incident_id"], adjust * 0.1) for item in similar)
 
 def get_adaptive_score(incident_id):
-    weights = load_json(ADAPTIVE_WEIGHTS_PATH)
-    return weights.get(str(incident_id), 0.0)
+    return store.get_weight(incident_id)
+
+def get_feedback_history(page=1, per_page=20):
+    """One page of analyst feedback, newest first."""
+    page = max(1, int(page))
+    return store.get_feedback_history(limit=per_page, offset=(page - 1) * per_page)
 
 # === FEEDBACK INTERFACE ===
 def give_feedback(incident_id, explanation_text, label, comment):
@@ -0,0 +1,146 @@
+import os
+import sys
+import csv
+import json
+import time
+import hashlib
+import argparse
+
+import store
+import feedback
+
+# === BULK FEEDBACK IMPORT ===
+# For migrating labelled history (ticketing exports) in one go. Unlike give_feedback, which
+# embeds one comment and rewrites the FAISS index per submission, this embeds every distinct
+# comment once in large threaded batches, appends all vectors to the index in a single write,
+# and inserts the feedback plus its weight updates in one SQLite transaction.
+# The new index is staged in temp files and only swapped in after the SQLite commit. Both
+# sides record the file's digest, so re-running after a crash finishes the missing side
+# instead of importing the rows twice.
+
+LABEL_ALIASES = {
+    "TP": "TP", "TRUE POSITIVE": "TP", "TRUE_POSITIVE": "TP",
+    "FP": "FP", "FALSE POSITIVE": "FP", "FALSE_POSITIVE": "FP",
+}
+WEIGHT_STEP = 0.1   # same step adapt_weights applies per similar incident
+NEIGHBOURS = 4      # existing similar incidents nudged per row (adapt_weights uses k=5 incl. itself)
+
+
+def read_rows(path):
+    """Yield dict rows from a .csv or .jsonl/.ndjson label file."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if ext == ".csv":
+            yield from csv.DictReader(f)
+        elif ext in (".jsonl", ".ndjson"):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unsupported feedback file type: {ext!r} (use .csv or .jsonl)")
+
+
+def clean_rows(rows):
+    """Validated (incident_id, label, comment, timestamp) tuples and the number of rows skipped."""
+    cleaned, skipped = [], 0
+    for r in rows:
+        incident_id = str(r.get("incident_id") or "").strip()
+        label = LABEL_ALIASES.get(str(r.get("label") or "").strip().upper())
+        if not incident_id or not label:
+            skipped += 1
+            continue
+        cleaned.append((incident_id, label, str(r.get("comment") or ""), r.get("timestamp") or None))
+    return cleaned, skipped
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+def bulk_import(path, batch_size=256, workers=None):
+    """Import a CSV/JSONL label file. Returns a stats dict."""
+    import numpy as np
+    import faiss
+
+    start = time.perf_counter()
+    rows, skipped = clean_rows(read_rows(path))
+    if not rows:
+        print(f"[WARN] No valid feedback rows in {path} ({skipped} skipped)")
+        return {"rows": 0, "skipped": skipped}
+    digest = file_digest(path)
+    index, meta = feedback.load_index()
+    if any(m.get("import") == digest for m in meta):
+        print(f"[INFO] {path} was already imported (digest {digest}); nothing to do")
+        return {"rows": 0, "skipped": skipped, "already_imported": True}
+
+    # embed each distinct comment once
+    texts = [comment for _, _, comment, _ in rows]
+    unique_texts = list(dict.fromkeys(texts))
+    position = {t: i for i, t in enumerate(unique_texts)}
+    inverse = np.fromiter((position[t] for t in texts), dtype=np.int64, count=len(texts))
+    t0 = time.perf_counter()
+    unique_vecs = feedback.encode_texts_parallel(unique_texts, batch_size=batch_size, workers=workers)
+    embed_secs = time.perf_counter() - t0
+    print(f"[INFO] Embedded {len(unique_texts)} unique comments for {len(rows)} rows in {embed_secs:.1f}s "
+          f"({len(unique_texts) / max(embed_secs, 1e-9):,.0f} texts/s)")
+
+    # weight deltas: each row's own incident, plus its nearest already-indexed neighbours
+    # (one batched search over the distinct texts against the pre-import index)
+    neighbours = [[] for _ in unique_texts]
+    if index is not None and index.ntotal:
+        _, I = index.search(unique_vecs, min(NEIGHBOURS, index.ntotal))
+        neighbours = [[meta[j]["incident_id"] for j in row if 0 <= j < len(meta)] for row in I]
+    deltas = []
+    for (incident_id, label, _, _), u in zip(rows, inverse):
+        step = WEIGHT_STEP if label == "TP" else -WEIGHT_STEP
+        deltas.append((incident_id, step))
+        deltas.extend((other, step) for other in neighbours[u])
+
+    # stage the grown index, commit feedback rows + weights in one transaction, then swap the index in
+    if index is None:
+        index = faiss.IndexFlatIP(unique_vecs.shape[1])
+    index.add(np.ascontiguousarray(unique_vecs[inverse]))
+    meta.extend({"incident_id": i, "label": label, "comment": comment, "import": digest}
+                for i, label, comment, _ in rows)
+    staged = feedback.stage_index(index, meta)
+    try:
+        inserted = store.import_feedback(rows, deltas, digest=digest)
+    except Exception:
+        feedback.discard_index(staged)
+        raise
+    feedback.publish_index(staged)
+    if inserted is None:
+        print("[INFO] Feedback rows were committed by an interrupted earlier import; indexed them only")
+        inserted, deltas = 0, []
+
+    stats = {
+        "rows": inserted,
+        "skipped": skipped,
+        "unique_texts": len(unique_texts),
+        "weight_updates": len(deltas),
+        "index_size": index.ntotal,
+        "embed_secs": round(embed_secs, 2),
+        "total_secs": round(time.perf_counter() - start, 2),
+    }
+    print(f"✅ Imported {inserted} feedback rows ({skipped} skipped, {len(unique_texts)} unique texts, "
+          f"{len(deltas)} weight updates) in {stats['total_secs']}s → index size {index.ntotal}")
+    return stats
+
+
+# === Main Run ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import analyst labels from a CSV or JSONL file.")
+    parser.add_argument("path", help="columns/keys: incident_id, label (TP/FP), comment, optional timestamp")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=None, help="embedding threads (default: all CPUs)")
+    args = parser.parse_args()
+    try:
+        bulk_import(args.path, batch_size=args.batch_size, workers=args.workers)
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
@@ -0,0 +1,77 @@
+import os
+import re
+import sys
+import subprocess
+
+# === CONFIG ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cold-start import budget per entry point, in milliseconds (cumulative, as reported by
+# `python -X importtime`). detect needs pandas for feature extraction; everything else
+# must keep numpy/pandas/sklearn/faiss/sentence-transformers out of its import path.
+BUDGETS_MS = {
+    "ui": 600,
+    "feedback": 60,
+    "correlator": 60,
+    "explain": 120,
+    "retrain": 60,
+    "detect": 2500,
+}
+
+# modules that must not be loaded just by importing the entry point
+HEAVY = ("pandas", "sklearn", "faiss", "sentence_transformers", "torch", "transformers")
+HEAVY_ALLOWED = {"detect": ("pandas",)}
+
+LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure(module, runs=3):
+    """
+    Best-of-N cumulative import time of `module` in a fresh interpreter, plus the set of
+    top-level packages that import pulled in.
+    """
+    best, loaded = None, set()
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=BASE_DIR, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+        cumulative = None
+        for line in proc.stderr.splitlines():
+            m = LINE_RE.match(line)
+            if not m:
+                continue
+            loaded.add(m.group(4).split(".")[0])
+            if m.group(4) == module and len(m.group(3)) == 1:
+                cumulative = int(m.group(2))
+        if cumulative is not None:
+            best = cumulative if best is None else min(best, cumulative)
+    return (best or 0) / 1000.0, loaded
+
+
+def check(modules=None):
+    """Measure every entry point against its budget. Returns True when all pass."""
+    ok = True
+    print(f"{'module':<12} {'ms':>8} {'budget':>8}  status")
+    for module in modules or BUDGETS_MS:
+        try:
+            ms, loaded = measure(module)
+        except RuntimeError as e:
+            print(f"{module:<12} {'-':>8} {BUDGETS_MS[module]:>8}  ERROR {e}")
+            ok = False
+            continue
+        heavy = sorted(p for p in HEAVY if p in loaded and p not in HEAVY_ALLOWED.get(module, ()))
+        status = "ok"
+        if ms > BUDGETS_MS[module]:
+            status = "OVER BUDGET"
+        if heavy:
+            status += f" (eagerly imports {', '.join(heavy)})"
+        ok = ok and status == "ok"
+        print(f"{module:<12} {ms:>8.1f} {BUDGETS_MS[module]:>8}  {status}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check(sys.argv[1:] or None) else 1)
@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+# === PATHS ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
+INDEX_PATH = os.path.join(DATA_DIR, "incident_index.db")
+
+ENTITY_TYPES = ("user", "host", "ip", "intel")
+
+# One row per correlation key, as in triage: re-correlation gives incidents new IDs, so a
+# key's row follows its latest incident and its postings are replaced, never duplicated.
+# One posting per (entity, key) holds the incident's first/last activity as epoch seconds
+# (timestamps without an offset are UTC). The clustered primary key keeps each entity's
+# postings contiguous and time-sorted.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS incidents (
+    key TEXT PRIMARY KEY,
+    incident_id TEXT NOT NULL,
+    score REAL,
+    start_time TEXT,
+    end_time TEXT,
+    num_events INTEGER,
+    correlation_file TEXT
+);
+CREATE TABLE IF NOT EXISTS postings (
+    entity_type TEXT NOT NULL,
+    entity_value TEXT NOT NULL,
+    last_ts REAL NOT NULL,
+    key TEXT NOT NULL,
+    first_ts REAL NOT NULL,
+    PRIMARY KEY (entity_type, entity_value, last_ts, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_key ON postings(key);
+"""
+
+
+# === CONNECTION ===
+def connect(path=None):
+    path = path or INDEX_PATH
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if "incident_id" in {row["name"] for row in conn.execute("PRAGMA table_info(postings)")}:
+        # index from before postings were keyed by correlation key: rebuild it from the artifacts
+        conn.close()
+        print("[INFO] Incident index has the per-incident-ID layout, rebuilding it")
+        rebuild_index(path)
+        return connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# === HELPERS ===
+def _to_epoch(ts):
+    """Epoch seconds of a datetime, ISO string or number; a timestamp without an offset is UTC."""
+    if ts is None:
+        return None
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts.replace(" ", "T").rstrip("Z"))
+        except ValueError:
+            return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def _iso(ts):
+    return ts.isoformat() if hasattr(ts, "isoformat") else ts
+
+
+def entities_of(incident):
+    """(entity_type, value) pairs an incident touched, taken from its correlation key."""
+    parts = (incident.get("key") or "").split("|")
+    parts += [""] * (len(ENTITY_TYPES) - len(parts))
+    pairs = [(etype, value) for etype, value in zip(ENTITY_TYPES[:3], parts[:3]) if value]
+    # the optional 4th part holds CIDR intel tags, one posting per tag
+    pairs += [("intel", tag) for tag in parts[3].split(",") if tag]
+    return pairs
+
+
+def parse_entity(spec):
+    """'ip:10.0.0.5' → ('ip', '10.0.0.5'). Accepts user/username, host, ip/src_ip prefixes."""
+    etype, _, value = str(spec).partition(":")
+    etype = {"username": "user", "src_ip": "ip"}.get(etype, etype)
+    if etype not in ENTITY_TYPES or not value:
+        raise ValueError(f"Invalid entity spec: {spec!r} (expected user:, host:, ip: or intel:)")
+    return etype, value
+
+
+# === INDEX MAINTENANCE ===
+def index_incidents(incidents, correlation_file=None, conn=None):
+    """
+    Add a batch of correlated incidents to the index in one transaction. An incident whose
+    correlation key is already indexed replaces that key's row and postings.
+    """
+    own = conn is None
+    conn = conn or connect()
+    incident_rows, posting_rows = [], []
+    for inc in incidents:
+        first = _to_epoch(inc.get("start_time"))
+        last = _to_epoch(inc.get("end_time"))
+        if first is None and last is None:
+            first = last = 0.0
+        first = last if first is None else first
+        last = first if last is None else last
+        incident_rows.append((
+            inc.get("key") or "", str(inc.get("incident_id")), float(inc.get("score") or 0.0),
+            _iso(inc.get("start_time")), _iso(inc.get("end_time")),
+            len(inc.get("events", [])), correlation_file
+        ))
+        for etype, value in entities_of(inc):
+            posting_rows.append((etype, value, last, inc.get("key") or "", first))
+
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM postings WHERE key = ?", [(row[0],) for row in incident_rows])
+            conn.executemany(
+                "INSERT OR REPLACE INTO incidents VALUES (?, ?, ?, ?, ?, ?, ?)", incident_rows
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO postings VALUES (?, ?, ?, ?, ?)", posting_rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        if own:
+            conn.close()
+    return len(incident_rows)
+
+
+def relink_correlation_files(old_files, new_file, conn=None):
+    """Point incidents indexed from old_files at new_file (after compaction merged them)."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        return conn.executemany("UPDATE incidents SET correlation_file = ? WHERE correlation_file = ?",
+                                [(new_file, old) for old in old_files]).rowcount
+    finally:
+        if own:
+            conn.close()
+
+
+def rebuild_index(path=None):
+    """Rebuild the index from scratch out of every correlation artifact on disk."""
+    import artifacts
+    path = path or INDEX_PATH
+    for stale in (path, f"{path}-wal", f"{path}-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+    conn = connect(path)
+    total = 0
+    for corr_path in artifacts.iter_paths("correlations"):
+        file = os.path.basename(corr_path)
+        try:
+            with open(corr_path, "r", encoding="utf-8") as f:
+                total += index_incidents(json.load(f), correlation_file=file, conn=conn)
+        except Exception as e:
+            print(f"[WARN] Failed to index {file}: {e}")
+    conn.close()
+    print(f"[INFO] Indexed {total} incidents → {path}")
+    return total
+
+
+# === QUERY API ===
+def lookup(entities, since=None, until=None, limit=100, conn=None):
+    """
+    Incidents that touched any of the given entities and were active inside [since, until].
+    entities: iterable of 'type:value' specs or (type, value) tuples.
+    since/until: datetime, ISO string or epoch seconds. Newest incidents first.
+    """
+    own = conn is None
+    conn = conn or connect()
+    lo = _to_epoch(since)
+    hi = _to_epoch(until)
+    try:
+        hits = {}
+        for ent in entities:
+            etype, value = parse_entity(ent) if isinstance(ent, str) else ent
+            sql = ("SELECT key, last_ts FROM postings "
+                   "WHERE entity_type = ? AND entity_value = ?")
+            params = [etype, value]
+            if lo is not None:
+                sql += " AND last_ts >= ?"
+                params.append(lo)
+            if hi is not None:
+                sql += " AND first_ts <= ?"
+                params.append(hi)
+            sql += " ORDER BY last_ts DESC LIMIT ?"
+            params.append(int(limit))
+            for row in conn.execute(sql, params):
+                hits.setdefault(row["key"], {"last_ts": row["last_ts"], "matched": []})
+                hits[row["key"]]["matched"].append(f"{etype}:{value}")
+
+        ranked = sorted(hits.items(), key=lambda kv: kv[1]["last_ts"], reverse=True)[:limit]
+        results = []
+        for key, hit in ranked:
+            row = conn.execute("SELECT * FROM incidents WHERE key = ?", (key,)).fetchone()
+            if row:
+                results.append({**dict(row), "matched_entities": hit["matched"]})
+        return results
+    finally:
+        if own:
+            conn.close()
+
+
+def lookup_recent(entities, hours=24, now=None, **kwargs):
+    """Incidents touching the given entities in the last `hours` hours."""
+    now = now or datetime.now(timezone.utc)
+    return lookup(entities, since=now - timedelta(hours=hours), until=now, **kwargs)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        rebuild_index()
+    elif len(sys.argv) > 1:
+        for inc in lookup(sys.argv[1:]):
+            print(f"- {inc['incident_id']} | {inc['key']} | {inc['start_time']} → {inc['end_time']} | {inc['matched_entities']}")
+    else:
+        print("Usage: python src/incident_index.py rebuild | <user:NAME|host:NAME|ip:ADDR> ...")
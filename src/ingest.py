@@ -1,24 +1,80 @@
 # ingest.py
 import pandas as pd
 from normalize import normalize_row
+from ip_enrich import enrich_events
 from typing import Dict, List
 
-def ingest_csv(filepath: str, source_label: str):
+def ingest_csv(filepath: str, source_label: str, rollup_secs: int = None):
     df = pd.read_csv(filepath)
+    if rollup_secs:
+        df = rollup_frame(df, source_label, rollup_secs)
     events = []
     for _, r in df.iterrows():
-        events.append(normalize_row(r.to_dict(), source_label))
+        row = r.to_dict()
+        count, last_ts = row.pop("_count", None), row.pop("_last_ts", None)
+        e = normalize_row(row, source_label)
+        if count == count and count is not None and count > 1:  # NaN for pass-through rows
+            e["count"] = int(count)
+            e["last_timestamp"] = last_ts.to_pydatetime()
+        events.append(e)
     # sort by timestamp where present
     events.sort(key=lambda e: e["timestamp"] or 0)
     return events
 
-def ingest_all(mapping: Dict[str, str]):
+# === ROLLUP ===
+# Identical events of these sources inside one time bucket fold into a single record.
+ROLLUP_KEYS = {
+    "firewall": ["src_ip", "dst_ip", "dst_port", "protocol", "action"],
+    "auth": ["username", "src_ip", "auth_method", "outcome"],
+}
+
+
+def naive_utc(ts: pd.Series) -> pd.Series:
+    """Parsed timestamps as tz-naive UTC, the pipeline's convention: offsets are converted, not dropped."""
+    return ts.dt.tz_convert(None) if ts.dt.tz is not None else ts
+
+
+def rollup_frame(df: pd.DataFrame, source_label: str, bucket_secs: int = 60):
+    """
+    Fold rows with identical ROLLUP_KEYS fields in the same epoch-aligned bucket into their
+    earliest row, adding _count, _last_ts and a summed "bytes". Done on the raw frame, before
+    normalization, so only one row per group pays for normalize_row. Rows without a
+    parseable timestamp pass through. Keep bucket_secs a divisor of 3600 so a record never
+    straddles an hour.
+    """
+    fields = ROLLUP_KEYS.get(source_label)
+    col = "timestamp" if "timestamp" in df.columns else "time"
+    if not fields or col not in df.columns or not set(fields) <= set(df.columns) or df.empty:
+        return df
+    ts = pd.to_datetime(df[col], errors="coerce")
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        return df  # mixed time zones: leave the file as is
+    naive = naive_utc(ts)
+
+    # floor() works in the column's own unit (pandas may parse to s/ms/us/ns)
+    df = df.assign(_ts=ts, _bucket=naive.dt.floor(f"{int(bucket_secs)}s"))
+    if "bytes" in df.columns:
+        df["bytes"] = pd.to_numeric(df["bytes"], errors="coerce").fillna(0)
+    df = df.sort_values("_ts", kind="stable")
+    keyed, rest = df[df["_ts"].notna()], df[df["_ts"].isna()]
+    groups = keyed.groupby(["_bucket"] + fields, sort=False, dropna=False)
+    out = keyed.loc[groups.head(1).index].copy()
+    out["_count"] = groups["_ts"].transform("size").loc[out.index]
+    out["_last_ts"] = groups["_ts"].transform("max").loc[out.index]
+    if "bytes" in out.columns:
+        out["bytes"] = groups["bytes"].transform("sum").loc[out.index]
+    return pd.concat([out, rest]).drop(columns=["_ts", "_bucket"])
+
+
+def ingest_all(mapping: Dict[str, str], rollup_secs: int = None):
     """
     mapping: { "auth": "data/train_auth.csv", ... }
+    rollup_secs: fold identical flows/logins per bucket of this many seconds (None = off)
     returns combined list of canonical events
     """
     all_events = []
     for label, path in mapping.items():
-        all_events.extend(ingest_csv(path, label))
+        all_events.extend(ingest_csv(path, label, rollup_secs))
+    enrich_events(all_events)  # CIDR tags for src_ip / dst_ip
     all_events.sort(key=lambda e: e["timestamp"] or 0)
     return all_events
@@ -0,0 +1,172 @@
+import os
+import sys
+import csv
+import glob
+import bisect
+import ipaddress
+from functools import lru_cache
+
+# === PATHS ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INTEL_DIR = os.path.join(os.path.dirname(BASE_DIR), "data", "intel")
+
+# Every file in data/intel/ is one tag: internal.txt → "internal", scanners.csv → "scanners".
+# Lines hold a CIDR or single IP (first column for .csv); '#' starts a comment.
+INTEL_EXTENSIONS = (".txt", ".cidr", ".csv")
+DEFAULT_TABLES = {"internal": ["10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "127.0.0.0/8", "fc00::/7"]}
+# tags that describe the network rather than flag it; kept as features, not correlation keys
+CONTEXT_TAGS = {"internal"}
+LRU_SIZE = 1 << 16
+
+ENRICHED_ATTRS = (("src_ip", "src_ip_tags"), ("dst_ip", "dst_ip_tags"))
+
+
+# === COMPILED TABLE ===
+class CidrTable:
+    """
+    All CIDR lists compiled into one sorted array of disjoint segments per IP version, each
+    carrying the bitmask of tags covering it. A lookup is one binary search; hot IPs are
+    served from an LRU cache.
+    """
+
+    def __init__(self, tables):
+        self.tags = sorted(tables)
+        bits = {tag: 1 << i for i, tag in enumerate(self.tags)}
+        intervals = {4: [], 6: []}
+        for tag, cidrs in tables.items():
+            for cidr in cidrs:
+                try:
+                    net = ipaddress.ip_network(cidr, strict=False)
+                except ValueError:
+                    continue
+                intervals[net.version].append((int(net.network_address), int(net.broadcast_address), bits[tag]))
+        self.segments = {version: self._segments(iv) for version, iv in intervals.items()}
+        self._labels = {}
+        self.tags_of = lru_cache(maxsize=LRU_SIZE)(self._tags_of)
+
+    @staticmethod
+    def _segments(intervals):
+        """(starts, masks): segment i covers [starts[i], starts[i+1]) and carries masks[i]."""
+        bounds = sorted({0} | {s for s, _, _ in intervals} | {e + 1 for _, e, _ in intervals})
+        index = {b: i for i, b in enumerate(bounds)}
+        delta = [dict() for _ in bounds]
+        for start, end, bit in intervals:
+            i, j = index[start], index[end + 1]
+            delta[i][bit] = delta[i].get(bit, 0) + 1
+            delta[j][bit] = delta[j].get(bit, 0) - 1
+        masks, active = [], {}
+        for d in delta:
+            for bit, change in d.items():
+                active[bit] = active.get(bit, 0) + change
+            masks.append(sum(bit for bit, count in active.items() if count > 0))
+        return bounds, masks
+
+    def mask_of_int(self, version, value):
+        starts, masks = self.segments[version]
+        return masks[bisect.bisect_right(starts, value) - 1]
+
+    def label(self, mask):
+        """Comma-joined tag names for a mask (None when no tag matches)."""
+        if mask not in self._labels:
+            self._labels[mask] = ",".join(t for i, t in enumerate(self.tags) if mask >> i & 1) or None
+        return self._labels[mask]
+
+    def _tags_of(self, ip):
+        try:
+            addr = ipaddress.ip_address(str(ip).strip())
+        except ValueError:
+            return None
+        return self.label(self.mask_of_int(addr.version, int(addr)))
+
+    def masks_v4(self, ips):
+        """Vectorized lookup for a batch of IPv4 strings (invalid → 0)."""
+        import numpy as np
+        position = {}
+        inverse = np.fromiter((position.setdefault(ip, len(position)) for ip in ips), dtype=np.int64)
+        values = np.full(len(position), -1, dtype=np.int64)
+        for ip, i in position.items():
+            ip = str(ip)
+            parts = ip.split(".")
+            if len(parts) == 4 and all(p.isdigit() for p in parts):
+                a, b, c, d = (int(p) for p in parts)
+                if max(a, b, c, d) < 256:
+                    values[i] = (a << 24) | (b << 16) | (c << 8) | d
+        starts, masks = self.segments[4]
+        idx = np.searchsorted(np.asarray(starts, dtype=np.int64), values, side="right") - 1
+        found = np.where(values >= 0, np.asarray(masks, dtype=np.int64)[np.maximum(idx, 0)], 0)
+        return found[inverse]
+
+
+# === LOADING ===
+def read_intel_dir(intel_dir=INTEL_DIR):
+    """{tag: [cidr, ...]} from the intel folder, on top of the built-in defaults."""
+    tables = {tag: list(cidrs) for tag, cidrs in DEFAULT_TABLES.items()}
+    for path in sorted(glob.glob(os.path.join(intel_dir, "*"))):
+        tag, ext = os.path.splitext(os.path.basename(path))
+        if ext.lower() not in INTEL_EXTENSIONS:
+            continue
+        cidrs = []
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in (csv.reader(f) if ext.lower() == ".csv" else ([line] for line in f)):
+                value = (row[0] if row else "").split("#", 1)[0].strip()
+                if value and value.lower() not in ("cidr", "ip", "network"):
+                    cidrs.append(value)
+        tables[tag] = cidrs  # a file named like a default replaces it
+    return tables
+
+
+_TABLE = None
+_TABLE_STAMP = None
+
+
+def _intel_stamp(intel_dir=INTEL_DIR):
+    return tuple((p, os.path.getmtime(p)) for p in sorted(glob.glob(os.path.join(intel_dir, "*"))))
+
+
+def get_table():
+    """The compiled table, rebuilt when a file in data/intel/ is added or changed."""
+    global _TABLE, _TABLE_STAMP
+    stamp = _intel_stamp()
+    if _TABLE is None or stamp != _TABLE_STAMP:
+        _TABLE = CidrTable(read_intel_dir())
+        _TABLE_STAMP = stamp
+    return _TABLE
+
+
+# === ENRICHMENT STAGE ===
+def enrich_events(events, table=None):
+    """
+    Add src_ip_tags / dst_ip_tags (comma-joined tag names or None) to every event that has
+    the corresponding IP attribute. Runs between normalization and feature extraction.
+    """
+    tags_of = (table or get_table()).tags_of
+    # unrolled over ENRICHED_ATTRS: this loop runs once per ingested event
+    for e in events:
+        attrs = e["attributes"]
+        ip = attrs.get("src_ip")
+        if ip:
+            attrs["src_ip_tags"] = tags_of(ip)
+        ip = attrs.get("dst_ip")
+        if ip:
+            attrs["dst_ip_tags"] = tags_of(ip)
+    return events
+
+
+def has_tag(tags, tag):
+    return bool(tags) and tag in tags.split(",")
+
+
+def key_tags(tags):
+    """The flagging tags of a tag string (context tags like 'internal' removed), or None."""
+    if not tags:
+        return None
+    keep = [t for t in tags.split(",") if t not in CONTEXT_TAGS]
+    return ",".join(keep) or None
+
+
+if __name__ == "__main__":
+    table = get_table()
+    print(f"[INFO] Tags: {', '.join(table.tags)} "
+          f"({len(table.segments[4][0])} IPv4 / {len(table.segments[6][0])} IPv6 segments)")
+    for ip in sys.argv[1:]:
+        print(f"- {ip}: {table.tags_of(ip) or '-'}")
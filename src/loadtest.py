@@ -0,0 +1,413 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+from datetime import datetime
+
+# === PATHS ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BASE_DIR)
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "data", "loadtest")
+BASELINE_PATH = os.path.join(RESULTS_DIR, "baseline.json")
+
+# === SCENARIO ===
+# Request mix of one simulated analyst (relative weights). /run/* spawn pipeline subprocesses;
+# retrain is left out by default because it rewrites the models.
+DEFAULT_MIX = {"index": 60, "feedback": 20, "anomaly": 7, "correlate": 7, "explain": 6}
+ENDPOINTS = {
+    "index": ("GET", "/"),
+    "feedback": ("POST", "/submit_feedback"),
+    "anomaly": ("POST", "/run/anomaly"),
+    "correlate": ("POST", "/run/correlate"),
+    "explain": ("POST", "/run/explain"),
+    "retrain": ("POST", "/run/retrain"),
+    "triage": ("GET", "/api/triage"),
+}
+PERCENTILES = (50, 90, 95, 99)
+# a run regresses when an endpoint's p95 or error rate, or overall throughput, is this much worse
+DEFAULT_TOLERANCE = 0.25
+FEEDBACK_COMMENTS = [
+    "Confirmed brute force from external IP",
+    "Known admin maintenance window, benign",
+    "Scanner traffic from vulnerability assessment",
+    "Suspicious PowerShell spawned by Office",
+    "Service account rotation, expected failures",
+]
+
+
+# === ISOLATED WORKSPACE ===
+def make_workspace(feedback_rows=500, seed=0):
+    """
+    Copy the app (src/, templates/, models/, the bundled CSVs) into a temp directory so the
+    run never touches the real data/, and seed it with synthetic feedback history.
+    """
+    root = tempfile.mkdtemp(prefix="loadtest_")
+    for name in ("src", "templates", "models"):
+        shutil.copytree(os.path.join(PROJECT_ROOT, name), os.path.join(root, name),
+                        ignore=shutil.ignore_patterns("__pycache__", "*.tmp"))
+    os.makedirs(os.path.join(root, "data"))
+    for name in os.listdir(os.path.join(PROJECT_ROOT, "data")):
+        if name.endswith(".csv"):
+            shutil.copy(os.path.join(PROJECT_ROOT, "data", name), os.path.join(root, "data", name))
+    intel = os.path.join(PROJECT_ROOT, "data", "intel")
+    if os.path.isdir(intel):
+        shutil.copytree(intel, os.path.join(root, "data", "intel"))
+
+    seed_script = (
+        "import sys, random; sys.path.insert(0, 'src'); import store\n"
+        f"rng = random.Random({seed})\n"
+        f"rows = [(f'inc-{{rng.getrandbits(32):08x}}', rng.choice(['TP', 'FP']), rng.choice({FEEDBACK_COMMENTS!r}), None)"
+        f" for _ in range({int(feedback_rows)})]\n"
+        "store.import_feedback(rows, [(i, 0.1 if label == 'TP' else -0.1) for i, label, _, _ in rows])\n"
+    )
+    subprocess.run([sys.executable, "-c", seed_script], cwd=root, check=True, stdout=subprocess.DEVNULL)
+    return root
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=2).read()
+            return True
+        except urllib.error.HTTPError:
+            return True  # the server answers
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def start_servers(root, llm_delay=0.01, log_path=None):
+    """Start the mock LLM and the dashboard (threaded Flask server) inside the workspace."""
+    llm_port, app_port = free_port(), free_port()
+    log = open(log_path or os.devnull, "w")
+    env = dict(os.environ,
+               LLM_API_ENDPOINT=f"http://127.0.0.1:{llm_port}/v1/chat/completions",
+               OPENROUTER_API_KEY="loadtest", PYTHONUNBUFFERED="1")
+    llm = subprocess.Popen([sys.executable, "src/mock_llm.py", "--port", str(llm_port),
+                            "--token-delay", str(llm_delay), "--first-token-delay", str(llm_delay * 10)],
+                           cwd=root, env=env, stdout=log, stderr=subprocess.STDOUT)
+    app = subprocess.Popen([sys.executable, "-c",
+                            "import sys; sys.path.insert(0, 'src'); import ui; "
+                            f"ui.app.run(host='127.0.0.1', port={app_port}, debug=False, threaded=True)"],
+                           cwd=root, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{app_port}"
+    if not wait_for(url + "/", timeout=60):
+        stop_servers([app, llm])
+        raise RuntimeError("Dashboard did not start (see --server-log)")
+    return url, [app, llm]
+
+
+def stop_servers(procs):
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        try:
+            p.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+# === SERVER RESOURCE SAMPLING (/proc) ===
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _proc_stat(pid):
+    """(ppid, cpu ticks incl. reaped children, rss bytes) of one process, or None if gone."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    # fields[0] is state (field 3); utime..cstime are fields 14-17, rss is field 24
+    return int(fields[1]), sum(int(x) for x in fields[11:15]), int(fields[21]) * PAGE_SIZE
+
+
+def process_tree(root_pid):
+    """{pid: (cpu ticks, rss)} for a process and all its live descendants."""
+    stats = {}
+    for name in os.listdir("/proc"):
+        if name.isdigit():
+            st = _proc_stat(int(name))
+            if st:
+                stats[int(name)] = st
+    tree, frontier = {}, [root_pid]
+    while frontier:
+        pid = frontier.pop()
+        if pid in stats and pid not in tree:
+            tree[pid] = stats[pid][1:]
+            frontier.extend(child for child, st in stats.items() if st[0] == pid)
+    return tree
+
+
+class ResourceSampler(threading.Thread):
+    """Samples CPU % (server + the pipeline subprocesses it spawns) and RSS every `interval` s."""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid, self.interval = pid, interval
+        self.samples = []   # (cpu_percent, rss_bytes)
+        self.stop_event = threading.Event()
+
+    def run(self):
+        prev_ticks, prev_t = {}, time.perf_counter()
+        while not self.stop_event.wait(self.interval):
+            tree = process_tree(self.pid)
+            now = time.perf_counter()
+            # a child that exited since the last sample reappears in the parent's cutime/cstime
+            # with its whole lifetime, so its already-counted ticks are taken back out
+            delta = sum(ticks - prev_ticks.get(pid, 0) for pid, (ticks, _) in tree.items())
+            delta = max(0, delta - sum(t for pid, t in prev_ticks.items() if pid not in tree))
+            if prev_ticks:
+                self.samples.append((100.0 * delta / CLK_TCK / (now - prev_t), sum(rss for _, rss in tree.values())))
+            prev_ticks, prev_t = {pid: ticks for pid, (ticks, _) in tree.items()}, now
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        cpu = [c for c, _ in self.samples]
+        rss = [r for _, r in self.samples]
+        return {"cpu_avg_pct": round(sum(cpu) / len(cpu), 1), "cpu_max_pct": round(max(cpu), 1),
+                "rss_avg_mb": round(sum(rss) / len(rss) / 2 ** 20, 1), "rss_max_mb": round(max(rss) / 2 ** 20, 1),
+                "samples": len(self.samples)}
+
+
+# === VIRTUAL ANALYSTS ===
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # the 302 back to / is the answer; don't time the follow-up render
+
+
+def analyst(url, mix, deadline, think, results, seed):
+    """One simulated analyst: own session cookie, weighted random requests until `deadline`."""
+    rng = random.Random(seed)
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect)
+    names, weights = list(mix), list(mix.values())
+    while time.time() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path = ENDPOINTS[name]
+        data = None
+        if name == "feedback":
+            data = urllib.parse.urlencode({
+                "incident_id": f"inc-{rng.getrandbits(32):08x}", "label": rng.choice(["TP", "FP"]),
+                "comment": rng.choice(FEEDBACK_COMMENTS)}).encode()
+        elif method == "POST":
+            data = b""
+        req = urllib.request.Request(url + path, data=data, method=method)
+        start = time.perf_counter()
+        try:
+            with opener.open(req, timeout=300) as resp:
+                resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = 0  # connection refused / reset / timeout
+        results.append((name, time.perf_counter() - start, status, time.time()))
+        if think:
+            time.sleep(rng.expovariate(1.0 / think))
+
+
+# === REPORT ===
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    # nearest rank: the smallest value with at least p% of the samples at or below it
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+def summarize(results, wall_secs):
+    by_name = {}
+    for name, secs, status, _ in results:
+        by_name.setdefault(name, []).append((secs, status))
+    by_name["all"] = [(secs, status) for _, secs, status, _ in results]
+
+    endpoints = {}
+    for name, rows in by_name.items():
+        lat = sorted(secs for secs, _ in rows)
+        errors = sum(1 for _, status in rows if not 200 <= status < 400)
+        endpoints[name] = {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4),
+            "rps": round(len(rows) / wall_secs, 2),
+            **{f"p{p}_ms": round(percentile(lat, p) * 1000, 1) for p in PERCENTILES},
+            "max_ms": round(lat[-1] * 1000, 1),
+            "mean_ms": round(sum(lat) / len(lat) * 1000, 1),
+        }
+    return endpoints
+
+
+def print_report(report):
+    print(f"\n=== Load test: {report['users']} analysts, {report['duration_secs']}s, "
+          f"{report['endpoints']['all']['requests']} requests ===")
+    print(f"{'endpoint':>10} {'reqs':>7} {'rps':>7} {'err%':>6} " +
+          " ".join(f"{'p%d ms' % p:>9}" for p in PERCENTILES) + f" {'max ms':>9}")
+    for name, e in sorted(report["endpoints"].items(), key=lambda kv: (kv[0] == "all", kv[0])):
+        print(f"{name:>10} {e['requests']:>7} {e['rps']:>7.2f} {e['error_rate'] * 100:>5.1f}% " +
+              " ".join(f"{e[f'p{p}_ms']:>9.1f}" for p in PERCENTILES) + f" {e['max_ms']:>9.1f}")
+    res = report.get("server")
+    if res:
+        print(f"\n🖥️ Server CPU avg {res['cpu_avg_pct']}% / max {res['cpu_max_pct']}% "
+              f"(server + spawned pipeline runs), RSS avg {res['rss_avg_mb']} MB / max {res['rss_max_mb']} MB")
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Regressions of `report` against `baseline` as human-readable lines (empty = none).
+    Raises ValueError for a baseline without the overall ("all") endpoint stats.
+    """
+    if "all" not in (baseline.get("endpoints") or {}):
+        raise ValueError("Baseline has no endpoint results (was it saved from a run that completed no requests?)")
+    problems = []
+    for name, base in baseline.get("endpoints", {}).items():
+        cur = report["endpoints"].get(name)
+        if not cur:
+            continue
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {base['p95_ms']} → {cur['p95_ms']} ms")
+        if cur["error_rate"] > base["error_rate"] + max(0.01, base["error_rate"] * tolerance):
+            problems.append(f"{name}: error rate {base['error_rate']:.2%} → {cur['error_rate']:.2%}")
+    base_rps, cur_rps = baseline["endpoints"]["all"]["rps"], report["endpoints"]["all"]["rps"]
+    if cur_rps < base_rps * (1 - tolerance):
+        problems.append(f"throughput {base_rps} → {cur_rps} req/s")
+    return problems
+
+
+def save_json(data, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+# === RUN ===
+def run(users=20, duration=60, mix=None, think=1.0, url=None, feedback_rows=500, llm_delay=0.01,
+        server_log=None, keep_workspace=False, seed=0):
+    mix = mix or DEFAULT_MIX
+    procs, root, sampler = [], None, None
+    if url is None:
+        root = make_workspace(feedback_rows, seed)
+        print(f"[INFO] Workspace → {root}")
+        url, procs = start_servers(root, llm_delay, server_log)
+        sampler = ResourceSampler(procs[0].pid)
+        sampler.start()
+    print(f"[INFO] Driving {url} with {users} analysts for {duration}s (mix {mix})")
+
+    results = []   # list.append is atomic; threads share it
+    deadline = time.time() + duration
+    threads = [threading.Thread(target=analyst, args=(url, mix, deadline, think, results, seed + i), daemon=True)
+               for i in range(users)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    try:
+        report = {
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "users": users, "duration_secs": duration, "wall_secs": round(wall, 2), "think_secs": think,
+            "mix": mix, "cpus": os.cpu_count(),
+            "endpoints": summarize(results, wall) if results else {},
+        }
+        if sampler:
+            sampler.stop_event.set()
+            sampler.join()
+            report["server"] = sampler.summary()
+    finally:
+        stop_servers(procs)
+        if root and not keep_workspace:
+            shutil.rmtree(root, ignore_errors=True)
+    return report
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {name!r} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# === Main Run ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load-test the dashboard with concurrent simulated analysts against a mock LLM.")
+    parser.add_argument("--users", type=int, default=20, help="concurrent analysts")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of traffic")
+    parser.add_argument("--think", type=float, default=1.0, help="mean think time between requests (s)")
+    parser.add_argument("--mix", type=parse_mix, default=None,
+                        help="weights, e.g. index=60,feedback=20,anomaly=7,correlate=7,explain=6")
+    parser.add_argument("--url", default=None, help="drive an already running dashboard instead of starting one")
+    parser.add_argument("--feedback-rows", type=int, default=500, help="synthetic feedback history to seed")
+    parser.add_argument("--llm-delay", type=float, default=0.01, help="mock LLM seconds per streamed chunk")
+    parser.add_argument("--server-log", default=None, help="write dashboard/mock LLM output here")
+    parser.add_argument("--keep-workspace", action="store_true")
+    parser.add_argument("--out", default=None, help="save this run's report (JSON)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"store the report as {BASELINE_PATH}")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, default=None,
+                        help="fail (exit 1) on regressions against a baseline report")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        report = run(users=args.users, duration=args.duration, mix=args.mix, think=args.think, url=args.url,
+                     feedback_rows=args.feedback_rows, llm_delay=args.llm_delay, server_log=args.server_log,
+                     keep_workspace=args.keep_workspace, seed=args.seed)
+    except RuntimeError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+    if not report["endpoints"]:
+        print("[ERROR] No requests completed")
+        sys.exit(1)
+    print_report(report)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"loadtest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    save_json(report, out)
+    print(f"\n💾 Report saved → {out}")
+    if args.save_baseline:
+        save_json(report, BASELINE_PATH)
+        print(f"📌 Baseline updated → {BASELINE_PATH}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline.get("users"), baseline.get("mix"), baseline.get("think_secs")) != \
+                (report["users"], report["mix"], report["think_secs"]):
+            print("[WARN] Baseline was recorded with different users/mix/think time; numbers may not be comparable")
+        try:
+            problems = compare(report, baseline, args.tolerance)
+        except ValueError as e:
+            print(f"[ERROR] {args.compare}: {e}")
+            sys.exit(1)
+        if problems:
+            print(f"\n❌ Regressions vs {os.path.basename(args.compare)} (tolerance {args.tolerance:.0%}):")
+            for p in problems:
+                print(f"  - {p}")
+            sys.exit(1)
+        print(f"\n✅ No regressions vs {os.path.basename(args.compare)}")
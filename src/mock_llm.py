@@ -0,0 +1,81 @@
+import sys
+import json
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# === CANNED RESPONSE ===
+MOCK_EXPLANATION = (
+    "1. Chronological attack flow: the correlated events show repeated authentication "
+    "against the same account, followed by process execution on the affected host and "
+    "outbound network flows to an external address (auth → process → network).\n"
+    "2. Objective and behavior: the pattern is consistent with credential access followed "
+    "by lateral movement and possible data staging. Validate the account activity and "
+    "isolate the host if the executions are not expected."
+)
+
+
+def make_handler(token_delay, first_token_delay, words_per_chunk):
+    class MockLLMHandler(BaseHTTPRequestHandler):
+        """OpenRouter-compatible /chat/completions endpoint with optional SSE streaming."""
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                body = {}
+
+            if not body.get("stream"):
+                time.sleep(first_token_delay)
+                payload = json.dumps({
+                    "choices": [{"message": {"role": "assistant", "content": MOCK_EXPLANATION}}]
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+
+            words = MOCK_EXPLANATION.split(" ")
+            time.sleep(first_token_delay)
+            self.wfile.write(b": MOCK PROCESSING\n\n")
+            for i in range(0, len(words), words_per_chunk):
+                text = " ".join(words[i:i + words_per_chunk]) + " "
+                chunk = {"choices": [{"delta": {"content": text}}]}
+                # raw UTF-8 like real providers, not \u escapes
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return MockLLMHandler
+
+
+def serve(host="127.0.0.1", port=8765, token_delay=0.05, first_token_delay=0.3, words_per_chunk=3):
+    server = ThreadingHTTPServer((host, port), make_handler(token_delay, first_token_delay, words_per_chunk))
+    print(f"[INFO] Mock LLM listening → http://{host}:{port}/v1/chat/completions")
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the OpenRouter chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--token-delay", type=float, default=0.05, help="seconds between streamed chunks")
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    args = parser.parse_args()
+    try:
+        serve(args.host, args.port, args.token_delay, args.first_token_delay).serve_forever()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -1,5 +1,6 @@
 # src/parsers.py
 import json, os
+import eventstore
 
 def load_json(path):
     if not os.path.exists(path):
@@ -11,33 +12,40 @@ def load_json(path):
             return []
 
 # --- ANOMALIES ---
+def summarize_event(ev):
+    """One-line, event-type aware summary of a canonical event."""
+    attrs = ev.get("attributes", {})
+    event_type = ev.get("event_type", "")
+
+    # --- intelligent summary depending on event type ---
+    if event_type == "net_flow":
+        return f"{attrs.get('src_ip', '?')} → {attrs.get('dst_ip', '?')}:{attrs.get('dst_port', '?')} ({attrs.get('protocol', '?')})"
+
+    elif event_type == "process_create":
+        return f"{attrs.get('username', '?')} ran {attrs.get('process_name', '?')} (parent: {attrs.get('parent_process', '?')})"
+
+    elif event_type == "login":
+        return f"{attrs.get('username', '?')} logged in from {attrs.get('src_ip', '?')} via {attrs.get('auth_method', '?')} ({attrs.get('outcome', '?')})"
+
+    return str(attrs)[:200]  # fallback
+
 def parse_anomalies(json_path):
-    data = load_json(json_path)
+    # only the rows shown on the dashboard need their events materialized
+    data = eventstore.resolve(load_json(json_path)[:10])
     parsed = []
 
     for item in data:
         ev = item.get("event", {})
-        attrs = ev.get("attributes", {})
         event_type = ev.get("event_type", "")
-
-        # --- intelligent summary depending on event type ---
-        if event_type == "net_flow":
-            summary = f"{attrs.get('src_ip', '?')} → {attrs.get('dst_ip', '?')}:{attrs.get('dst_port', '?')} ({attrs.get('protocol', '?')})"
-
-        elif event_type == "process_create":
-            summary = f"{attrs.get('username', '?')} ran {attrs.get('process_name', '?')} (parent: {attrs.get('parent_process', '?')})"
-
-        elif event_type == "login":
-            summary = f"{attrs.get('username', '?')} logged in from {attrs.get('src_ip', '?')} via {attrs.get('auth_method', '?')} ({attrs.get('outcome', '?')})"
-
-        else:
-            summary = str(attrs)[:200]  # fallback
+        summary = summarize_event(ev)
+        if (ev.get("count") or 1) > 1:
+            summary += f" ×{ev['count']}"  # rolled-up record
 
         parsed.append({
             "source": item.get("source"),
             "entity": item.get("entity"),
             "score": round(item.get("score", 0), 4),
-            "timestamp": item.get("timestamp"),
+            "timestamp": str(item.get("timestamp")),
             "event_type": event_type,
             "summary": summary
         })
@@ -47,7 +55,8 @@ def parse_anomalies(json_path):
 # --- CORRELATIONS ---
 
 def parse_correlations(path):
-    data = load_json(path)
+    data = load_json(path)[:5]
+    eventstore.resolve([e for inc in data for e in inc.get("events", [])])
     parsed = []
 
     for inc in data:
@@ -62,7 +71,7 @@ def parse_correlations(path):
             summary = {
                 "source": src,
                 "event_type": evt.get("event_type"),
-                "timestamp": e.get("timestamp"),
+                "timestamp": str(e.get("timestamp")),
             }
 
             # Context-aware extraction
@@ -0,0 +1,212 @@
+import os
+import sys
+import time
+import glob
+import pickle
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from ingest import ingest_all
+from detect import (
+    DATA_DIR, load_models, calibrate_contamination, resolve_models, score_batch, flag_scored, apply_rerank, save_anomalies
+)
+from correlator import correlate, save_correlations
+
+# === CONFIG ===
+QUEUE_DIR = os.path.join(DATA_DIR, "work_queue")
+QUEUE_STATES = ("pending", "running", "done")
+# a claim older than this is taken to be from a crashed worker and goes back to pending;
+# keep it well above the slowest shard, or a live worker's shard is processed twice
+STALE_CLAIM_SECS = 3600
+
+
+# === SHARDING ===
+def shard_of(event, num_shards):
+    """
+    Stable shard for an event: crc32 of its correlation entity (user:/host:/ip:).
+    Every event of an entity lands on the same shard, so per-entity features are
+    computed from complete data and match a single-process run.
+    """
+    entity = event.get("entity") or "unknown"
+    return zlib.crc32(entity.encode("utf-8")) % num_shards
+
+
+def shard_events(events, num_shards):
+    shards = [[] for _ in range(num_shards)]
+    for e in events:
+        shards[shard_of(e, num_shards)].append(e)
+    return shards
+
+
+# === SHARD WORKER ===
+def process_shard(events, contamination_level=0.1, models=None):
+    """
+    Features → scoring for one shard with the models the parent resolved for the whole run.
+    Returns (score_batch entries, seconds).
+    """
+    start = time.perf_counter()
+    scored = score_batch(events, contamination_level, models)
+    return scored, time.perf_counter() - start
+
+
+def merge_shard_results(results, window_minutes=30):
+    """
+    Threshold the merged shard scores once per detector, then correlate. Alert decisions
+    and incidents match a single-process run whatever the shard count or finishing order.
+    """
+    anomalies = flag_scored([s for res in results for s in res[0]])
+    incidents = correlate(anomalies, window_minutes=window_minutes)
+    return anomalies, incidents
+
+
+# === LOCAL PARALLEL RUN ===
+def run_partitioned(events, workers=4, contamination_level=0.1, window_minutes=30):
+    """Score the shards in a local process pool, then threshold and correlate the merged scores."""
+    models = resolve_models(events, contamination_level)
+    shards = [s for s in shard_events(events, workers) if s]
+    if workers <= 1 or len(shards) <= 1:
+        results = [process_shard(s, contamination_level, models) for s in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(process_shard, shards, [contamination_level] * len(shards),
+                                    [models] * len(shards)))
+    for i, (shard, res) in enumerate(zip(shards, results)):
+        print(f"[INFO] Shard {i}: {len(shard)} events → "
+              f"{sum(len(s['entities']) for s in res[0])} entity scores in {res[1]:.2f}s")
+    return merge_shard_results(results, window_minutes)
+
+
+def detect_and_correlate(mapping, workers=4, window_minutes=30, rollup_secs=None):
+    """Partitioned equivalent of running detect.py then correlator.py on fresh events."""
+    events = ingest_all(mapping, rollup_secs=rollup_secs)
+    contamination_level = calibrate_contamination(load_models())
+
+    start = time.perf_counter()
+    anomalies, incidents = run_partitioned(events, workers, contamination_level, window_minutes)
+    elapsed = time.perf_counter() - start
+
+    anomalies = apply_rerank(anomalies, elapsed)
+    anomaly_path = save_anomalies(anomalies, events)
+    save_correlations(incidents)
+    print(f"✅ {len(events)} events on {workers} workers → {len(anomalies)} anomalies, "
+          f"{len(incidents)} incidents in {elapsed:.2f}s")
+    return anomalies, incidents, anomaly_path
+
+
+# === FILE-BASED WORK QUEUE (multi-node) ===
+# Any node that can see QUEUE_DIR (e.g. a shared mount) can run `partition.py worker`.
+# Tasks are claimed with an atomic rename from pending/ to running/; claims older than
+# STALE_CLAIM_SECS are renamed back to pending/ by the next worker that looks for work.
+def _queue_paths(queue_dir):
+    paths = {state: os.path.join(queue_dir, state) for state in QUEUE_STATES}
+    for p in paths.values():
+        os.makedirs(p, exist_ok=True)
+    return paths
+
+
+def enqueue(mapping, num_shards, queue_dir=QUEUE_DIR, window_minutes=30):
+    paths = _queue_paths(queue_dir)
+    events = ingest_all(mapping)
+    contamination_level = calibrate_contamination(load_models())
+    models = resolve_models(events, contamination_level)
+    count = 0
+    for i, shard in enumerate(shard_events(events, num_shards)):
+        if not shard:
+            continue
+        task = {"shard": i, "events": shard, "contamination": contamination_level,
+                "models": models, "window": window_minutes}
+        tmp = os.path.join(paths["pending"], f".shard_{i:04d}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(task, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, os.path.join(paths["pending"], f"shard_{i:04d}.pkl"))
+        count += 1
+    print(f"[INFO] Enqueued {count} shards → {paths['pending']}")
+    return count
+
+
+def requeue_stale(paths, max_age=STALE_CLAIM_SECS):
+    """Move claims older than max_age (their worker died) from running/ back to pending/."""
+    requeued = 0
+    for path in glob.glob(os.path.join(paths["running"], "*_shard_*.pkl")):
+        try:
+            if time.time() - os.path.getmtime(path) < max_age:
+                continue
+            os.rename(path, os.path.join(paths["pending"], os.path.basename(path).split("_", 1)[1]))
+        except OSError:
+            continue  # finished or requeued by someone else meanwhile
+        requeued += 1
+        print(f"[WARN] Requeued stale claim {os.path.basename(path)}")
+    return requeued
+
+
+def work(queue_dir=QUEUE_DIR, stale_after=STALE_CLAIM_SECS):
+    """Claim and process pending shards until the queue is empty."""
+    paths = _queue_paths(queue_dir)
+    processed = 0
+    while True:
+        requeue_stale(paths, stale_after)
+        tasks = sorted(glob.glob(os.path.join(paths["pending"], "shard_*.pkl")))
+        if not tasks:
+            break
+        claimed = os.path.join(paths["running"], f"{os.getpid()}_{os.path.basename(tasks[0])}")
+        try:
+            os.rename(tasks[0], claimed)
+            os.utime(claimed)  # the claim's age starts now, not at enqueue time
+        except OSError:
+            continue  # another worker got it first
+        with open(claimed, "rb") as f:
+            task = pickle.load(f)
+        scored, secs = process_shard(task["events"], task["contamination"], task.get("models"))
+        out = os.path.join(paths["done"], f"shard_{task['shard']:04d}.pkl")
+        with open(out + ".tmp", "wb") as f:
+            pickle.dump((scored, secs, task["window"]), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(out + ".tmp", out)
+        try:
+            os.remove(claimed)
+        except FileNotFoundError:
+            pass  # requeued as stale while we worked; the duplicate run rewrites the same result
+        processed += 1
+        print(f"[INFO] Shard {task['shard']} done in {secs:.2f}s")
+    return processed
+
+
+def collect(queue_dir=QUEUE_DIR):
+    """Merge finished shard results and save them like a normal detect + correlate run."""
+    paths = _queue_paths(queue_dir)
+    results = []
+    for path in sorted(glob.glob(os.path.join(paths["done"], "shard_*.pkl"))):
+        with open(path, "rb") as f:
+            results.append(pickle.load(f))
+        os.remove(path)
+    if not results:
+        print("[INFO] No finished shards to collect.")
+        return [], []
+    pending = glob.glob(os.path.join(paths["pending"], "*.pkl")) + glob.glob(os.path.join(paths["running"], "*.pkl"))
+    if pending:
+        print(f"[WARN] {len(pending)} shards still pending/running — collecting partial results.")
+    anomalies, incidents = merge_shard_results(results, window_minutes=results[0][2])
+    save_anomalies(anomalies)
+    save_correlations(incidents)
+    return anomalies, incidents
+
+
+# === Main Run ===
+if __name__ == "__main__":
+    mapping = {
+        "auth": os.path.join(DATA_DIR, "train_auth.csv"),
+        "process": os.path.join(DATA_DIR, "train_process.csv"),
+        "firewall": os.path.join(DATA_DIR, "train_firewall.csv"),
+    }
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "run"
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+
+    if cmd == "run":
+        detect_and_correlate(mapping, workers=n)
+    elif cmd == "enqueue":
+        enqueue(mapping, num_shards=n)
+    elif cmd == "worker":
+        work()
+    elif cmd == "collect":
+        collect()
+    else:
+        print("Usage: python src/partition.py [run N | enqueue N | worker | collect]")
@@ -0,0 +1,75 @@
+import os
+import time
+from collections import OrderedDict
+from parsers import summarize_event
+
+# === CONFIG ===
+TOP_K = 5              # labelled neighbours consulted per anomaly
+MIN_SIMILARITY = 0.5   # ignore feedback that is only loosely related
+ALPHA = 0.5            # max relative boost/penalty from feedback
+LABEL_SIGN = {"TP": 1.0, "FP": -1.0}
+CACHE_SIZE = 10000
+
+# summary → feedback signal; cleared whenever the feedback index changes
+_signal_cache = OrderedDict()
+_cache_version = None
+
+
+def _index_version():
+    from feedback import FAISS_INDEX_PATH, META_PATH
+    if not os.path.exists(FAISS_INDEX_PATH):
+        return None
+    return (os.path.getmtime(FAISS_INDEX_PATH), os.path.getmtime(META_PATH) if os.path.exists(META_PATH) else 0)
+
+
+def feedback_signal(neighbours):
+    """Similarity-weighted vote of labelled neighbours in [-1, 1]: TP pulls up, FP pushes down."""
+    votes = [(n["similarity"], LABEL_SIGN.get(str(n.get("label", "")).upper(), 0.0))
+             for n in neighbours if n["similarity"] >= MIN_SIMILARITY]
+    total = sum(sim for sim, _ in votes)
+    if total <= 0:
+        return 0.0
+    return sum(sim * sign for sim, sign in votes) / total
+
+
+def rerank_anomalies(anomalies, k=TOP_K, alpha=ALPHA):
+    """
+    Re-rank anomalies by how much their summaries resemble past TP/FP feedback.
+    All uncached summaries are embedded in one batch and looked up with one FAISS search.
+    Returns (reranked anomalies, stats).
+    """
+    global _cache_version
+    stats = {"anomalies": len(anomalies), "unique_summaries": 0, "cache_hits": 0, "embedded": 0, "seconds": 0.0}
+    start = time.perf_counter()
+
+    version = _index_version()
+    if version is None or not anomalies:
+        return anomalies, stats
+    if version != _cache_version:
+        _signal_cache.clear()
+        _cache_version = version
+
+    summaries = [summarize_event(a.get("event", {})) for a in anomalies]
+    unique = list(dict.fromkeys(summaries))
+    misses = [s for s in unique if s not in _signal_cache]
+    stats["unique_summaries"] = len(unique)
+    stats["cache_hits"] = len(unique) - len(misses)
+    stats["embedded"] = len(misses)
+
+    if misses:
+        from feedback import encode_texts, search_similar_batch
+        neighbours = search_similar_batch(encode_texts(misses), k=k)
+        for summary, near in zip(misses, neighbours):
+            _signal_cache[summary] = feedback_signal(near)
+            if len(_signal_cache) > CACHE_SIZE:
+                _signal_cache.popitem(last=False)
+
+    for a, summary in zip(anomalies, summaries):
+        signal = _signal_cache.get(summary, 0.0)
+        a.setdefault("base_score", a["score"])
+        a["feedback_signal"] = round(signal, 4)
+        a["score"] = float(a["base_score"] * (1 + alpha * signal))
+
+    anomalies.sort(key=lambda x: x["score"], reverse=True)
+    stats["seconds"] = time.perf_counter() - start
+    return anomalies, stats
@@ -1,30 +1,19 @@
 import os
 import json
-import numpy as np
-from sklearn.ensemble import IsolationForest
-from joblib import dump, load
 from datetime import datetime, timedelta
+import store
+import artifacts
 
 # === PATHS ===
 BASE = os.path.dirname(__file__)
 PROJECT_ROOT = os.path.abspath(os.path.join(BASE, ".."))
 DATA_DIR = os.path.join(PROJECT_ROOT, "data")
-CORR_DIR = os.path.join(DATA_DIR, "correlations")
-ANOM_DIR = os.path.join(DATA_DIR, "anomalies")
-WEIGHT_FILE = os.path.join(DATA_DIR, "adaptive_weights.json")
-FEEDBACK_FILE = os.path.join(DATA_DIR, "feedback_store.json")
-
-RETRAIN_DIR = os.path.join(PROJECT_ROOT, "retrained_model")
-os.makedirs(RETRAIN_DIR, exist_ok=True)
 
 # === UTILITIES ===
-def load_latest_json(folder):
-    if not os.path.exists(folder):
-        return None
-    json_files = [f for f in os.listdir(folder) if f.endswith(".json")]
-    if not json_files:
+def load_latest_json(kind):
+    latest_file = artifacts.latest_path(kind)
+    if not latest_file:
         return None
-    latest_file = max([os.path.join(folder, f) for f in json_files], key=os.path.getmtime)
     with open(latest_file, "r") as f:
         return json.load(f)
 
@@ -39,6 +28,7 @@ def save_json(path, data):
         json.dump(data, f, indent=4)
 
 def extract_features(correlated_data, weights):
+    import numpy as np
     features = []
     for item in correlated_data:
         event_count = len(item.get("events", []))
@@ -50,45 +40,46 @@ def extract_features(correlated_data, weights):
 
 
 # === ADAPTIVE WEIGHT UPDATE ===
-def update_weights(weights, feedback_data, decay=0.98):
+FEEDBACK_REWARDS = {"TP": 0.2, "FP": -0.3}
+
+def update_weights(conn=None):
     """
     Update adaptive weights using feedback:
     - FP (false positive): decrease weight
     - TP (true positive): increase weight
-    Also apply a decay factor to slowly reduce old weight influence.
+    Only feedback submitted since the last retrain is folded in; the decay that slowly
+    reduces old weight influence is applied lazily by the store when a weight is read.
     """
-    for cid, fb in feedback_data.items():
-        old_weight = weights.get(cid, 0.0) * decay
-        if fb.get("label") == "TP":
-            new_weight = old_weight + 0.2  # reward
-        elif fb.get("label") == "FP":
-            new_weight = old_weight - 0.3  # penalize
-        else:
-            new_weight = old_weight
-        weights[cid] = float(np.clip(new_weight, -1.0, 1.0))
-    return weights
+    return store.fold_pending_feedback(FEEDBACK_REWARDS, conn=conn)
 
 
 # === MAIN LOGIC ===
 if __name__ == "__main__":
     print("🔁 Starting Adaptive Global Model Retraining...")
 
-    correlation_data = load_latest_json(CORR_DIR)
-    anomaly_data = load_latest_json(ANOM_DIR)
-    weights = load_json(WEIGHT_FILE)
-    feedback_data = load_json(FEEDBACK_FILE)
+    correlation_data = load_latest_json("correlations")
+    anomaly_data = load_latest_json("anomalies")
 
     if not correlation_data or not anomaly_data:
         print("⚠️ Missing correlation or anomaly data. Retraining aborted.")
         exit()
 
-    if not feedback_data:
+    if not store.count_pending_feedback():
         print("⚠️ No new feedback available. Retraining skipped.")
         exit()
 
     # Update adaptive weights using feedback
-    weights = update_weights(weights, feedback_data)
-    save_json(WEIGHT_FILE, weights)
+    conn = store.connect()
+    folded = update_weights(conn)
+    print(f"🧮 Folded {folded} new feedback entries into adaptive weights.")
+    incident_ids = [item.get("incident_id") for item in correlation_data + anomaly_data if item.get("incident_id")]
+    weights = store.get_weights(incident_ids, conn=conn)
+    conn.close()
+
+    # heavy dependencies are only needed once there is something to retrain
+    import numpy as np
+    from sklearn.ensemble import IsolationForest
+    from joblib import dump
 
     # Combine both anomaly and correlation datasets
     X_corr = extract_features(correlation_data, weights)
@@ -104,8 +95,9 @@ if __name__ == "__main__":
     model.fit(X)
 
     timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H-%M-%S")
-    model_path = os.path.join(RETRAIN_DIR, f"adaptive_model_{timestamp}.joblib")
+    model_path = artifacts.partition_path("models", f"adaptive_model_{timestamp}.joblib")
     dump(model, model_path)
+    artifacts.register("models", model_path, records=len(X))
 
     print(f"✅ Adaptive model retrained and saved at:\n➡️ {model_path}")
     print("📈 Feedback integrated. Adaptive weights updated.")
\ No newline at end of file
@@ -0,0 +1,149 @@
+import os
+import time
+import hashlib
+import sqlite3
+import numpy as np
+
+# === PATHS ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
+CACHE_PATH = os.path.join(DATA_DIR, "score_cache.db")
+
+# entities not seen for this long are evicted
+EVICT_AFTER_SECS = 7 * 86400
+ENABLED = os.getenv("SCORE_CACHE", "1") != "0"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    source TEXT NOT NULL,
+    entity TEXT NOT NULL,
+    feature_hash TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    score REAL NOT NULL,
+    pred INTEGER NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (source, entity)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_scores_last_seen ON scores(last_seen);
+
+CREATE TABLE IF NOT EXISTS runs (
+    run_at REAL NOT NULL,
+    source TEXT NOT NULL,
+    entities INTEGER NOT NULL,
+    hits INTEGER NOT NULL,
+    evicted INTEGER NOT NULL
+);
+"""
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or CACHE_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# === KEYS ===
+def model_version(model_path):
+    """Identify a model file by path, size and mtime — any swap or retrain changes it."""
+    if not model_path or not os.path.exists(model_path):
+        return None
+    st = os.stat(model_path)
+    return hashlib.blake2b(f"{os.path.abspath(model_path)}|{st.st_size}|{st.st_mtime_ns}".encode(),
+                           digest_size=8).hexdigest()
+
+
+def feature_hashes(X):
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    return [hashlib.blake2b(row.tobytes(), digest_size=8).hexdigest() for row in X]
+
+
+# === CACHED SCORING ===
+def score_with_cache(model, version, source, entities, X, conn=None):
+    """
+    predict/decision_function for X, re-scoring only rows whose (entity, feature hash,
+    model version) is not cached. Returns (preds, scores, stats).
+    A version of None (e.g. a model fitted on the fly) or SCORE_CACHE=0 bypasses the cache.
+    """
+    n = len(entities)
+    stats = {"source": source, "entities": n, "hits": 0, "evicted": 0}
+    if version is None or n == 0 or not ENABLED:
+        scores = model.decision_function(X)
+        return np.where(scores < 0, -1, 1), scores, stats
+
+    own = conn is None
+    conn = conn or connect()
+    now = time.time()
+    try:
+        entities = [str(e) for e in entities]
+        hashes = feature_hashes(X)
+        cached = {}
+        for start in range(0, n, 500):
+            chunk = entities[start:start + 500]
+            rows = conn.execute(
+                "SELECT entity, feature_hash, model_version, score, pred FROM scores "
+                f"WHERE source = ? AND entity IN ({','.join('?' * len(chunk))})",
+                [source] + chunk
+            ).fetchall()
+            cached.update({r[0]: r[1:] for r in rows})
+
+        preds = np.empty(n, dtype=int)
+        scores = np.empty(n, dtype=float)
+        miss = []
+        for i, (ent, h) in enumerate(zip(entities, hashes)):
+            hit = cached.get(ent)
+            if hit and hit[0] == h and hit[1] == version:
+                scores[i], preds[i] = hit[2], hit[3]
+            else:
+                miss.append(i)
+        stats["hits"] = n - len(miss)
+
+        if miss:
+            X_miss = np.asarray(X)[miss]
+            scores[miss] = model.decision_function(X_miss)
+            preds[miss] = np.where(scores[miss] < 0, -1, 1)  # IsolationForest.predict rule
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(source, entities[i], hashes[i], version, float(scores[i]), int(preds[i]), now) for i in range(n)]
+            )
+            stats["evicted"] = conn.execute(
+                "DELETE FROM scores WHERE source = ? AND last_seen < ?", (source, now - EVICT_AFTER_SECS)
+            ).rowcount
+            conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?)",
+                (now, source, n, stats["hits"], stats["evicted"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return preds, scores, stats
+    finally:
+        if own:
+            conn.close()
+
+
+def hit_rate_report(last_n=20, conn=None):
+    """Per-source hit rate over the last N runs."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        rows = conn.execute(
+            "SELECT source, SUM(entities), SUM(hits), SUM(evicted) FROM "
+            "(SELECT * FROM runs ORDER BY run_at DESC LIMIT ?) GROUP BY source",
+            (int(last_n) * 3,)
+        ).fetchall()
+        return {src: {"entities": ents, "hits": hits, "hit_rate": hits / ents if ents else 0.0, "evicted": ev}
+                for src, ents, hits, ev in rows}
+    finally:
+        if own:
+            conn.close()
+
+
+if __name__ == "__main__":
+    for src, r in hit_rate_report().items():
+        print(f"- {src}: {r['hits']}/{r['entities']} cached ({r['hit_rate']:.1%}), {r['evicted']} evicted")
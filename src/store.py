@@ -0,0 +1,324 @@
+import os
+import json
+import sqlite3
+import time
+from datetime import datetime
+
+# === PATHS ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
+os.makedirs(DATA_DIR, exist_ok=True)
+
+DB_PATH = os.path.join(DATA_DIR, "feedback_store.db")
+LEGACY_FEEDBACK_PATH = os.path.join(DATA_DIR, "feedback_store.json")
+LEGACY_WEIGHTS_PATH = os.path.join(DATA_DIR, "adaptive_weights.json")
+
+# === DECAY CONFIG ===
+# weights lose 2% of their influence per day since they were last touched
+WEIGHT_DECAY = 0.98
+DECAY_PERIOD_SECS = 86400.0
+WEIGHT_MIN, WEIGHT_MAX = -1.0, 1.0
+
+_initialized = set()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    incident_id TEXT NOT NULL,
+    label TEXT,
+    comment TEXT,
+    timestamp TEXT NOT NULL,
+    applied INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_incident ON feedback(incident_id);
+CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback(timestamp);
+CREATE INDEX IF NOT EXISTS idx_feedback_applied ON feedback(applied);
+
+CREATE TABLE IF NOT EXISTS adaptive_weights (
+    incident_id TEXT PRIMARY KEY,
+    weight REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_weights_updated ON adaptive_weights(updated_at);
+
+CREATE TABLE IF NOT EXISTS feedback_imports (
+    digest TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    imported_at REAL NOT NULL
+);
+"""
+
+
+# === CONNECTION ===
+def connect(path=None):
+    """Open the store in WAL mode so readers never block the writer."""
+    path = path or DB_PATH
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if path not in _initialized:
+        conn.executescript(SCHEMA)
+        _migrate_legacy_json(conn)
+        _initialized.add(path)
+    return conn
+
+
+def _migrate_legacy_json(conn):
+    """One-off import of the old whole-file JSON stores into an empty database."""
+    if conn.execute("SELECT 1 FROM feedback LIMIT 1").fetchone() or \
+            conn.execute("SELECT 1 FROM adaptive_weights LIMIT 1").fetchone():
+        return
+    feedback_data, weights = {}, {}
+    for path, target in [(LEGACY_FEEDBACK_PATH, "feedback"), (LEGACY_WEIGHTS_PATH, "weights")]:
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[WARN] Skipping legacy store {path}: {e}")
+            continue
+        if target == "feedback":
+            feedback_data = data
+        else:
+            weights = data
+    if not feedback_data and not weights:
+        return
+
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO feedback (incident_id, label, comment, timestamp, applied) VALUES (?, ?, ?, ?, 1)",
+            [(str(fb.get("incident_id", cid)), fb.get("label"), fb.get("comment"),
+              fb.get("timestamp") or datetime.utcnow().isoformat())
+             for cid, fb in feedback_data.items()]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO adaptive_weights (incident_id, weight, updated_at) VALUES (?, ?, ?)",
+            [(str(cid), float(w), now) for cid, w in weights.items()]
+        )
+        conn.execute("COMMIT")
+        print(f"[INFO] Migrated {len(feedback_data)} feedback entries and {len(weights)} weights → {DB_PATH}")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# === FEEDBACK ===
+def add_feedback(incident_id, label, comment, conn=None):
+    """Append one analyst verdict. Each submission is its own row, so nothing is overwritten."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        conn.execute(
+            "INSERT INTO feedback (incident_id, label, comment, timestamp) VALUES (?, ?, ?, ?)",
+            (str(incident_id), label, comment, datetime.utcnow().isoformat())
+        )
+    finally:
+        if own:
+            conn.close()
+
+
+def import_feedback(rows, deltas, digest=None, conn=None):
+    """
+    Bulk path: insert many feedback rows and apply their weight deltas in one transaction.
+    rows: iterable of (incident_id, label, comment, timestamp). deltas: iterable of (incident_id, delta).
+    digest identifies the import file; an import already committed under it is not applied
+    again and None is returned.
+    """
+    own = conn is None
+    conn = conn or connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if digest and conn.execute("SELECT 1 FROM feedback_imports WHERE digest = ?", (digest,)).fetchone():
+                conn.execute("ROLLBACK")
+                return None
+            cur = conn.executemany(
+                "INSERT INTO feedback (incident_id, label, comment, timestamp) VALUES (?, ?, ?, ?)",
+                ((str(i), label, comment, ts or datetime.utcnow().isoformat()) for i, label, comment, ts in rows)
+            )
+            inserted = cur.rowcount
+            _apply_deltas(conn, deltas, time.time())
+            if digest:
+                conn.execute("INSERT INTO feedback_imports VALUES (?, ?, ?)", (digest, inserted, time.time()))
+            conn.execute("COMMIT")
+            return inserted
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        if own:
+            conn.close()
+
+
+def get_feedback_history(limit=20, offset=0, conn=None):
+    """Return one page of feedback, newest first."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        rows = conn.execute(
+            "SELECT incident_id, label, comment, timestamp FROM feedback "
+            "ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+            (int(limit), int(offset))
+        ).fetchall()
+        return [dict(r) for r in rows]
+    finally:
+        if own:
+            conn.close()
+
+
+def count_feedback(conn=None):
+    own = conn is None
+    conn = conn or connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM feedback").fetchone()[0]
+    finally:
+        if own:
+            conn.close()
+
+
+def count_pending_feedback(conn=None):
+    """How many feedback rows the next fold_pending_feedback() would fold in."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM feedback WHERE applied = 0").fetchone()[0]
+    finally:
+        if own:
+            conn.close()
+
+
+def pending_feedback(conn):
+    """Feedback rows not yet folded into the adaptive weights by a retrain."""
+    rows = conn.execute(
+        "SELECT id, incident_id, label FROM feedback WHERE applied = 0 ORDER BY id"
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def mark_applied(conn, feedback_ids):
+    conn.executemany("UPDATE feedback SET applied = 1 WHERE id = ?", [(i,) for i in feedback_ids])
+
+
+# === ADAPTIVE WEIGHTS ===
+def decayed(weight, updated_at, now=None):
+    """Apply the time decay lazily, from the last time the weight was written."""
+    now = time.time() if now is None else now
+    elapsed = max(0.0, now - updated_at) / DECAY_PERIOD_SECS
+    return weight * (WEIGHT_DECAY ** elapsed)
+
+
+def get_weight(incident_id, conn=None):
+    own = conn is None
+    conn = conn or connect()
+    try:
+        row = conn.execute(
+            "SELECT weight, updated_at FROM adaptive_weights WHERE incident_id = ?",
+            (str(incident_id),)
+        ).fetchone()
+        return decayed(row["weight"], row["updated_at"]) if row else 0.0
+    finally:
+        if own:
+            conn.close()
+
+
+def get_weights(incident_ids=None, conn=None):
+    """Decayed weights for the given incidents (or all of them) as a dict."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        if incident_ids is None:
+            rows = conn.execute("SELECT incident_id, weight, updated_at FROM adaptive_weights").fetchall()
+        else:
+            ids = [str(i) for i in incident_ids]
+            rows = []
+            # stay under SQLite's bound-parameter limit
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows.extend(conn.execute(
+                    "SELECT incident_id, weight, updated_at FROM adaptive_weights "
+                    f"WHERE incident_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall())
+        now = time.time()
+        return {r["incident_id"]: decayed(r["weight"], r["updated_at"], now) for r in rows}
+    finally:
+        if own:
+            conn.close()
+
+
+def weights_changed_since(since, conn=None):
+    """(incident_id, decayed weight, updated_at) for weights written after `since`, oldest first."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        rows = conn.execute(
+            "SELECT incident_id, weight, updated_at FROM adaptive_weights WHERE updated_at > ? ORDER BY updated_at",
+            (float(since),)
+        ).fetchall()
+        now = time.time()
+        return [(r["incident_id"], decayed(r["weight"], r["updated_at"], now), r["updated_at"]) for r in rows]
+    finally:
+        if own:
+            conn.close()
+
+
+def _apply_deltas(conn, deltas, now):
+    for incident_id, delta in deltas:
+        row = conn.execute(
+            "SELECT weight, updated_at FROM adaptive_weights WHERE incident_id = ?",
+            (str(incident_id),)
+        ).fetchone()
+        current = decayed(row["weight"], row["updated_at"], now) if row else 0.0
+        new_weight = min(WEIGHT_MAX, max(WEIGHT_MIN, current + delta))
+        conn.execute(
+            "INSERT OR REPLACE INTO adaptive_weights (incident_id, weight, updated_at) VALUES (?, ?, ?)",
+            (str(incident_id), new_weight, now)
+        )
+
+
+def adjust_weights(deltas, conn=None):
+    """
+    Add a delta to each incident's weight in a single write transaction.
+    deltas: iterable of (incident_id, delta). Only the touched rows are written.
+    """
+    own = conn is None
+    conn = conn or connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _apply_deltas(conn, deltas, time.time())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        if own:
+            conn.close()
+
+
+def fold_pending_feedback(rewards, conn=None):
+    """
+    Turn feedback submitted since the last retrain into weight updates and mark it applied,
+    atomically. rewards: {label: delta}. Returns the number of feedback rows folded in.
+    """
+    own = conn is None
+    conn = conn or connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            pending = pending_feedback(conn)
+            deltas = [(fb["incident_id"], rewards.get(fb["label"], 0.0)) for fb in pending]
+            _apply_deltas(conn, deltas, time.time())
+            mark_applied(conn, [fb["id"] for fb in pending])
+            conn.execute("COMMIT")
+            return len(pending)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        if own:
+            conn.close()
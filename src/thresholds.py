@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+from datetime import datetime, timedelta
+import numpy as np
+
+# === PATHS ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
+THRESHOLDS_DB = os.path.join(DATA_DIR, "thresholds.db")
+
+# === POLICY ===
+# share of scored entities/events each source should alert on
+TARGET_ALERT_RATE = {"default": 0.02}
+WINDOW_DAYS = 7          # thresholds come from the scores of the last WINDOW_DAYS days
+RETAIN_DAYS = 30         # older day sketches are dropped
+MIN_SAMPLES = 200        # below this the model's own predict() is used (cold start)
+SKETCH_K = 200           # KLL accuracy parameter: rank error ≈ 1.7 / k
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sketches (
+    source TEXT NOT NULL,
+    day TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    sketch BLOB NOT NULL,
+    PRIMARY KEY (source, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS threshold_log (
+    run_at REAL NOT NULL,
+    source TEXT NOT NULL,
+    target_rate REAL NOT NULL,
+    threshold REAL,
+    window_n INTEGER NOT NULL,
+    run_n INTEGER NOT NULL,
+    flagged INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threshold_log ON threshold_log(source, run_at);
+"""
+
+
+# === KLL QUANTILE SKETCH ===
+class KLLSketch:
+    """
+    Mergeable streaming quantile sketch (Karnin–Lang–Liberty). Items live in compactors;
+    an item at level h stands for 2^h scores. A full compactor sorts itself and promotes
+    every other item one level up, so memory stays O(k) however many scores are added
+    and each score costs O(1) amortized compaction work.
+    """
+
+    def __init__(self, k=SKETCH_K, levels=None, n=0, seed=None):
+        self.k = k
+        self.levels = levels or [np.empty(0)]
+        self.n = n
+        self._rng = random.Random(seed)
+
+    def _capacity(self, h):
+        depth = len(self.levels) - 1 - h
+        return max(2, int(np.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values):
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self.n += len(values)
+            self._compress()
+        return self
+
+    def _compress(self):
+        while True:
+            full = [h for h in range(len(self.levels)) if len(self.levels[h]) > self._capacity(h)]
+            if not full:
+                return
+            h = full[0]
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[h])
+            keep = items[-1:] if len(items) % 2 else items[:0]
+            promoted = items[:len(items) - len(keep)][self._rng.randint(0, 1)::2]
+            self.levels[h] = keep
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+
+    def merge(self, other):
+        for h, items in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        items = np.concatenate(self.levels)
+        if not len(items):
+            return None
+        weights = np.concatenate([np.full(len(lv), 2.0 ** h) for h, lv in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cum = np.cumsum(weights[order])
+        idx = int(np.searchsorted(cum, q * cum[-1], side="left"))
+        return float(items[order[min(idx, len(items) - 1)]])
+
+    # compact persistence: a small JSON header + float32 items
+    def to_bytes(self):
+        header = json.dumps({"k": self.k, "n": self.n, "sizes": [len(lv) for lv in self.levels]}).encode()
+        body = np.concatenate(self.levels).astype(np.float32).tobytes()
+        return len(header).to_bytes(4, "little") + header + body
+
+    @classmethod
+    def from_bytes(cls, blob):
+        size = int.from_bytes(blob[:4], "little")
+        header = json.loads(blob[4:4 + size])
+        items = np.frombuffer(blob[4 + size:], dtype=np.float32).astype(np.float64)
+        levels, pos = [], 0
+        for s in header["sizes"]:
+            levels.append(items[pos:pos + s])
+            pos += s
+        return cls(k=header["k"], levels=levels or [np.empty(0)], n=header["n"])
+
+
+# === STORE ===
+def connect(path=None):
+    conn = sqlite3.connect(path or THRESHOLDS_DB, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def target_rate(source):
+    return TARGET_ALERT_RATE.get(source, TARGET_ALERT_RATE["default"])
+
+
+def window_sketch(conn, source, now=None):
+    """Merged sketch of the source's last WINDOW_DAYS day sketches."""
+    since = ((now or datetime.now()) - timedelta(days=WINDOW_DAYS - 1)).strftime("%Y-%m-%d")
+    merged = KLLSketch()
+    for (blob,) in conn.execute(
+        "SELECT sketch FROM sketches WHERE source = ? AND day >= ? ORDER BY day", (source, since)
+    ):
+        merged.merge(KLLSketch.from_bytes(blob))
+    return merged
+
+
+def update_threshold(source, scores, conn=None):
+    """
+    Fold this run's anomaly scores (higher = more anomalous) into today's sketch. Returns
+    (threshold, recent score count); the threshold holds the source's target alert rate over
+    the recent window and is None while fewer than MIN_SAMPLES scores have been seen.
+    """
+    own = conn is None
+    conn = conn or connect()
+    now = datetime.now()
+    day = now.strftime("%Y-%m-%d")
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # concurrent shard/partition workers update the same row
+        try:
+            row = conn.execute("SELECT sketch FROM sketches WHERE source = ? AND day = ?", (source, day)).fetchone()
+            sketch = KLLSketch.from_bytes(row[0]) if row else KLLSketch()
+            sketch.update(scores)
+            conn.execute("INSERT OR REPLACE INTO sketches VALUES (?, ?, ?, ?)",
+                         (source, day, sketch.n, sketch.to_bytes()))
+            conn.execute("DELETE FROM sketches WHERE day < ?",
+                         ((now - timedelta(days=RETAIN_DAYS)).strftime("%Y-%m-%d"),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        recent = window_sketch(conn, source, now)
+        if recent.n < MIN_SAMPLES:
+            return None, recent.n
+        return recent.quantile(1.0 - target_rate(source)), recent.n
+    finally:
+        if own:
+            conn.close()
+
+
+def flag(source, scores, fallback_preds, path=None):
+    """
+    Anomaly decisions (-1 / 1) for one run of a source from its online threshold.
+    Falls back to the model's own predictions during cold start or if the store fails.
+    path: threshold store to use instead of THRESHOLDS_DB (e.g. a backfill's own state).
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if not len(scores):
+        return fallback_preds
+    try:
+        conn = connect(path)
+        try:
+            threshold, window_n = update_threshold(source, scores, conn)
+            preds = fallback_preds if threshold is None else np.where(scores >= threshold, -1, 1)
+            conn.execute("INSERT INTO threshold_log VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (time.time(), source, target_rate(source), threshold, window_n, len(scores),
+                          int(np.sum(np.asarray(preds) == -1))))
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[WARN] Online threshold for {source} unavailable ({e}); using model offset")
+        return fallback_preds
+    if threshold is not None:
+        print(f"📏 Threshold [{source}] {threshold:.4f} for {target_rate(source):.1%} target alert rate "
+              f"({window_n} recent scores)")
+    return preds
+
+
+# === DRIFT REPORT ===
+def drift_report(days=30, conn=None):
+    """Per-source threshold history over the last `days` days: start, end, range and alert rate."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        rows = conn.execute(
+            "SELECT source, run_at, threshold, run_n, flagged, target_rate FROM threshold_log "
+            "WHERE run_at >= ? AND threshold IS NOT NULL ORDER BY source, run_at",
+            (time.time() - days * 86400,)
+        ).fetchall()
+    finally:
+        if own:
+            conn.close()
+    report = {}
+    for source, run_at, threshold, run_n, flagged, rate in rows:
+        r = report.setdefault(source, {"runs": 0, "series": [], "scored": 0, "flagged": 0, "target_rate": rate})
+        r["runs"] += 1
+        r["scored"] += run_n
+        r["flagged"] += flagged
+        r["series"].append((run_at, threshold))
+    for r in report.values():
+        values = [t for _, t in r["series"]]
+        r.update(first=values[0], last=values[-1], min=min(values), max=max(values),
+                 drift=values[-1] - values[0], alert_rate=r["flagged"] / max(r["scored"], 1))
+    return report
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if cmd == "report":
+        days = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+        report = drift_report(days)
+        if not report:
+            print("No threshold history yet.")
+        for source, r in sorted(report.items()):
+            print(f"\n=== {source}: {r['runs']} runs, alert rate {r['alert_rate']:.2%} "
+                  f"(target {r['target_rate']:.2%}) ===")
+            print(f"threshold {r['first']:.4f} → {r['last']:.4f} (drift {r['drift']:+.4f}, "
+                  f"range {r['min']:.4f}..{r['max']:.4f})")
+            for run_at, t in r["series"][-10:]:
+                print(f"  {datetime.fromtimestamp(run_at).isoformat(timespec='seconds')}  {t:.4f}")
+    else:
+        print("Usage: python src/thresholds.py [report [days]]")
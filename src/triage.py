@@ -0,0 +1,413 @@
+import os
+import sys
+import time
+import heapq
+import sqlite3
+import threading
+from contextlib import closing
+
+import store
+
+# === PATHS ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "data")
+TRIAGE_DB = os.path.join(DATA_DIR, "triage.db")
+
+# Weight writes committed slightly after a sync read are picked up by re-reading this far back.
+WEIGHT_SYNC_SLACK_SECS = 5.0
+STATUSES = ("open", "claimed", "closed")
+
+# One row per correlation key: re-correlation gives incidents new IDs, so a key's entry
+# follows its latest incident, and every ID it has had stays an alias (feedback on any of
+# them reprioritizes the entry). `version` rises with every change so readers catch up
+# incrementally.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    incident_id TEXT NOT NULL,
+    score REAL NOT NULL,
+    num_events INTEGER NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    correlation_file TEXT,
+    status TEXT NOT NULL DEFAULT 'open',
+    assignee TEXT,
+    updated_at REAL NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_version ON entries(version);
+
+CREATE TABLE IF NOT EXISTS aliases (
+    incident_id TEXT PRIMARY KEY,
+    key TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+# === INDEXED HEAP ===
+class IndexedHeap:
+    """
+    Binary max-heap of items by priority with a position map, so an item's priority can be
+    changed or the item removed in O(log n) without searching the heap. Ties go to the
+    smaller item so the order is deterministic.
+    """
+
+    def __init__(self, priorities=None):
+        self._heap = [(-p, item) for item, p in (priorities or {}).items()]
+        heapq.heapify(self._heap)
+        self._pos = {item: i for i, (_, item) in enumerate(self._heap)}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, item):
+        return item in self._pos
+
+    def priority(self, item):
+        return -self._heap[self._pos[item]][0]
+
+    def push(self, item, priority):
+        """Insert an item or change its priority."""
+        entry = (-priority, item)
+        i = self._pos.get(item)
+        if i is None:
+            self._heap.append(entry)
+            self._pos[item] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+        else:
+            old = self._heap[i]
+            self._heap[i] = entry
+            self._sift_up(i) if entry < old else self._sift_down(i)
+
+    def remove(self, item):
+        i = self._pos.pop(item, None)
+        if i is None:
+            return False
+        last = self._heap.pop()
+        if i < len(self._heap):
+            self._heap[i] = last
+            self._pos[last[1]] = i
+            self._sift_up(i)
+            self._sift_down(self._pos[last[1]])
+        return True
+
+    def pop(self):
+        """(item, priority) with the highest priority, removed from the heap."""
+        neg, item = self._heap[0]
+        self.remove(item)
+        return item, -neg
+
+    def top(self, k):
+        """The k highest (item, priority) pairs without modifying the heap: O(k log k)."""
+        out, frontier = [], [(self._heap[0], 0)] if self._heap else []
+        while frontier and len(out) < k:
+            (neg, item), i = heapq.heappop(frontier)
+            out.append((item, -neg))
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self._heap):
+                    heapq.heappush(frontier, (self._heap[child], child))
+        return out
+
+    def _swap(self, i, j):
+        h = self._heap
+        h[i], h[j] = h[j], h[i]
+        self._pos[h[i][1]] = i
+        self._pos[h[j][1]] = j
+
+    def _sift_up(self, i):
+        while i > 0:
+            parent = (i - 1) // 2
+            if self._heap[i] >= self._heap[parent]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i):
+        n = len(self._heap)
+        while True:
+            smallest, left, right = i, 2 * i + 1, 2 * i + 2
+            if left < n and self._heap[left] < self._heap[smallest]:
+                smallest = left
+            if right < n and self._heap[right] < self._heap[smallest]:
+                smallest = right
+            if smallest == i:
+                return
+            self._swap(i, smallest)
+            i = smallest
+
+
+# === PERSISTENT STORE ===
+def connect(path=None):
+    conn = sqlite3.connect(path or TRIAGE_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _next_version(conn):
+    return conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM entries").fetchone()[0]
+
+
+def _iso(ts):
+    return ts.isoformat() if hasattr(ts, "isoformat") else ts
+
+
+def enqueue(incidents, correlation_file=None, conn=None):
+    """
+    Add or extend queue entries from a batch of correlated incidents in one transaction.
+    An entry that was claimed or closed reopens when its incident gained later activity.
+    Returns the number of entries written.
+    """
+    own = conn is None
+    conn = conn or connect()
+    now = time.time()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = _next_version(conn)
+            known = {}
+            keys = [inc.get("key") for inc in incidents if inc.get("key")]
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                known.update((r["key"], r) for r in conn.execute(
+                    f"SELECT key, status, assignee, end_time FROM entries WHERE key IN ({','.join('?' * len(chunk))})", chunk))
+            rows, aliases = [], []
+            for inc in incidents:
+                key = inc.get("key")
+                if not key:
+                    continue
+                end_time = _iso(inc.get("end_time"))
+                prev = known.get(key)
+                status, assignee = "open", None
+                if prev is not None and prev["status"] != "open" and (end_time or "") <= (prev["end_time"] or ""):
+                    status, assignee = prev["status"], prev["assignee"]  # nothing new since the analyst took it
+                rows.append((key, str(inc.get("incident_id")), float(inc.get("score") or 0.0),
+                             inc.get("event_count") or len(inc.get("events", [])), _iso(inc.get("start_time")),
+                             end_time, correlation_file, status, assignee, now, version))
+                aliases.append((str(inc.get("incident_id")), key))
+            conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT OR REPLACE INTO aliases VALUES (?, ?)", aliases)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        if own:
+            conn.close()
+    return len(rows)
+
+
+def relink_correlation_files(old_files, new_file, conn=None):
+    """Point entries queued from old_files at new_file (after compaction merged them)."""
+    own = conn is None
+    conn = conn or connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = _next_version(conn)  # so running queues pick up the new file name
+            changed = conn.executemany(
+                "UPDATE entries SET correlation_file = ?, version = ? WHERE correlation_file = ?",
+                [(new_file, version, old) for old in old_files]).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        if own:
+            conn.close()
+    return changed
+
+
+def key_of(id_or_key, conn):
+    """Entry key for an incident ID (current or past) or a correlation key."""
+    row = conn.execute("SELECT key FROM aliases WHERE incident_id = ?", (str(id_or_key),)).fetchone()
+    if row:
+        return row[0]
+    row = conn.execute("SELECT key FROM entries WHERE key = ?", (str(id_or_key),)).fetchone()
+    return row[0] if row else None
+
+
+def has_entry(id_or_key, path=None):
+    with closing(connect(path)) as conn:
+        return key_of(id_or_key, conn) is not None
+
+
+def set_status(ids_or_keys, status, assignee=None, conn=None):
+    """
+    Claim, close or reopen entries by incident ID or key. Returns the keys changed: an entry
+    already in `status` is left alone, and only open entries can be claimed, so a claim never
+    takes an entry someone else claimed or closed meanwhile.
+    """
+    if status not in STATUSES:
+        raise ValueError(f"Invalid triage status: {status!r} (expected one of {', '.join(STATUSES)})")
+    own = conn is None
+    conn = conn or connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = _next_version(conn)
+            keys = [k for k in (key_of(i, conn) for i in ids_or_keys) if k]
+            allowed = ("open",) if status == "claimed" else tuple(s for s in STATUSES if s != status)
+            sql = ("UPDATE entries SET status = ?, assignee = ?, updated_at = ?, version = ? "
+                   f"WHERE key = ? AND status IN ({','.join('?' * len(allowed))})")
+            now = time.time()
+            keys = [k for k in dict.fromkeys(keys)
+                    if conn.execute(sql, (status, assignee, now, version, k) + allowed).rowcount]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        if own:
+            conn.close()
+    return keys
+
+
+# === IN-MEMORY QUEUE ===
+class TriageQueue:
+    """
+    Open entries of the triage store ordered by priority = correlation score + adaptive
+    weight. The first sync heapifies every open entry; later syncs apply only entries changed
+    since the last seen version and weights written since the last sync, each in O(log n).
+    Weights are taken when they change (their slow time decay in between is not re-applied).
+    """
+
+    def __init__(self, path=None, store_path=None):
+        self.path, self.store_path = path, store_path
+        self.heap = IndexedHeap()
+        self.entries = {}      # key → entry row (open entries only)
+        self.weights = {}      # key → (weight, updated_at) of its most recently fed-back alias
+        self.version = 0
+        self.weights_synced = 0.0
+        self._applied = {}     # incident_id → updated_at of the weight write last applied
+        self.lock = threading.Lock()
+
+    def _priority(self, key):
+        return self.entries[key]["score"] + self.weights.get(key, (0.0, 0.0))[0]
+
+    def sync(self):
+        with self.lock:
+            with closing(connect(self.path)) as conn, closing(store.connect(self.store_path)) as weights_conn:
+                changed = conn.execute("SELECT * FROM entries WHERE version > ? ORDER BY version",
+                                       (self.version,)).fetchall()
+                weight_rows = [(i, w, at) for i, w, at in store.weights_changed_since(
+                    max(0.0, self.weights_synced - WEIGHT_SYNC_SLACK_SECS), conn=weights_conn)
+                    if self._applied.get(i) != at]
+                alias_of = {}
+                ids = list({incident_id for incident_id, _, _ in weight_rows})
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    alias_of.update(conn.execute(
+                        f"SELECT incident_id, key FROM aliases WHERE incident_id IN ({','.join('?' * len(chunk))})", chunk))
+                # entries new to this queue may carry feedback given before they were queued
+                new_ids = {r["incident_id"]: r["key"] for r in changed
+                           if r["status"] == "open" and r["key"] not in self.weights}
+                earlier = store.get_weights(new_ids, conn=weights_conn) if new_ids else {}
+
+            touched = set()
+            for row in changed:
+                key = row["key"]
+                self.version = max(self.version, row["version"])
+                if row["status"] == "open":
+                    self.entries[key] = dict(row)
+                    touched.add(key)
+                else:
+                    self.entries.pop(key, None)
+                    self.heap.remove(key)
+            for incident_id, weight in earlier.items():
+                self.weights.setdefault(new_ids[incident_id], (weight, 0.0))
+            for incident_id, weight, updated_at in weight_rows:
+                self._applied[incident_id] = updated_at
+                key = alias_of.get(incident_id)
+                self.weights_synced = max(self.weights_synced, updated_at)
+                if key and updated_at > self.weights.get(key, (0.0, -1.0))[1]:
+                    self.weights[key] = (weight, updated_at)
+                    touched.add(key)
+
+            if len(self._applied) > 4096:
+                cutoff = self.weights_synced - WEIGHT_SYNC_SLACK_SECS
+                self._applied = {i: at for i, at in self._applied.items() if at >= cutoff}
+
+            if len(touched) > len(self.heap) // 2:
+                # bulk (e.g. first) load: heapify in O(n) instead of n pushes
+                self.heap = IndexedHeap({k: self._priority(k) for k in self.entries})
+            else:
+                for key in touched:
+                    if key in self.entries:
+                        self.heap.push(key, self._priority(key))
+            return len(touched)
+
+    def describe(self, key, priority):
+        e = self.entries[key]
+        return {
+            "incident_id": e["incident_id"], "key": key, "priority": round(priority, 4),
+            "score": round(e["score"], 4), "weight": round(self.weights.get(key, (0.0, 0.0))[0], 4),
+            "num_events": e["num_events"], "start_time": e["start_time"], "end_time": e["end_time"],
+            "correlation_file": e["correlation_file"],
+        }
+
+    def top(self, k=10):
+        """The k most urgent open incidents, without claiming them."""
+        self.sync()
+        with self.lock:
+            return [self.describe(key, p) for key, p in self.heap.top(k)]
+
+    def claim(self, k=1, assignee=None):
+        """
+        Pop the k most urgent open incidents and mark them claimed by `assignee`. Returns only
+        those this call claimed; one claimed or closed elsewhere since the last sync is dropped.
+        """
+        self.sync()
+        with self.lock:
+            picked = [self.describe(key, p) for key, p in self.heap.top(k)]
+            with closing(connect(self.path)) as conn:
+                claimed = set(set_status([p["key"] for p in picked], "claimed", assignee, conn=conn))
+            for p in picked:
+                self.heap.remove(p["key"])
+                self.entries.pop(p["key"], None)
+        return [p for p in picked if p["key"] in claimed]
+
+    def set_status(self, id_or_key, status, assignee=None):
+        """Close, reopen or release (status="open") one incident; applied through sync()."""
+        with closing(connect(self.path)) as conn:
+            keys = set_status([id_or_key], status, assignee, conn=conn)
+        self.sync()
+        return keys
+
+    def __len__(self):
+        return len(self.heap)
+
+
+_QUEUE = None
+
+
+def get_queue():
+    """Process-wide queue (the dashboard keeps one and syncs it per request)."""
+    global _QUEUE
+    if _QUEUE is None:
+        _QUEUE = TriageQueue()
+    return _QUEUE
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "top"
+    queue = get_queue()
+    if cmd == "top":
+        k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+        items = queue.top(k)
+        print(f"=== Triage queue: {len(queue)} open incidents ===")
+        for i, it in enumerate(items, 1):
+            print(f"{i:>3}. {it['priority']:+.3f} (score {it['score']:.3f}, weight {it['weight']:+.3f}) "
+                  f"{it['key']} — {it['num_events']} events, last {it['end_time']} [{it['incident_id']}]")
+    elif cmd == "claim":
+        k = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+        for it in queue.claim(k, assignee=sys.argv[3] if len(sys.argv) > 3 else None):
+            print(f"📌 Claimed {it['incident_id']} ({it['key']}, priority {it['priority']:+.3f})")
+    elif cmd in ("close", "reopen") and len(sys.argv) > 2:
+        keys = queue.set_status(sys.argv[2], "closed" if cmd == "close" else "open")
+        print(f"✅ {cmd.capitalize()}d {', '.join(keys)}" if keys
+              else f"[WARN] No triage entry for {sys.argv[2]}, or it is already {'closed' if cmd == 'close' else 'open'}")
+    else:
+        print("Usage: python src/triage.py [top [k] | claim [k] [analyst] | close <incident_id> | reopen <incident_id>]")
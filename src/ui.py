@@ -1,7 +1,13 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response, stream_with_context
 import json, os, sys, subprocess
 from datetime import datetime
-from feedback import give_feedback, get_adaptive_score, load_json
+from feedback import give_feedback, get_adaptive_score, get_feedback_history
+import store
+import incident_index
+import artifacts
+import feedback_import
+import explain_cache
+import triage
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(BASE_DIR)
@@ -10,17 +16,16 @@ TEMPLATES_DIR = os.path.join(PROJECT_ROOT, "templates")
 app = Flask(__name__, template_folder=TEMPLATES_DIR)
 app.secret_key = "supersecretkey"
 
+FEEDBACK_PAGE_SIZE = 20
+TRIAGE_TOP_K = 10
 
-def get_latest_json_file(folder_path):
-    """Find the most recent JSON output file."""
-    if not os.path.exists(folder_path):
-        print(f"[WARN] Folder not found: {folder_path}")
-        return None
-    files = [os.path.join(folder_path, f) for f in os.listdir(folder_path) if f.endswith(".json")]
-    if not files:
-        print(f"[WARN] No JSON files in: {folder_path}")
+
+def get_latest_json_file(kind):
+    """Find the most recent JSON output file of an artifact kind."""
+    latest = artifacts.latest_path(kind)
+    if not latest:
+        print(f"[WARN] No {kind} output found")
         return None
-    latest = max(files, key=os.path.getmtime)
     print(f"[INFO] Latest JSON file selected: {latest}")
     return latest
 
@@ -30,7 +35,11 @@ def index():
     """Render dashboard view."""
     last_action = session.get("last_action")
     latest_data = session.get("latest_data")
-    feedback_history = load_json(os.path.join(PROJECT_ROOT, "data", "feedback_store.json"))
+    page = max(1, request.args.get("page", 1, type=int) or 1)
+    feedback_history = get_feedback_history(page=page, per_page=FEEDBACK_PAGE_SIZE)
+    feedback_total = store.count_feedback()
+    triage_queue = triage.get_queue()
+    triage_top = triage_queue.top(TRIAGE_TOP_K)
     print(f"[INFO] Rendering dashboard for: {last_action or 'None'}")
 
     return render_template(
@@ -40,11 +49,24 @@ def index():
         feedback_submitted=session.pop("feedback_submitted", False),
         feedback_incident=session.pop("feedback_incident", None),
         adaptive_score=session.pop("adaptive_score", None),
-        feedback_history=feedback_history.values() if feedback_history else [],
+        feedback_history=feedback_history,
+        feedback_page=page,
+        feedback_has_next=page * FEEDBACK_PAGE_SIZE < feedback_total,
+        triage_top=triage_top,
+        triage_open=len(triage_queue),
         last_refresh=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     )
 
 
+SCRIPT_MAP = {
+    "anomaly": ("detect.py", "anomalies", "parse_anomalies"),
+    "correlate": ("correlator.py", "correlations", "parse_correlations"),
+    "explain": ("explain.py", "explanations", "parse_explanations"),
+    # retrained model stored directly under project root, not data/
+    "retrain": ("retrain.py", None, None),
+}
+
+
 @app.route("/run/<action>", methods=["POST"])
 def run_action(action):
     """
@@ -54,18 +76,10 @@ def run_action(action):
     - explain → explain.py
     - retrain → retrain.py
     """
-    script_map = {
-        "anomaly": ("detect.py", "anomalies", "parse_anomalies"),
-        "correlate": ("correlator.py", "correlations", "parse_correlations"),
-        "explain": ("explain.py", "explanations", "parse_explanations"),
-        # retrained model stored directly under project root, not data/
-        "retrain": ("retrain.py", None, None),
-    }
-
-    if action not in script_map:
+    if action not in SCRIPT_MAP:
         return "Invalid Action", 400
 
-    script_file, folder, parser_name = script_map[action]
+    script_file, folder, parser_name = SCRIPT_MAP[action]
     script_path = os.path.join(BASE_DIR, script_file)
 
     # Prevent re-triggering the same action repeatedly
@@ -98,11 +112,16 @@ def run_action(action):
         return redirect(url_for("index"))
 
     # ✅ Handle normal actions (anomaly, correlate, explain)
-    folder_path = os.path.join(PROJECT_ROOT, "data", folder)
-    latest_json = get_latest_json_file(folder_path)
+    show_latest(action, folder, parser_name)
+    return redirect(url_for("index"))
+
+
+def show_latest(action, folder, parser_name):
+    """Parse the newest output of an action into the session for the dashboard."""
+    latest_json = get_latest_json_file(folder)
     if not latest_json:
         session["latest_data"] = {"error": "No output JSON found"}
-        return redirect(url_for("index"))
+        return
 
     try:
         if parser_name:
@@ -121,9 +140,37 @@ def run_action(action):
         print(f"[ERROR] Parsing failed for {action}: {e}")
         session["latest_data"] = {"error": str(e)}
 
+
+@app.route("/show/<action>", methods=["GET"])
+def show_action(action):
+    """Display the latest stored output of an action without re-running it."""
+    if action not in SCRIPT_MAP or not SCRIPT_MAP[action][1]:
+        return "Invalid Action", 400
+    _, folder, parser_name = SCRIPT_MAP[action]
+    show_latest(action, folder, parser_name)
     return redirect(url_for("index"))
 
 
+@app.route("/stream/explain", methods=["GET"])
+def stream_explain():
+    """
+    Stream the LLM explanation to the browser as server-sent events.
+    Optional ?incident_id= narrows the explanation to one incident of the latest correlation file.
+    """
+    from explain import explain_streaming
+    incident_id = request.args.get("incident_id") or None
+
+    def generate():
+        for kind, value in explain_streaming(incident_id):
+            yield f"event: {kind}\ndata: {json.dumps(value)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.route("/submit_feedback", methods=["POST"])
 def submit_feedback():
     """Store analyst feedback (TP/FP)."""
@@ -147,6 +194,103 @@ def submit_feedback():
     return redirect(url_for("index"))
 
 
+@app.route("/api/feedback/import", methods=["POST"])
+def api_feedback_import():
+    """Bulk label import: multipart upload of a .csv or .jsonl file in the `file` field."""
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        return jsonify({"error": "Upload a .csv or .jsonl file as 'file'"}), 400
+    ext = os.path.splitext(upload.filename)[1].lower()
+    if ext not in (".csv", ".jsonl", ".ndjson"):
+        return jsonify({"error": f"Unsupported file type {ext!r}"}), 400
+
+    import tempfile
+    fd, path = tempfile.mkstemp(suffix=ext)
+    os.close(fd)
+    try:
+        upload.save(path)
+        stats = feedback_import.bulk_import(path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        os.remove(path)
+    return jsonify(stats)
+
+
+@app.route("/api/explain_cache", methods=["GET"])
+def api_explain_cache():
+    """Explanation cache hit rate, saved LLM latency, entries and evictions."""
+    return jsonify(explain_cache.get_stats())
+
+
+@app.route("/api/triage", methods=["GET"])
+def api_triage():
+    """The k most urgent open incidents (priority = correlation score + adaptive weight)."""
+    queue = triage.get_queue()
+    items = queue.top(request.args.get("k", TRIAGE_TOP_K, type=int))
+    return jsonify({"open": len(queue), "incidents": items})
+
+
+@app.route("/api/triage/claim", methods=["POST"])
+def api_triage_claim():
+    """Pop the k most urgent open incidents for an analyst (JSON or form: k, analyst)."""
+    params = request.get_json(silent=True) or request.form
+    claimed = triage.get_queue().claim(int(params.get("k") or 1), assignee=params.get("analyst") or None)
+    if not request.is_json:
+        return redirect(url_for("index"))
+    return jsonify({"claimed": claimed})
+
+
+@app.route("/api/triage/<incident_id>/<action>", methods=["POST"])
+def api_triage_status(incident_id, action):
+    """close / reopen / release (back to open) one incident by ID or correlation key."""
+    status = {"close": "closed", "reopen": "open", "release": "open"}.get(action)
+    if not status:
+        return jsonify({"error": f"Unknown triage action {action!r}"}), 400
+    queue = triage.get_queue()
+    keys = queue.set_status(incident_id, status)
+    if not request.is_json:
+        return redirect(url_for("index"))
+    if not keys and not triage.has_entry(incident_id, queue.path):
+        return jsonify({"error": f"No triage entry for {incident_id}"}), 404
+    return jsonify({"updated": keys, "status": status})
+
+
+@app.route("/api/incidents", methods=["GET"])
+def api_incidents():
+    """
+    Incidents touching the given entities, newest first.
+    e.g. /api/incidents?ip=10.0.0.5&user=bob&hours=24  (or since=/until= ISO timestamps)
+    """
+    entities = [f"{etype}:{value}"
+                for etype in ("user", "host", "ip", "intel")
+                for value in request.args.getlist(etype)]
+    entities += request.args.getlist("entity")
+    if not entities:
+        return jsonify({"error": "Provide at least one user=, host=, ip=, intel= or entity= parameter"}), 400
+
+    limit = request.args.get("limit", 100, type=int)
+    hours = request.args.get("hours")
+    if hours:
+        try:
+            hours = float(hours)
+        except ValueError:
+            hours = None
+        if hours is None or not hours > 0:
+            return jsonify({"error": f"hours must be a positive number, got {request.args['hours']!r}"}), 400
+    try:
+        if hours:
+            results = incident_index.lookup_recent(entities, hours=hours, limit=limit)
+        else:
+            results = incident_index.lookup(
+                entities, since=request.args.get("since"), until=request.args.get("until"), limit=limit
+            )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"count": len(results), "incidents": results})
+
+
 @app.route("/clear", methods=["GET"])
 def clear_session():
     """Clear dashboard session."""
@@ -0,0 +1,45 @@
+# conftest.py — modules under src/ import each other by bare name
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """
+    Every SQLite store, FAISS index and artifact root redirected under tmp_path through the
+    modules' path constants, so a test never reads or writes the real data/ or models/.
+    """
+    import artifacts
+    import backfill
+    import detect
+    import explain_cache
+    import feedback
+    import incident_index
+    import score_cache
+    import store
+    import thresholds
+    import triage
+
+    for module, name, filename in [
+        (store, "DB_PATH", "feedback_store.db"),
+        (store, "LEGACY_FEEDBACK_PATH", "feedback_store.json"),
+        (store, "LEGACY_WEIGHTS_PATH", "adaptive_weights.json"),
+        (triage, "TRIAGE_DB", "triage.db"),
+        (incident_index, "INDEX_PATH", "incident_index.db"),
+        (score_cache, "CACHE_PATH", "score_cache.db"),
+        (thresholds, "THRESHOLDS_DB", "thresholds.db"),
+        (explain_cache, "CACHE_DB", "explain_cache.db"),
+        (explain_cache, "CACHE_INDEX_PATH", "explain_cache.faiss"),
+        (feedback, "FAISS_INDEX_PATH", "feedback_index.faiss"),
+        (feedback, "META_PATH", "feedback_meta.json"),
+        (detect, "CMDLINE_MODEL_PATH", "iforest_proc_cmd.pkl"),
+        (backfill, "BACKFILL_DIR", "backfill"),
+    ]:
+        monkeypatch.setattr(module, name, str(tmp_path / filename))
+    for kind, (_, ext) in list(artifacts.KINDS.items()):
+        monkeypatch.setitem(artifacts.KINDS, kind, (str(tmp_path / kind), ext))
+    return tmp_path
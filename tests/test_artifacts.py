@@ -0,0 +1,57 @@
+# test_artifacts.py
+import json
+import os
+from datetime import datetime, timedelta
+
+import artifacts
+import incident_index
+import triage
+
+
+def _save(name, incidents, when):
+    path = artifacts.partition_path("correlations", name, when=when)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(incidents, f)
+    artifacts.register("correlations", path, records=len(incidents))
+    incident_index.index_incidents(incidents, correlation_file=name)
+    triage.enqueue(incidents, correlation_file=name)
+
+
+def _incident(i, when):
+    return {"incident_id": f"inc-{i}", "key": f"user{i}||10.0.0.{i}", "score": 0.5, "events": [],
+            "start_time": when.isoformat(), "end_time": when.isoformat()}
+
+
+def test_compaction_relinks_incident_index_and_triage(data_dir):
+    old = datetime.now() - timedelta(days=30)
+    _save("correlation_a.json", [_incident(1, old)], old)
+    _save("correlation_b.json", [_incident(2, old)], old)
+    _save("correlation_c.json", [_incident(3, datetime.now())], datetime.now())  # new day → maintenance
+
+    compacted = f"correlations_{old.strftime('%Y%m%d')}_compacted.json"
+    day_dir = os.path.dirname(artifacts.partition_path("correlations", compacted, when=old))
+    assert sorted(f for f in os.listdir(day_dir) if f.endswith(".json")) == [compacted]
+
+    with incident_index.connect() as conn:
+        files = dict(conn.execute("SELECT incident_id, correlation_file FROM incidents").fetchall())
+    with triage.connect() as conn:
+        queued = dict(conn.execute("SELECT incident_id, correlation_file FROM entries").fetchall())
+    expected = {"inc-1": compacted, "inc-2": compacted, "inc-3": "correlation_c.json"}
+    assert files == queued == expected
+
+
+def test_failed_relink_leaves_manifest_and_originals(data_dir, monkeypatch):
+    def fail(old_files, new_file, conn=None):
+        raise RuntimeError("triage.db is locked")
+
+    monkeypatch.setattr(triage, "relink_correlation_files", fail)
+    old = datetime.now() - timedelta(days=30)
+    _save("correlation_a.json", [_incident(1, old)], old)
+    _save("correlation_b.json", [_incident(2, old)], old)
+    _save("correlation_c.json", [_incident(3, datetime.now())], datetime.now())
+
+    day_dir = os.path.dirname(artifacts.partition_path("correlations", "correlation_a.json", when=old))
+    with open(os.path.join(day_dir, artifacts.MANIFEST), encoding="utf-8") as f:
+        listed = [os.path.basename(json.loads(line)["path"]) for line in f]
+    assert listed == ["correlation_a.json", "correlation_b.json"]
+    assert all(os.path.exists(os.path.join(day_dir, name)) for name in listed)
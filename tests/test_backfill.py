@@ -0,0 +1,46 @@
+# test_backfill.py
+import json
+import os
+from datetime import datetime
+
+import artifacts
+import thresholds
+from backfill import backfill, register_event_files, stage
+from detect import DATA_DIR
+
+
+def test_event_files_registered_once_from_the_report(data_dir):
+    report = {}
+    for label in ("2025-10-01", "2025-10-02"):
+        path = artifacts.partition_path("events", f"backfill_run_{label}.arrow")
+        open(path, "wb").close()
+        report[label] = {"events": 10, "event_file": os.path.relpath(path, artifacts.root_of("events"))}
+    report["2025-10-03"] = {"events": 5, "event_file": None}  # event store was unavailable
+    report_path = str(data_dir / "report.json")
+
+    assert register_event_files(report, report_path) == 2
+    assert register_event_files(report, report_path) == 0
+    with open(report_path, encoding="utf-8") as f:
+        assert [l for l, s in json.load(f).items() if s.get("registered")] == ["2025-10-01", "2025-10-02"]
+    assert artifacts.latest("events")["path"] == report["2025-10-02"]["event_file"]
+
+
+def test_rerun_flags_the_same_anomalies_without_touching_live_thresholds(data_dir):
+    mapping = {source: os.path.join(DATA_DIR, f"train_{source}.csv") for source in ("auth", "process", "firewall")}
+    start, end = datetime(2025, 10, 5), datetime(2025, 10, 8)
+
+    first, _ = backfill(mapping, start, end, workers=2)
+    second, _ = backfill(mapping, start, end, workers=2)  # every partition resumed from its checkpoint
+    assert first
+    assert len(second) == len(first)
+    assert sorted((a["source"], str(a["entity"])) for a in second) == sorted((a["source"], str(a["entity"])) for a in first)
+    assert not os.path.exists(thresholds.THRESHOLDS_DB)
+
+
+def test_stage_partitions_offset_timestamps_by_utc_day(tmp_path):
+    path = tmp_path / "auth.csv"
+    path.write_text("timestamp,username,src_ip,auth_method,outcome\n"
+                    "2025-10-06T01:30:00+02:00,alice,10.0.0.5,Kerberos,SUCCESS\n"
+                    "2025-10-06T03:30:00+02:00,alice,10.0.0.5,Kerberos,SUCCESS\n")
+    counts = stage({"auth": str(path)}, datetime(2025, 10, 5), datetime(2025, 10, 7), "day", str(tmp_path / "run"))
+    assert counts == {"2025-10-05": {"auth": 1}, "2025-10-06": {"auth": 1}}
@@ -0,0 +1,31 @@
+# test_cmdline_features.py
+import numpy as np
+import pandas as pd
+
+from features import process_cmdline_frame, process_cmdline_features
+from normalize import normalize_row
+
+ROWS = [
+    {"timestamp": "2024-03-01 12:00:00", "host": "ws01", "username": "alice", "process_name": "cmd.exe",
+     "parent_process": "explorer.exe", "cmdline": "cmd.exe /c whoami"},
+    {"timestamp": "2024-03-01 12:00:05", "host": "ws01", "username": "alice", "process_name": "rundll32.exe",
+     "parent_process": None, "cmdline": None},
+    {"timestamp": "2024-03-01 12:00:09", "host": None, "username": "bob", "process_name": None,
+     "parent_process": "services.exe", "cmdline": "svchost.exe -k netsvcs"},
+    {"timestamp": "2024-03-01 12:00:12", "host": "", "username": "bob", "process_name": "svchost.exe",
+     "parent_process": "", "cmdline": ""},
+]
+
+
+def test_training_and_scoring_paths_match():
+    df = pd.DataFrame(ROWS)
+    hosts_train, X_train = process_cmdline_frame(df)
+
+    # scoring sees events built from the same CSV rows (NaN) and from other sources (None)
+    from_csv = [normalize_row(r.to_dict(), "process") for _, r in df.iterrows()]
+    from_dicts = [normalize_row(dict(r), "process") for r in ROWS]
+    for events in (from_csv, from_dicts):
+        hosts, X = process_cmdline_features(events)
+        assert hosts == hosts_train == ["unknown", "ws01"]
+        assert (X != X_train).nnz == 0
+        assert np.array_equal(X.indices, X_train.indices)
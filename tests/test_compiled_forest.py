@@ -0,0 +1,55 @@
+# test_compiled_forest.py
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from compiled_forest import compile_forest, load_for
+
+
+def _data(n=600, d=5, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, d))
+    X[:, 1] = np.round(X[:, 1])  # ties on a split threshold
+    return X
+
+
+@pytest.mark.filterwarnings("ignore:max_samples")
+@pytest.mark.parametrize("params", [
+    {},
+    {"max_samples": 1.0},                       # all rows: deepest trees
+    {"max_samples": 2},                         # single-split trees
+    {"max_samples": 37, "n_estimators": 7},     # non power of two
+    {"max_features": 1},                        # one feature per tree, mapped through its subset
+    {"max_features": 0.6, "bootstrap": True},
+    {"max_samples": 5000},                      # more than n: clipped to n by sklearn
+])
+def test_scores_match_sklearn(params):
+    X = _data()
+    model = IsolationForest(random_state=3, **params).fit(X)
+    forest = compile_forest(model)
+    probe = np.vstack([X[:200], _data(300, seed=1) * 3])
+    assert np.allclose(forest.score_samples(probe), model.score_samples(probe))
+    assert np.allclose(forest.decision_function(probe), model.decision_function(probe))
+    assert (forest.predict(probe) == model.predict(probe)).all()
+
+
+def test_compiled_copy_matches_and_refreshes(tmp_path):
+    X = _data()
+    path = str(tmp_path / "iforest_test.pkl")
+    model = IsolationForest(random_state=3).fit(X)
+    joblib.dump(model, path)
+
+    forest = load_for(path)
+    assert (tmp_path / "iforest_test.forest" / "meta.json").exists()
+    assert np.allclose(forest.score_samples(X), model.score_samples(X))
+
+    refit = IsolationForest(random_state=4, max_samples=64).fit(X)
+    joblib.dump(refit, path)
+    assert np.allclose(load_for(path).score_samples(X), refit.score_samples(X))
+
+
+def test_rejects_wrong_feature_count():
+    forest = compile_forest(IsolationForest(random_state=3, n_estimators=5).fit(_data()))
+    with pytest.raises(ValueError):
+        forest.score_samples(np.zeros((3, 4)))
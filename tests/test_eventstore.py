@@ -0,0 +1,25 @@
+# test_eventstore.py
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import eventstore
+from bench import synthetic_events
+
+
+def test_event_refs_round_trip_through_the_store(data_dir):
+    events = synthetic_events(200, n_entities=10)
+    ref, rows = eventstore.write_events(events)
+    picked = events[::37]
+    items = eventstore.to_refs([{"entity": e["entity"], "event": e} for e in picked], ref, rows)
+    assert all("event" not in it and it["event_ref"] == {"store": ref, "row": rows[e["event_id"]]}
+               for it, e in zip(items, picked))
+
+    eventstore.resolve(items)
+    for it, e in zip(items, picked):
+        ev = it["event"]
+        assert (ev["event_id"], ev["source"], ev["entity"], ev["timestamp"]) == \
+            (e["event_id"], e["source"], e["entity"], e["timestamp"])
+        assert ev["attributes"] == {col: eventstore._clean(e["attributes"].get(col), eventstore.NUMERIC_ATTRS.get(col))
+                                    for col in eventstore.SOURCE_ATTRS[e["source"]]}
+    assert all("event" not in it for it in eventstore.without_events(items))
@@ -0,0 +1,74 @@
+# test_explain_cache.py
+import pytest
+
+import explain_cache
+from explain import summarize_incident
+
+VERSION = "test-v1"
+
+
+@pytest.fixture
+def cache(data_dir, monkeypatch):
+    monkeypatch.setattr(explain_cache, "_embed", lambda masked: None)  # exact matches only
+    return explain_cache
+
+
+def _incident(incident_id, user, ip, score=3, duration=1):
+    return {
+        "incident_id": incident_id, "key": f"{user}||{ip}", "score": score, "duration_mins": duration,
+        "events": [{"timestamp": "2024-03-01T12:00:05", "source": "auth",
+                    "event": {"attributes": {"username": user, "src_ip": ip,
+                                             "outcome": "failure", "auth_method": "password"}}}],
+    }
+
+
+def _lookup(cache, inc):
+    return cache.lookup(summarize_incident(inc), [inc], VERSION)
+
+
+def test_round_trip_keeps_small_numbers(cache):
+    first = _incident("inc-aaaa", "alice", "10.0.0.5")
+    text, info = _lookup(cache, first)
+    assert text is None
+    explanation = ("Step 1: 1 user (alice) made 3 attempts from 10.0.0.5 at 12:00, "
+                   "within 1 minute; severity 3 of 5.")
+    cache.store(info, explanation, 2.0, VERSION)
+
+    text, info = _lookup(cache, _incident("inc-bbbb", "bob", "192.168.1.7"))
+    assert text == ("Step 1: 1 user (bob) made 3 attempts from 192.168.1.7 at 12:00, "
+                    "within 1 minute; severity 3 of 5.")
+
+
+def test_different_score_misses(cache):
+    text, info = _lookup(cache, _incident("inc-aaaa", "alice", "10.0.0.5"))
+    cache.store(info, "Score 3 for alice.", 2.0, VERSION)
+
+    text, _ = _lookup(cache, _incident("inc-bbbb", "bob", "10.0.0.6", score=4))
+    assert text is None
+
+
+@pytest.fixture
+def no_embedder(data_dir, monkeypatch):
+    import sys
+    import feedback
+    monkeypatch.setitem(sys.modules, "sentence_transformers", None)  # import raises ImportError
+    monkeypatch.setattr(feedback, "_MODEL", None)
+    return explain_cache
+
+
+def test_exact_matches_without_an_embedder(no_embedder):
+    calls = []
+
+    def llm(summary):
+        calls.append(summary)
+        return "alice failed 3 logins from 10.0.0.5."
+
+    first = _incident("inc-aaaa", "alice", "10.0.0.5")
+    text, info = no_embedder.cached_explanation(summarize_incident(first), [first], VERSION, llm)
+    assert info["cache"] == "miss" and len(calls) == 1
+
+    second = _incident("inc-bbbb", "bob", "10.0.0.6")
+    text, info = no_embedder.cached_explanation(summarize_incident(second), [second], VERSION, llm)
+    assert info["cache"] == "hit" and len(calls) == 1
+    assert text == "bob failed 3 logins from 10.0.0.6."
+    assert no_embedder.get_stats()["stores"] == 1
@@ -0,0 +1,35 @@
+# test_feedback_import.py
+import pytest
+
+faiss = pytest.importorskip("faiss")
+import numpy as np
+
+import feedback
+import feedback_import
+import store
+
+
+@pytest.fixture
+def stores(data_dir, monkeypatch):
+    # deterministic unit vectors instead of the sentence model
+    monkeypatch.setattr(feedback, "encode_texts_parallel", lambda texts, **kw: np.eye(8, dtype="float32")[
+        [hash(t) % 8 for t in texts]])
+    path = data_dir / "labels.csv"
+    path.write_text("incident_id,label,comment\ninc-1,TP,lsass dump\ninc-2,FP,backup job\ninc-3,TP,psexec\n")
+    return str(path)
+
+
+def test_rerun_after_crash_before_index_swap(stores, monkeypatch):
+    publish = feedback.publish_index
+    monkeypatch.setattr(feedback, "publish_index", lambda staged: (_ for _ in ()).throw(SystemExit("crash")))
+    with pytest.raises(SystemExit):
+        feedback_import.bulk_import(stores)
+    assert store.count_feedback() == 3 and feedback.load_index() == (None, [])
+
+    monkeypatch.setattr(feedback, "publish_index", publish)
+    feedback_import.bulk_import(stores)
+    index, meta = feedback.load_index()
+    assert store.count_feedback() == 3 and index.ntotal == len(meta) == 3
+
+    assert feedback_import.bulk_import(stores)["already_imported"]
+    assert store.count_feedback() == 3
@@ -0,0 +1,12 @@
+# test_import_budget.py
+import pytest
+
+from import_budget import BUDGETS_MS, HEAVY, HEAVY_ALLOWED, measure
+
+
+@pytest.mark.parametrize("module", sorted(BUDGETS_MS))
+def test_entry_point_imports_within_budget(module):
+    ms, loaded = measure(module)  # fresh interpreters, best of 3
+    heavy = sorted(p for p in HEAVY if p in loaded and p not in HEAVY_ALLOWED.get(module, ()))
+    assert not heavy, f"import {module} eagerly loads {', '.join(heavy)}"
+    assert ms <= BUDGETS_MS[module], f"import {module} took {ms:.1f} ms (budget {BUDGETS_MS[module]} ms)"
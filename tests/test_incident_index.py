@@ -0,0 +1,54 @@
+# test_incident_index.py
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import incident_index
+
+KEY = "alice|ws-01|10.0.0.5"
+
+
+def _incident(start, end, key=KEY):
+    return {"incident_id": str(uuid.uuid4()), "key": key, "score": 0.6,
+            "start_time": start, "end_time": end, "events": [{}, {}]}
+
+
+def _postings():
+    conn = incident_index.connect()
+    try:
+        return conn.execute("SELECT entity_type, entity_value, key FROM postings ORDER BY entity_type").fetchall()
+    finally:
+        conn.close()
+
+
+def test_recorrelated_incident_replaces_its_key(data_dir):
+    incident_index.index_incidents([_incident("2025-10-05T10:00:00", "2025-10-05T10:20:00")], "correlation_1.json")
+    latest = _incident("2025-10-05T10:00:00", "2025-10-05T11:40:00")
+    incident_index.index_incidents([latest], "correlation_2.json")
+
+    results = incident_index.lookup(["user:alice"])
+    assert [(r["incident_id"], r["correlation_file"]) for r in results] == [(latest["incident_id"], "correlation_2.json")]
+    assert [tuple(p) for p in _postings()] == [("host", "ws-01", KEY), ("ip", "10.0.0.5", KEY), ("user", "alice", KEY)]
+    assert incident_index.lookup(["user:alice"], since="2025-10-05T11:00:00")  # the latest span
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_naive_timestamps_are_utc(data_dir, new_york):
+    incident_index.index_incidents([_incident("2025-10-05T10:00:00", "2025-10-05T10:20:00")])
+    assert incident_index._to_epoch("2025-10-05T10:00:00") == datetime(2025, 10, 5, 10, tzinfo=timezone.utc).timestamp()
+
+    assert incident_index.lookup(["user:alice"], since="2025-10-05T10:10:00", until="2025-10-05T10:15:00")
+    assert not incident_index.lookup(["user:alice"], since="2025-10-05T10:30:00")
+    now = datetime(2025, 10, 5, 11, tzinfo=timezone.utc)
+    assert incident_index.lookup_recent(["user:alice"], hours=1, now=now)
+    assert not incident_index.lookup_recent(["user:alice"], hours=0.5, now=now)
@@ -0,0 +1,40 @@
+# test_ip_enrich.py
+import ipaddress
+import random
+
+from ip_enrich import CidrTable
+
+TABLES = {
+    "internal": ["10.0.0.0/8", "fc00::/7"],
+    "lab": ["10.20.0.0/16"],
+    "scanners": ["10.20.30.0/24", "198.51.100.7", "not-a-cidr"],
+}
+
+
+def _brute_force(ip):
+    addr = ipaddress.ip_address(ip)
+    tags = [tag for tag, cidrs in sorted(TABLES.items()) for c in cidrs
+            if c != "not-a-cidr" and addr in ipaddress.ip_network(c, strict=False)]
+    return ",".join(dict.fromkeys(tags)) or None
+
+
+def test_nested_prefixes_and_boundaries():
+    table = CidrTable(TABLES)
+    cases = {
+        "10.20.30.0": "internal,lab,scanners",       # most specific prefix, first address
+        "10.20.30.255": "internal,lab,scanners",     # ... and last
+        "10.20.31.0": "internal,lab",                # one past the /24
+        "10.255.255.255": "internal",
+        "11.0.0.0": None,
+        "198.51.100.7": "scanners",                  # single IP
+        "198.51.100.8": None,
+        "fd00::1": "internal",
+        "garbage": None,
+    }
+    assert {ip: table.tags_of(ip) for ip in cases} == cases
+
+    rng = random.Random(0)
+    ips = [f"10.20.{rng.randrange(28, 33)}.{rng.randrange(256)}" for _ in range(300)]
+    ips += [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(300)]
+    assert [table.tags_of(ip) for ip in ips] == [_brute_force(ip) for ip in ips]
+    assert [table.label(m) for m in table.masks_v4(ips)] == [table.tags_of(ip) for ip in ips]
@@ -0,0 +1,31 @@
+# test_loadtest.py
+import pytest
+
+from loadtest import percentile, compare
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 11))
+    assert percentile(values, 50) == 5
+    assert percentile(values, 90) == 9
+    assert percentile(values, 95) == 10
+    assert percentile(values, 100) == 10
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 50) is None
+
+
+def _report(rps, p95=100.0, error_rate=0.0):
+    stats = {"rps": rps, "p95_ms": p95, "error_rate": error_rate}
+    return {"endpoints": {"all": stats, "index": dict(stats)}}
+
+
+def test_compare_flags_regressions():
+    assert compare(_report(10.0), _report(10.0)) == []
+    problems = compare(_report(5.0, p95=300.0), _report(10.0))
+    assert any("throughput" in p for p in problems)
+    assert any("p95" in p for p in problems)
+
+
+def test_compare_rejects_empty_baseline():
+    with pytest.raises(ValueError, match="no endpoint results"):
+        compare(_report(10.0), {"endpoints": {}})
@@ -0,0 +1,52 @@
+# test_partition.py
+import os
+import time
+
+import pytest
+
+import detect
+import score_cache
+import thresholds
+from bench import synthetic_events
+from partition import run_partitioned, requeue_stale, _queue_paths
+
+
+@pytest.fixture
+def isolated(data_dir, monkeypatch):
+    monkeypatch.setattr(thresholds, "MIN_SAMPLES", 1)  # threshold from the first batch on
+    monkeypatch.setattr(score_cache, "ENABLED", False)
+    return data_dir
+
+
+def _run(tmp_path, monkeypatch, workers, name):
+    monkeypatch.setattr(thresholds, "THRESHOLDS_DB", str(tmp_path / f"{name}.db"))
+    anomalies, incidents = run_partitioned(synthetic_events(3000, n_entities=60), workers=workers)
+    return sorted((a["source"], a.get("detector"), str(a["entity"]), round(a["score"], 9))
+                  for a in anomalies), len(incidents)
+
+
+def test_decisions_do_not_depend_on_worker_count(isolated, monkeypatch):
+    single = _run(isolated, monkeypatch, 1, "single")
+    assert single[0]
+    for workers in (2, 4):
+        assert _run(isolated, monkeypatch, workers, f"w{workers}") == single
+
+
+def test_missing_model_is_fitted_once_for_all_shards(isolated, monkeypatch):
+    monkeypatch.setitem(detect.MODEL_PATHS, "firewall", str(isolated / "missing_fw.pkl"))
+    single = _run(isolated, monkeypatch, 1, "single")
+    assert any(a[0] == "firewall" for a in single[0])
+    assert _run(isolated, monkeypatch, 4, "w4") == single
+
+
+def test_stale_claims_go_back_to_pending(tmp_path):
+    paths = _queue_paths(str(tmp_path))
+    fresh = os.path.join(paths["running"], "111_shard_0000.pkl")
+    stale = os.path.join(paths["running"], "222_shard_0001.pkl")
+    for path in (fresh, stale):
+        open(path, "wb").close()
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+
+    assert requeue_stale(paths, max_age=3600) == 1
+    assert os.path.exists(fresh)
+    assert os.listdir(paths["pending"]) == ["shard_0001.pkl"]
@@ -0,0 +1,48 @@
+# test_rollup.py
+from datetime import datetime
+
+import pandas as pd
+
+from ingest import rollup_frame
+from detect import latest_event_by_entity
+
+
+def _flows(times):
+    return pd.DataFrame({
+        "timestamp": times,
+        "src_ip": "10.0.0.5", "dst_ip": "10.0.0.9", "dst_port": 443,
+        "protocol": "tcp", "action": "allow", "bytes": 100,
+    })
+
+
+def test_rollup_respects_bucket_boundaries():
+    df = _flows(["2024-03-01 12:00:01", "2024-03-01 12:00:59", "2024-03-01 12:01:00",
+                 "2024-03-01 12:05:00", "2024-03-01 20:00:00"])
+    out = rollup_frame(df, "firewall", 60)
+    assert len(out) == 4
+    assert list(out["_count"]) == [2, 1, 1, 1]
+    assert list(out["bytes"]) == [200, 100, 100, 100]
+    assert out["_last_ts"].iloc[0] == pd.Timestamp("2024-03-01 12:00:59")
+
+
+def test_rollup_passes_unparseable_rows_through():
+    df = _flows(["2024-03-01 12:00:01", "not a time", "2024-03-01 12:00:30"])
+    out = rollup_frame(df, "firewall", 60)
+    assert len(out) == 2
+    assert out["_count"].iloc[0] == 2
+
+
+def _event(ts, last=None):
+    e = {"timestamp": ts, "attributes": {"username": "alice"}}
+    if last:
+        e["last_timestamp"] = last
+    return e
+
+
+def test_latest_event_keeps_rollup_seen_later():
+    rolled = _event(datetime(2024, 3, 1, 12, 0, 1), last=datetime(2024, 3, 1, 12, 0, 50))
+    single = _event(datetime(2024, 3, 1, 12, 0, 30))
+    assert latest_event_by_entity([rolled, single], "username")["alice"] is rolled
+
+    later = _event(datetime(2024, 3, 1, 12, 1, 0))
+    assert latest_event_by_entity([rolled, single, later], "username")["alice"] is later
@@ -0,0 +1,42 @@
+# test_score_cache.py
+import os
+
+import numpy as np
+
+import score_cache
+
+
+class _Model:
+    def __init__(self, offset=0.0):
+        self.offset, self.rows = offset, 0
+
+    def decision_function(self, X):
+        self.rows += len(X)
+        return np.asarray(X, dtype=np.float64).sum(axis=1) - 1.0 + self.offset
+
+
+def test_hits_misses_and_model_change(data_dir, monkeypatch):
+    monkeypatch.setattr(score_cache, "ENABLED", True)
+    path = data_dir / "iforest_auth.pkl"
+    path.write_bytes(b"v1")
+    version = score_cache.model_version(str(path))
+    entities = ["alice", "bob", "carol"]
+    X = np.array([[0.2, 0.1], [0.9, 0.8], [0.4, 0.4]])
+
+    model = _Model()
+    preds, scores, stats = score_cache.score_with_cache(model, version, "auth", entities, X)
+    assert (stats["hits"], model.rows) == (0, 3)
+    assert list(preds) == [-1, 1, -1] and np.allclose(scores, X.sum(axis=1) - 1.0)
+
+    X[1] = [0.1, 0.1]  # only bob's features changed
+    preds, scores, stats = score_cache.score_with_cache(model, version, "auth", entities, X)
+    assert (stats["hits"], model.rows) == (2, 4)
+    assert list(preds) == [-1, -1, -1]
+
+    path.write_bytes(b"retrained")  # a new model file changes the version: nothing is reused
+    os.utime(path, ns=(0, 10**18))
+    retrained = _Model(offset=0.5)
+    preds, scores, stats = score_cache.score_with_cache(
+        retrained, score_cache.model_version(str(path)), "auth", entities, X)
+    assert (stats["hits"], retrained.rows) == (0, 3)
+    assert np.allclose(scores, X.sum(axis=1) - 0.5)
@@ -0,0 +1,32 @@
+# test_store.py
+import pytest
+
+import store
+
+DAY = store.DECAY_PERIOD_SECS
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def test_lazy_decay_matches_eager_daily_decay(data_dir, monkeypatch):
+    clock = _Clock(1_700_000_000.0)
+    monkeypatch.setattr(store, "time", clock)
+    start = clock.now
+
+    store.adjust_weights([("inc-1", 0.6)])
+    clock.now = start + 2.5 * DAY
+    store.adjust_weights([("inc-1", 0.3), ("inc-2", -0.4)])
+    clock.now = start + 6 * DAY
+
+    # eager: decay every weight by WEIGHT_DECAY per elapsed day at every step
+    inc1 = (0.6 * store.WEIGHT_DECAY ** 2.5 + 0.3) * store.WEIGHT_DECAY ** 3.5
+    inc2 = -0.4 * store.WEIGHT_DECAY ** 3.5
+    assert store.get_weight("inc-1") == pytest.approx(inc1)
+    assert store.get_weights(["inc-1", "inc-2"]) == pytest.approx({"inc-1": inc1, "inc-2": inc2})
+    assert store.get_weight("never-rated") == 0.0
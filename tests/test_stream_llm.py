@@ -0,0 +1,24 @@
+# test_stream_llm.py
+import threading
+
+import pytest
+
+import explain
+import mock_llm
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    server = mock_llm.serve(port=0, token_delay=0, first_token_delay=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    monkeypatch.setattr(explain, "LLM_API_ENDPOINT", f"http://{host}:{port}/v1/chat/completions")
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+def test_stream_decodes_utf8(llm):
+    assert "→" in mock_llm.MOCK_EXPLANATION
+    text = "".join(explain.stream_llm("summary")).strip()
+    assert text == mock_llm.MOCK_EXPLANATION
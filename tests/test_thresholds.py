@@ -0,0 +1,82 @@
+# test_thresholds.py
+import numpy as np
+import pytest
+
+import detect
+import score_cache
+import thresholds
+from bench import synthetic_events
+from thresholds import KLLSketch
+
+QUANTILES = (0.01, 0.1, 0.5, 0.9, 0.98, 0.99)
+
+
+def _rank_error(values, estimate, q):
+    return abs(np.searchsorted(np.sort(values), estimate, side="right") / len(values) - q)
+
+
+def test_quantile_rank_error_within_bound():
+    values = np.random.default_rng(7).normal(size=100_000)
+    sketch = KLLSketch(seed=7)
+    for chunk in np.array_split(values, 100):
+        sketch.update(chunk)
+    assert sketch.n == len(values)
+    for q in QUANTILES:
+        assert _rank_error(values, sketch.quantile(q), q) < 0.02
+
+
+def test_merged_sketch_survives_persistence():
+    rng = np.random.default_rng(11)
+    days = [rng.exponential(size=20_000) for _ in range(3)]
+    merged = KLLSketch(seed=11)
+    for day in days:
+        merged.merge(KLLSketch.from_bytes(KLLSketch(seed=11).update(day).to_bytes()))
+
+    restored = KLLSketch.from_bytes(merged.to_bytes())
+    values = np.concatenate(days)
+    assert restored.n == merged.n == len(values)
+    for q in QUANTILES:
+        assert restored.quantile(q) == pytest.approx(merged.quantile(q), rel=1e-6)  # float32 items
+        assert _rank_error(values, restored.quantile(q), q) < 0.02
+
+
+def _state(conn):
+    sketches = conn.execute("SELECT source, day, n, sketch FROM sketches ORDER BY source, day").fetchall()
+    return sketches, conn.execute("SELECT COUNT(*) FROM threshold_log").fetchone()[0]
+
+
+def test_flag_scored_thresholds_each_detector_once(data_dir, monkeypatch):
+    monkeypatch.setattr(thresholds, "MIN_SAMPLES", 1)
+    rng = np.random.default_rng(3)
+
+    def entry(detector, n):
+        return {"source": "process" if detector == "cmdline" else detector, "detector": detector,
+                "entities": [f"{detector}-{i}" for i in range(n)], "scores": list(rng.normal(size=n)),
+                "preds": [1] * n, "events": [{}] * n}
+
+    # two shards of auth, one of cmdline
+    detect.flag_scored([entry("auth", 40), entry("cmdline", 30), entry("auth", 60)])
+
+    conn = thresholds.connect()
+    try:
+        runs = conn.execute("SELECT source, run_n FROM threshold_log ORDER BY source").fetchall()
+        sketches = dict(conn.execute("SELECT source, n FROM sketches").fetchall())
+    finally:
+        conn.close()
+    assert runs == [("auth", 100), ("cmdline", 30)]
+    assert sketches == {"auth": 100, "cmdline": 30}
+
+
+def test_scoring_alone_leaves_threshold_store_unchanged(data_dir, monkeypatch):
+    monkeypatch.setattr(score_cache, "ENABLED", False)
+    events = synthetic_events(1500, n_entities=30)
+    detect.score_events(events)  # seeds the store
+
+    conn = thresholds.connect()
+    try:
+        before = _state(conn)
+        scored = detect.score_batch(events)
+        assert scored
+        assert _state(conn) == before
+    finally:
+        conn.close()
@@ -0,0 +1,85 @@
+# test_triage.py
+import random
+
+import pytest
+
+import triage
+from triage import IndexedHeap, TriageQueue
+
+
+def _check(heap, model):
+    entries = heap._heap
+    assert len(heap) == len(heap._pos) == len(model)
+    for i, (neg, item) in enumerate(entries):
+        assert heap._pos[item] == i
+        assert -neg == model[item]
+        if i:
+            assert entries[(i - 1) // 2] <= entries[i]
+
+
+def _ranked(model):
+    return sorted(model.items(), key=lambda kv: (-kv[1], kv[0]))
+
+
+def test_heap_keeps_position_map_through_random_operations():
+    rng = random.Random(1)
+    heap, model = IndexedHeap({f"k{i}": rng.random() for i in range(50)}), {}
+    model.update((item, -neg) for neg, item in heap._heap)
+    _check(heap, model)
+    for _ in range(2000):
+        op = rng.random()
+        item = f"k{rng.randrange(80)}"
+        if op < 0.5:
+            priority = rng.choice((rng.random(), 0.5))  # repeated priorities exercise ties
+            heap.push(item, priority)
+            model[item] = priority
+        elif op < 0.8:
+            assert heap.remove(item) == (model.pop(item, None) is not None)
+        elif model:
+            expected = _ranked(model)[0]
+            assert heap.pop() == expected
+            del model[expected[0]]
+        _check(heap, model)
+
+
+@pytest.mark.parametrize("k", [0, 1, 7, 100, 500])
+def test_top_k_matches_full_sort(k):
+    rng = random.Random(k)
+    model = {f"k{i}": round(rng.random(), 2) for i in range(300)}
+    heap = IndexedHeap(model)
+    assert heap.top(k) == _ranked(model)[:k]
+    _check(heap, model)  # top() leaves the heap alone
+
+
+def _incident(key, end, incident_id):
+    return {"incident_id": incident_id, "key": key, "score": 0.5, "events": [{}],
+            "start_time": "2025-10-05T10:00:00", "end_time": end}
+
+
+def _entry(key):
+    with triage.connect() as conn:
+        return dict(conn.execute("SELECT status, assignee FROM entries WHERE key = ?", (key,)).fetchone())
+
+
+def test_claimed_entry_reopens_only_on_new_activity(data_dir):
+    key = "alice|ws-01|10.0.0.5"
+    triage.enqueue([_incident(key, "2025-10-05T10:20:00", "inc-1")])
+    assert triage.set_status(["inc-1"], "claimed", "bob") == [key]
+
+    triage.enqueue([_incident(key, "2025-10-05T10:20:00", "inc-2")])  # re-correlated, nothing new
+    assert _entry(key) == {"status": "claimed", "assignee": "bob"}
+    triage.enqueue([_incident(key, "2025-10-05T11:05:00", "inc-3")])
+    assert _entry(key) == {"status": "open", "assignee": None}
+
+
+def test_claim_returns_only_entries_it_changed(data_dir, monkeypatch):
+    triage.enqueue([_incident(f"user{i}||", "2025-10-05T10:20:00", f"inc-{i}") for i in range(3)])
+    stale = TriageQueue()
+    stale.sync()
+    first, second = [p["key"] for p in stale.top(2)]
+    assert triage.set_status([first], "claimed", "alice") == [first]  # another analyst, elsewhere
+    assert triage.set_status([first], "claimed", "bob") == []
+
+    monkeypatch.setattr(stale, "sync", lambda: 0)  # claim before seeing that change
+    assert [p["key"] for p in stale.claim(2, assignee="bob")] == [second]
+    assert _entry(first) == {"status": "claimed", "assignee": "alice"}
@@ -0,0 +1,23 @@
+# test_ui.py
+import pytest
+
+flask = pytest.importorskip("flask")
+import ui
+
+
+@pytest.fixture
+def client(data_dir):
+    return ui.app.test_client()
+
+
+@pytest.mark.parametrize("hours", ["abc", "-5", "nan", "0"])
+def test_incidents_rejects_bad_hours(client, hours):
+    resp = client.get(f"/api/incidents?user=bob&hours={hours}")
+    assert resp.status_code == 400
+    assert "hours" in resp.get_json()["error"]
+
+
+def test_incidents_accepts_hours(client):
+    resp = client.get("/api/incidents?user=bob&hours=24")
+    assert resp.status_code == 200
+    assert resp.get_json()["count"] == 0
@@ -0,0 +1,74 @@
+# test_window_engine.py
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from window_engine import FEATURE_NAMES, HOUR, SlidingWindowEngine
+
+START = datetime(2025, 10, 5, 8)
+
+
+def _events(n=1500, seed=5):
+    rng = random.Random(seed)
+    offsets = sorted(rng.randrange(0, 4 * HOUR, 7) for _ in range(n))  # coarse steps: tied timestamps
+    events = []
+    for off in offsets:
+        source = rng.choice(("auth", "process", "firewall"))
+        if source == "auth":
+            attrs = {"username": rng.choice("ab"), "src_ip": f"10.0.0.{rng.randrange(6)}",
+                     "outcome": rng.choice(("SUCCESS", "FAILURE"))}
+        elif source == "process":
+            attrs = {"host": rng.choice(("h1", "h2")), "process_name": rng.choice(("cmd.exe", "ps.exe", "sh"))}
+        else:
+            attrs = {"src_ip": rng.choice(("10.0.1.1", "10.0.1.2")), "dst_ip": f"8.8.{rng.randrange(4)}.1",
+                     "bytes": rng.randrange(1, 5000)}
+        events.append({"source": source, "timestamp": START + timedelta(seconds=off), "attributes": attrs})
+    return events
+
+
+def _recount(events, i):
+    """Features of events[i] counted from scratch over the events before it (same entity)."""
+    e = events[i]
+    source, attrs, ts = e["source"], e["attributes"], e["timestamp"].timestamp()
+    key = {"auth": "username", "process": "host", "firewall": "src_ip"}[source]
+    prior = [p for p in events[:i + 1] if p["source"] == source and p["attributes"][key] == attrs[key]]
+
+    def within(span):
+        return [p for p in prior if p["timestamp"].timestamp() > ts - span]
+
+    gap = ts - prior[-2]["timestamp"].timestamp() if len(prior) > 1 else HOUR
+    hour = float(e["timestamp"].hour)
+    if source == "auth":
+        fail = [float(p["attributes"]["outcome"] == "FAILURE") for p in within(300)]
+        first_seen = {}
+        for j, p in enumerate(prior):
+            first_seen.setdefault(p["attributes"]["src_ip"], j)
+        new_ips = sum(1 for j, p in enumerate(prior)
+                      if first_seen[p["attributes"]["src_ip"]] == j and p["timestamp"].timestamp() > ts - HOUR)
+        distinct = len({p["attributes"]["src_ip"] for p in within(HOUR)})
+        return [sum(fail), len(fail), new_ips, distinct, gap, hour, float(attrs["outcome"] == "FAILURE")]
+    if source == "process":
+        distinct = len({p["attributes"]["process_name"] for p in within(HOUR)})
+        new = float(all(p["attributes"]["process_name"] != attrs["process_name"] for p in prior[:-1]))
+        return [len(within(300)), distinct, new, gap, hour]
+    return [sum(p["attributes"]["bytes"] for p in within(60)), len(within(300)),
+            len({p["attributes"]["dst_ip"] for p in within(HOUR)}), gap, hour, float(attrs["bytes"])]
+
+
+def test_window_counts_match_brute_force_recount():
+    events = _events()
+    features = SlidingWindowEngine().process_events(events)
+    by_event = {id(ev): row for rows, evs in features.values() for row, ev in zip(rows, evs)}
+    assert len(by_event) == len(events)
+    for i, e in enumerate(events):
+        assert by_event[id(e)] == pytest.approx(_recount(events, i)), (i, e["source"], FEATURE_NAMES[e["source"]])
+
+
+def test_update_and_batch_agree():
+    events = _events(300, seed=9)
+    streamed = SlidingWindowEngine()
+    rows = [streamed.update(e) for e in events]
+    batch = SlidingWindowEngine().process_events(events)
+    for source, (batch_rows, _) in batch.items():
+        assert [r for s, r in rows if s == source] == batch_rows